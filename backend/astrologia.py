@@ -0,0 +1,218 @@
+"""
+Cálculo de mapas natais fora do processo do servidor.
+
+O Kerykeion/Swiss Ephemeris é Python síncrono e preso ao GIL: rodando em threads
+do worker do uvicorn, um pico de consultas com mapa trava o event loop. Aqui os
+mapas são calculados em um pool de processos (um por núcleo, por padrão) atrás
+de uma API assíncrona, com uma chamada em lote que divide muitos mapas entre os
+processos em poucos envios.
+
+Os parâmetros e resultados são dicionários simples (serializáveis por pickle);
+resolução do local e cache continuam no processo principal. Onde não há
+suporte a multiprocessing (p.ex. algumas plataformas serverless), use
+MAPAS_EXECUTOR=threads.
+
+Com MOTOR_ASTRAL=leve (padrão), os mapas são calculados primeiro pelo motor
+astral leve (motor_astral.py), no próprio processo; só os casos que ele não
+cobre vão para o Kerykeion no pool.
+"""
+
+import os
+import asyncio
+import threading
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional
+
+# "processos" (padrão) ou "threads"
+MAPAS_EXECUTOR = os.getenv("MAPAS_EXECUTOR", "processos")
+MAPAS_PROCESSOS = int(os.getenv("MAPAS_PROCESSOS", "0")) or os.cpu_count() or 1
+# "leve" (motor_astral, com o Kerykeion só nos casos não cobertos) ou "kerykeion"
+MOTOR_ASTRAL = os.getenv("MOTOR_ASTRAL", "leve")
+LOTE_LEVE_NO_LOOP = 32
+# spawn evita herdar threads (agrupador, fila de memória) e conexões do processo pai
+MAPAS_MP_CONTEXTO = os.getenv("MAPAS_MP_CONTEXTO", "spawn")
+
+
+def _iniciar_processo():
+    # Importa o Kerykeion uma vez por processo, antes da primeira consulta
+    import kerykeion  # noqa: F401
+
+
+def _aquecer(_: int) -> int:
+    return os.getpid()
+
+
+def calcular_mapa(parametros: Dict[str, Any]) -> Dict[str, Any]:
+    """Calcula sol, lua e ascendente a partir dos argumentos do AstrologicalSubject."""
+    import kerykeion as k
+
+    nascimento = k.AstrologicalSubject(**parametros)
+    return {
+        "sol": {
+            "signo": nascimento.sun["sign"],
+            "casa": nascimento.sun["house"]
+        },
+        "lua": {
+            "signo": nascimento.moon["sign"],
+            "casa": nascimento.moon["house"]
+        },
+        "ascendente": nascimento.first_house["sign"]
+    }
+
+
+def calcular_mapas(lista_parametros: List[Dict[str, Any]]) -> List[Optional[Dict[str, Any]]]:
+    """Calcula vários mapas em um único envio ao processo; falhas viram None."""
+    resultados = []
+    for parametros in lista_parametros:
+        try:
+            resultados.append(calcular_mapa(parametros))
+        except Exception as e:
+            print(f"Erro ao calcular mapa astrológico: {e}")
+            resultados.append(None)
+    return resultados
+
+
+class ExecutorMapas:
+    def __init__(self, modo: str = MAPAS_EXECUTOR, processos: int = MAPAS_PROCESSOS,
+                 contexto: str = MAPAS_MP_CONTEXTO, motor: str = MOTOR_ASTRAL):
+        self.modo = modo
+        self.processos = processos
+        self.contexto = contexto
+        self.motor = motor
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+        self.mapas_calculados = 0
+        self.mapas_motor_leve = 0
+        self.lotes = 0
+
+    def _criar(self) -> Executor:
+        if self.modo == "processos":
+            try:
+                return ProcessPoolExecutor(
+                    max_workers=self.processos,
+                    mp_context=multiprocessing.get_context(self.contexto),
+                    initializer=_iniciar_processo
+                )
+            except (OSError, NotImplementedError, ValueError) as e:
+                print(f"Erro ao criar pool de processos para mapas, usando threads: {e}")
+                self.modo = "threads"
+        return ThreadPoolExecutor(max_workers=self.processos, thread_name_prefix="mapas")
+
+    @property
+    def executor(self) -> Executor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = self._criar()
+            return self._executor
+
+    def _calcular_leve(self, lista_parametros: List[Dict[str, Any]]) -> List[Optional[Dict[str, Any]]]:
+        if self.motor != "leve":
+            return [None] * len(lista_parametros)
+        from motor_astral import motor_astral
+        try:
+            mapas = motor_astral.calcular(lista_parametros)
+        except Exception as e:
+            print(f"Erro no motor astral leve, usando o Kerykeion: {e}")
+            return [None] * len(lista_parametros)
+        self.mapas_motor_leve += sum(mapa is not None for mapa in mapas)
+        return mapas
+
+    async def _calcular_leve_async(self, lista_parametros: List[Dict[str, Any]]) -> List[Optional[Dict[str, Any]]]:
+        """
+        Motor leve sem bloquear o event loop: lotes pequenos rodam direto no loop
+        só com as tabelas já carregadas; a primeira carga (leitura do .npz) e os
+        lotes grandes vão para uma thread.
+        """
+        if self.motor != "leve":
+            return [None] * len(lista_parametros)
+        from motor_astral import motor_astral
+        if motor_astral.carregado and len(lista_parametros) <= LOTE_LEVE_NO_LOOP:
+            return self._calcular_leve(lista_parametros)
+        return await asyncio.to_thread(self._calcular_leve, lista_parametros)
+
+    def iniciar(self):
+        """Carrega as tabelas do motor leve ou sobe todos os processos do pool (cada um já importa o Kerykeion)."""
+        if self.motor == "leve":
+            # O pool só é usado nos casos que o motor leve não cobre: fica para o primeiro uso
+            from motor_astral import motor_astral
+            motor_astral.tabelas
+            return
+        executor = self.executor
+        if self.modo == "processos":
+            list(executor.map(_aquecer, range(self.processos)))
+        else:
+            _iniciar_processo()
+
+    async def calcular(self, parametros: Dict[str, Any]) -> Dict[str, Any]:
+        mapa = (await self._calcular_leve_async([parametros]))[0]
+        if mapa is not None:
+            self.mapas_calculados += 1
+            return mapa
+        loop = asyncio.get_running_loop()
+        try:
+            resultado = await loop.run_in_executor(self.executor, calcular_mapa, parametros)
+        except BrokenProcessPool:
+            self._descartar_pool()
+            raise
+        self.mapas_calculados += 1
+        return resultado
+
+    async def calcular_lote(self, lista_parametros: List[Dict[str, Any]]) -> List[Optional[Dict[str, Any]]]:
+        """
+        Calcula muitos mapas dividindo a lista em um bloco por processo (menos
+        idas e voltas entre processos). Devolve None nas posições que falharam.
+        """
+        if not lista_parametros:
+            return []
+        mapas = await self._calcular_leve_async(lista_parametros)
+        pendentes = [i for i, mapa in enumerate(mapas) if mapa is None]
+        if not pendentes:
+            self.lotes += 1
+            self.mapas_calculados += len(lista_parametros)
+            return mapas
+
+        loop = asyncio.get_running_loop()
+        restantes = [lista_parametros[i] for i in pendentes]
+        tamanho = -(-len(restantes) // self.processos)
+        blocos = [restantes[i:i + tamanho] for i in range(0, len(restantes), tamanho)]
+        try:
+            resultados = await asyncio.gather(*[
+                loop.run_in_executor(self.executor, calcular_mapas, bloco) for bloco in blocos
+            ])
+        except BrokenProcessPool:
+            self._descartar_pool()
+            raise
+        for i, mapa in zip(pendentes, (mapa for bloco in resultados for mapa in bloco)):
+            mapas[i] = mapa
+        self.lotes += 1
+        self.mapas_calculados += len(lista_parametros)
+        return mapas
+
+    def _descartar_pool(self):
+        # Um processo morreu (p.ex. falta de memória): o próximo pedido cria um pool novo
+        print("Erro: pool de processos de mapas quebrado, recriando no próximo cálculo")
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def estatisticas(self) -> Dict[str, Any]:
+        return {
+            "modo": self.modo,
+            "motor": self.motor,
+            "mapas_motor_leve": self.mapas_motor_leve,
+            "processos": self.processos,
+            "mapas_calculados": self.mapas_calculados,
+            "lotes": self.lotes,
+        }
+
+    def fechar(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+executor_mapas = ExecutorMapas()
@@ -0,0 +1,731 @@
+"""
+Benchmark offline do backend, sem gastar com as APIs reais.
+
+Sobe servidores substitutos locais da OpenAI (chat, com e sem streaming, e
+embeddings) e do Supabase (insert/select do PostgREST e a RPC match_memoria),
+com latências configuráveis, aponta o backend para eles (OPENAI_BASE_URL e
+SUPABASE_URL) e mede latência p50/p95/p99, requisições por segundo e memória
+de cada worker sob a concorrência pedida.
+
+Cenários:
+- consulta: POST /consulta-tarot
+- stream: POST /consulta-tarot/stream, lido até o evento "fim" (mede também o
+  tempo até o primeiro token)
+- rag: guru_ia.gerar_resposta_com_memoria (embedding, recuperação, chat e fila
+  de memória), executado no próprio processo do benchmark
+
+Uso:
+    python benchmark.py [--cenarios consulta,stream,rag] [--concorrencia 16] [--requisicoes 300]
+                        [--workers 2] [--latencia-chat-ms 800] [--env CACHE_SEMANTICO=1]
+                        [--salvar-base base.json] [--comparar base.json --tolerancia 0.15]
+
+Com --comparar, o processo termina com código 1 se alguma métrica piorou além
+da tolerância em relação à base. Os substitutos também sobem sozinhos, para
+testes manuais:
+    python benchmark.py substitutos --porta 8787
+"""
+
+import os
+import sys
+import json
+import time
+import zlib
+import base64
+import random
+import socket
+import asyncio
+import tempfile
+import subprocess
+from datetime import datetime
+from dataclasses import dataclass, asdict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import numpy as np
+
+DIRETORIO_BACKEND = os.path.dirname(os.path.abspath(__file__))
+DIMENSAO_EMBEDDING = 1536
+VERSAO_BASE = 1
+
+# Métricas comparadas com a base: (cenário -> caminho da métrica, maior é melhor?)
+METRICAS_COMPARADAS = (
+    (("latencia_ms", "p50"), False),
+    (("latencia_ms", "p95"), False),
+    (("latencia_ms", "p99"), False),
+    (("requisicoes_por_segundo",), True),
+    (("memoria_pico_mb",), False),
+)
+
+
+# --- SUBSTITUTOS DA OPENAI E DO SUPABASE ---
+
+@dataclass
+class ConfigSubstitutos:
+    latencia_chat_ms: float = 800.0         # até o primeiro token (ou até a resposta inteira sem streaming)
+    tokens_resposta: int = 60
+    intervalo_token_ms: float = 15.0
+    latencia_embedding_ms: float = 40.0
+    latencia_supabase_ms: float = 10.0
+
+
+def embedding_deterministico(texto: str, dimensao: int = DIMENSAO_EMBEDDING) -> np.ndarray:
+    """
+    Vetor normalizado por hashing das palavras: textos com palavras em comum
+    ficam próximos, o que mantém o cache semântico e o RAG realistas.
+    """
+    vetor = np.zeros(dimensao, dtype=np.float32)
+    for palavra in texto.lower().split():
+        codigo = zlib.crc32(palavra.encode("utf-8"))
+        vetor[codigo % dimensao] += 1.0 if codigo & 1 else -1.0
+    norma = np.linalg.norm(vetor)
+    if norma == 0:
+        vetor[0] = 1.0
+        return vetor
+    return vetor / norma
+
+
+def _similaridade(a: np.ndarray, b: Any) -> float:
+    if isinstance(b, str):
+        b = json.loads(b)
+    b = np.asarray(b, dtype=np.float32)
+    norma = float(np.linalg.norm(a) * np.linalg.norm(b))
+    return float(a @ b) / norma if norma else 0.0
+
+
+def criar_app_substitutos(config: ConfigSubstitutos):
+    """App FastAPI que responde como a OpenAI (/v1) e o PostgREST do Supabase (/rest/v1)."""
+    from fastapi import FastAPI, Request
+    from fastapi.responses import JSONResponse, StreamingResponse
+
+    app = FastAPI()
+    # Tabela memoria_vetorial em memória
+    linhas: List[Dict[str, Any]] = []
+    contadores = {"chat": 0, "embeddings": 0, "insert": 0, "select": 0, "match_memoria": 0}
+
+    def texto_resposta() -> List[str]:
+        return [f"palavra{i} " for i in range(config.tokens_resposta)]
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok", "linhas": len(linhas), "chamadas": contadores}
+
+    @app.post("/v1/chat/completions")
+    async def chat(request: Request):
+        corpo = await request.json()
+        contadores["chat"] += 1
+        identificador = f"chatcmpl-bench{contadores['chat']}"
+        criado = int(time.time())
+        modelo = corpo.get("model", "gpt-4.1-mini")
+        trechos = texto_resposta()
+
+        if not corpo.get("stream"):
+            await asyncio.sleep((config.latencia_chat_ms + config.intervalo_token_ms * len(trechos)) / 1000)
+            return {
+                "id": identificador, "object": "chat.completion", "created": criado, "model": modelo,
+                "choices": [{
+                    "index": 0, "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": "".join(trechos)},
+                }],
+                "usage": {"prompt_tokens": 100, "completion_tokens": len(trechos), "total_tokens": 100 + len(trechos)},
+            }
+
+        def pedaco(delta: Dict[str, Any], fim: Optional[str] = None) -> str:
+            dados = {
+                "id": identificador, "object": "chat.completion.chunk", "created": criado, "model": modelo,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": fim}],
+            }
+            return f"data: {json.dumps(dados)}\n\n"
+
+        async def eventos():
+            await asyncio.sleep(config.latencia_chat_ms / 1000)
+            yield pedaco({"role": "assistant", "content": ""})
+            for trecho in trechos:
+                yield pedaco({"content": trecho})
+                await asyncio.sleep(config.intervalo_token_ms / 1000)
+            yield pedaco({}, "stop")
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(eventos(), media_type="text/event-stream")
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        corpo = await request.json()
+        contadores["embeddings"] += 1
+        entradas = corpo["input"] if isinstance(corpo["input"], list) else [corpo["input"]]
+        dimensao = corpo.get("dimensions") or DIMENSAO_EMBEDDING
+        await asyncio.sleep(config.latencia_embedding_ms / 1000)
+        dados = []
+        for i, texto in enumerate(entradas):
+            vetor = embedding_deterministico(str(texto), dimensao)
+            # O SDK pede base64 por padrão quando o numpy está instalado
+            if corpo.get("encoding_format") == "base64":
+                valor: Any = base64.b64encode(vetor.astype(np.float32).tobytes()).decode("ascii")
+            else:
+                valor = vetor.tolist()
+            dados.append({"object": "embedding", "index": i, "embedding": valor})
+        tokens = sum(len(str(texto).split()) for texto in entradas)
+        return {
+            "object": "list", "data": dados, "model": corpo.get("model", "text-embedding-3-small"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+    @app.post("/rest/v1/memoria_vetorial")
+    async def inserir(request: Request):
+        corpo = await request.json()
+        contadores["insert"] += 1
+        await asyncio.sleep(config.latencia_supabase_ms / 1000)
+        novas = corpo if isinstance(corpo, list) else [corpo]
+        por_id = {linha["id"]: linha for linha in linhas}
+        for nova in novas:
+            if "id" in nova and nova["id"] in por_id:
+                por_id[nova["id"]].update(nova)  # upsert
+            else:
+                linha = {"id": len(linhas) + 1, **nova}
+                linhas.append(linha)
+        return JSONResponse(novas, status_code=201)
+
+    @app.get("/rest/v1/memoria_vetorial")
+    async def selecionar(request: Request):
+        contadores["select"] += 1
+        await asyncio.sleep(config.latencia_supabase_ms / 1000)
+        parametros = dict(request.query_params)
+        colunas = [c.strip() for c in parametros.pop("select", "*").split(",")]
+        resultado = linhas
+        for coluna, filtro in parametros.items():
+            if filtro.startswith("eq."):
+                resultado = [linha for linha in resultado if str(linha.get(coluna)) == filtro[3:]]
+            elif filtro == "is.null":
+                resultado = [linha for linha in resultado if linha.get(coluna) is None]
+        if "limit" in parametros:
+            resultado = resultado[:int(parametros["limit"])]
+        if colunas != ["*"]:
+            resultado = [{c: linha.get(c) for c in colunas} for linha in resultado]
+        return resultado
+
+    @app.post("/rest/v1/rpc/match_memoria")
+    async def match_memoria(request: Request):
+        corpo = await request.json()
+        contadores["match_memoria"] += 1
+        await asyncio.sleep(config.latencia_supabase_ms / 1000)
+        consulta = np.asarray(json.loads(corpo["query_embedding"]), dtype=np.float32)
+        candidatos = [
+            (linha["consulta_texto"], _similaridade(consulta, linha["embedding"]))
+            for linha in linhas
+            if linha.get("user_id") == corpo["match_user_id"] and linha.get("embedding") is not None
+        ]
+        candidatos = [c for c in candidatos if c[1] > corpo.get("match_threshold", 0.0)]
+        candidatos.sort(key=lambda c: c[1], reverse=True)
+        return [
+            {"consulta_texto": texto, "similarity": similaridade}
+            for texto, similaridade in candidatos[:corpo.get("match_count", 3)]
+        ]
+
+    return app
+
+
+# --- PROCESSOS (SUBSTITUTOS E BACKEND) ---
+
+def porta_livre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def aguardar_saude(url: str, processo: Optional[subprocess.Popen] = None, limite_s: float = 60.0):
+    import httpx
+
+    inicio = time.monotonic()
+    while time.monotonic() - inicio < limite_s:
+        if processo is not None and processo.poll() is not None:
+            raise RuntimeError(f"Processo saiu com código {processo.returncode} antes de responder em {url}")
+        try:
+            if httpx.get(url, timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Sem resposta em {url} após {limite_s:.0f} s")
+
+
+def encerrar(processo: subprocess.Popen):
+    if processo.poll() is None:
+        processo.terminate()
+        try:
+            processo.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            processo.kill()
+            processo.wait()
+
+
+def iniciar_substitutos(config: ConfigSubstitutos, porta: int) -> subprocess.Popen:
+    argumentos = [sys.executable, os.path.abspath(__file__), "substitutos", "--porta", str(porta)]
+    for nome, valor in asdict(config).items():
+        argumentos += [f"--{nome.replace('_', '-')}", str(valor)]
+    processo = subprocess.Popen(argumentos, cwd=DIRETORIO_BACKEND)
+    aguardar_saude(f"http://127.0.0.1:{porta}/health", processo)
+    return processo
+
+
+def ambiente_substitutos(porta_substitutos: int, diretorio_cache: str) -> Dict[str, str]:
+    """Variáveis que apontam OpenAI e Supabase para os substitutos, com cache isolado."""
+    base = f"http://127.0.0.1:{porta_substitutos}"
+    return {
+        "OPENAI_API_KEY": "benchmark",
+        "OPENAI_BASE_URL": f"{base}/v1",
+        "SUPABASE_URL": base,
+        "SUPABASE_SERVICE_ROLE_KEY": "benchmark",
+        "CACHE_DIR": diretorio_cache,
+        "GURU_RESPOSTA_SIMULADA": "0",
+        "SENTRY_DSN": "",
+    }
+
+
+def iniciar_backend(ambiente: Dict[str, str], porta: int, workers: int) -> subprocess.Popen:
+    processo = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(porta),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=DIRETORIO_BACKEND, env={**os.environ, **ambiente},
+    )
+    aguardar_saude(f"http://127.0.0.1:{porta}/health", processo, limite_s=120.0)
+    return processo
+
+
+# --- MEMÓRIA DOS PROCESSOS ---
+
+def _rss_mb(pid: int) -> Optional[float]:
+    try:
+        with open(f"/proc/{pid}/status") as arquivo:
+            for linha in arquivo:
+                if linha.startswith("VmRSS:"):
+                    return int(linha.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+def _filhos(pid: int) -> List[int]:
+    filhos = []
+    try:
+        for tarefa in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{tarefa}/children") as arquivo:
+                filhos += [int(p) for p in arquivo.read().split()]
+    except OSError:
+        pass
+    return filhos
+
+
+def workers_do_servidor(pid: int) -> List[int]:
+    """Com --workers > 1 o uvicorn é um supervisor e os workers são os processos filhos Python."""
+    filhos = []
+    for filho in _filhos(pid):
+        try:
+            with open(f"/proc/{filho}/cmdline", "rb") as arquivo:
+                comando = arquivo.read()
+        except OSError:
+            continue
+        # O rastreador de recursos do multiprocessing não atende requisições
+        if b"resource_tracker" not in comando:
+            filhos.append(filho)
+    return filhos or [pid]
+
+
+class MonitorMemoria:
+    """Amostra o RSS dos workers (incluindo os processos de mapas de cada um) e guarda o pico."""
+
+    def __init__(self, workers: List[int], intervalo_s: float = 0.25):
+        self.workers = workers
+        self.intervalo_s = intervalo_s
+        self.picos: Dict[int, float] = {}
+
+    def amostrar(self):
+        for worker in self.workers:
+            arvore = [worker]
+            for pid in arvore:
+                arvore += _filhos(pid)
+            total = sum(rss for rss in map(_rss_mb, arvore) if rss is not None)
+            if total:
+                self.picos[worker] = max(self.picos.get(worker, 0.0), total)
+
+    async def executar(self, parar: asyncio.Event):
+        while not parar.is_set():
+            self.amostrar()
+            try:
+                await asyncio.wait_for(parar.wait(), self.intervalo_s)
+            except asyncio.TimeoutError:
+                pass
+        self.amostrar()
+
+
+# --- CARGA ---
+
+CIDADES = [
+    "São Paulo, Brasil", "Rio de Janeiro, Brasil", "Belo Horizonte, Brasil", "Salvador, Brasil",
+    "Porto Alegre, Brasil", "Recife, Brasil", "Lisboa, Portugal", "Porto, Portugal",
+    "Buenos Aires, Argentina", "Madrid, Espanha",
+]
+TEMAS = ["trabalho", "amor", "família", "mudança de cidade", "saúde", "estudos", "dinheiro", "amizade"]
+MODELOS_PERGUNTA = [
+    "O que as cartas dizem sobre {tema} neste momento?",
+    "Devo tomar uma decisão sobre {tema} este mês?",
+    "Como posso lidar melhor com {tema} nos próximos dias?",
+    "Qual energia me acompanha em relação a {tema}?",
+]
+VOZES = ["companheira", "mistica", "sábia"]
+CARTAS_RAG = ["O Louco (Direita)", "O Mago (Invertida)", "A Estrela (Direita)", "A Torre (Invertida)", "O Sol (Direita)"]
+ASTROLOGIA_RAG = {"sol": "Gêmeos", "lua": "Libra", "ascendente": "Leão"}
+
+
+class GeradorConsultas:
+    def __init__(self, semente: int = 42, perguntas_distintas: int = 64, fracao_mapa: float = 0.8):
+        self.aleatorio = random.Random(semente)
+        perguntas = [modelo.format(tema=tema) for modelo in MODELOS_PERGUNTA for tema in TEMAS]
+        self.perguntas = [
+            perguntas[i % len(perguntas)] + ("" if i < len(perguntas) else f" ({i})")
+            for i in range(perguntas_distintas)
+        ]
+        self.fracao_mapa = fracao_mapa
+
+    def pergunta(self) -> str:
+        return self.aleatorio.choice(self.perguntas)
+
+    def consulta(self) -> Dict[str, Any]:
+        corpo: Dict[str, Any] = {"pergunta": self.pergunta(), "voz_guru": self.aleatorio.choice(VOZES)}
+        if self.aleatorio.random() < self.fracao_mapa:
+            corpo["dados_nascimento"] = {
+                "nome": "Benchmark",
+                "data_nascimento": f"{self.aleatorio.randint(1950, 2005)}-{self.aleatorio.randint(1, 12):02d}-{self.aleatorio.randint(1, 28):02d}",
+                "hora_nascimento": f"{self.aleatorio.randint(0, 23):02d}:{self.aleatorio.randint(0, 59):02d}",
+                "local_nascimento": self.aleatorio.choice(CIDADES),
+            }
+        return corpo
+
+
+def percentis(valores: List[float]) -> Dict[str, float]:
+    if not valores:
+        return {}
+    ordenados = np.sort(np.asarray(valores, dtype=np.float64))
+    def p(q: float) -> float:
+        # nearest-rank
+        return round(float(ordenados[max(0, int(np.ceil(q * len(ordenados))) - 1)]), 2)
+    return {
+        "p50": p(0.50), "p95": p(0.95), "p99": p(0.99),
+        "media": round(float(ordenados.mean()), 2), "max": round(float(ordenados[-1]), 2),
+    }
+
+
+def _server_timing(cabecalho: str) -> Dict[str, float]:
+    etapas = {}
+    for parte in cabecalho.split(","):
+        nome, _, duracao = parte.strip().partition(";dur=")
+        if duracao:
+            etapas[nome] = float(duracao)
+    return etapas
+
+
+async def executar_carga(requisicao: Callable[[int], Awaitable[Optional[Dict[str, float]]]],
+                         total: int, concorrencia: int, aquecimento: int = 0) -> Dict[str, Any]:
+    """
+    Executa `total` requisições com até `concorrencia` em voo. `requisicao(i)` devolve
+    medidas extras opcionais (ms) e levanta exceção em caso de erro.
+    """
+    for i in range(aquecimento):
+        try:
+            await requisicao(-1 - i)
+        except Exception:
+            pass
+
+    latencias: List[float] = []
+    extras: Dict[str, List[float]] = {}
+    erros: Dict[str, int] = {}
+    proxima = iter(range(total))
+
+    async def trabalhador():
+        for i in proxima:
+            inicio = time.perf_counter()
+            try:
+                medidas = await requisicao(i)
+            except Exception as e:
+                chave = type(e).__name__
+                erros[chave] = erros.get(chave, 0) + 1
+                continue
+            latencias.append((time.perf_counter() - inicio) * 1000)
+            for nome, valor in (medidas or {}).items():
+                extras.setdefault(nome, []).append(valor)
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*[trabalhador() for _ in range(concorrencia)])
+    duracao = time.perf_counter() - inicio
+    resultado: Dict[str, Any] = {
+        "requisicoes": total,
+        "erros": sum(erros.values()),
+        "tipos_erro": erros,
+        "duracao_s": round(duracao, 2),
+        "requisicoes_por_segundo": round(len(latencias) / duracao, 2) if duracao else 0.0,
+        "latencia_ms": percentis(latencias),
+    }
+    if extras:
+        resultado["extras_ms"] = {nome: percentis(valores) for nome, valores in extras.items()}
+    return resultado
+
+
+async def cenario_consulta(url: str, gerador: GeradorConsultas, args) -> Dict[str, Any]:
+    import httpx
+
+    limites = httpx.Limits(max_connections=args.concorrencia, max_keepalive_connections=args.concorrencia)
+    async with httpx.AsyncClient(base_url=url, limits=limites, timeout=args.timeout) as cliente:
+        async def requisicao(_: int) -> Dict[str, float]:
+            resposta = await cliente.post("/consulta-tarot", json=gerador.consulta())
+            resposta.raise_for_status()
+            return _server_timing(resposta.headers.get("server-timing", ""))
+
+        return await executar_carga(requisicao, args.requisicoes, args.concorrencia, args.aquecimento)
+
+
+async def cenario_stream(url: str, gerador: GeradorConsultas, args) -> Dict[str, Any]:
+    import httpx
+
+    limites = httpx.Limits(max_connections=args.concorrencia, max_keepalive_connections=args.concorrencia)
+    async with httpx.AsyncClient(base_url=url, limits=limites, timeout=args.timeout) as cliente:
+        async def requisicao(_: int) -> Dict[str, float]:
+            inicio = time.perf_counter()
+            primeiro_token = None
+            async with cliente.stream("POST", "/consulta-tarot/stream", json=gerador.consulta()) as resposta:
+                resposta.raise_for_status()
+                async for linha in resposta.aiter_lines():
+                    if linha == "event: token" and primeiro_token is None:
+                        primeiro_token = (time.perf_counter() - inicio) * 1000
+                    elif linha == "event: erro":
+                        raise RuntimeError("evento de erro no stream")
+                    elif linha == "event: fim":
+                        break
+            return {"primeiro_token": primeiro_token} if primeiro_token is not None else {}
+
+        return await executar_carga(requisicao, args.requisicoes, args.concorrencia, args.aquecimento)
+
+
+def semear_memorias(url_substitutos: str, usuarios: List[str], por_usuario: int, gerador: GeradorConsultas):
+    """Histórico inicial dos usuários do cenário rag, gravado direto no substituto do Supabase."""
+    import httpx
+
+    linhas = []
+    for usuario in usuarios:
+        for _ in range(por_usuario):
+            texto = f"Pergunta: {gerador.pergunta()}. Cartas: {', '.join(gerador.aleatorio.sample(CARTAS_RAG, 3))}."
+            linhas.append({
+                "user_id": usuario,
+                "consulta_texto": texto,
+                "embedding": json.dumps(embedding_deterministico(texto).tolist()),
+            })
+    if linhas:
+        httpx.post(f"{url_substitutos}/rest/v1/memoria_vetorial", json=linhas, timeout=60.0).raise_for_status()
+
+
+async def cenario_rag(gerador: GeradorConsultas, args) -> Dict[str, Any]:
+    """Caminho RAG do guru_ia no processo do benchmark (o ambiente já aponta para os substitutos)."""
+    import guru_ia
+    from memoria import fila_memoria
+
+    usuarios = [f"00000000-0000-0000-0000-{i:012d}" for i in range(1, args.usuarios + 1)]
+    await asyncio.to_thread(semear_memorias, args.url_substitutos, usuarios, args.memorias_por_usuario, gerador)
+
+    async def requisicao(i: int) -> None:
+        usuario = usuarios[i % len(usuarios)]
+        cartas = gerador.aleatorio.sample(CARTAS_RAG, 3)
+        resposta = await asyncio.to_thread(
+            guru_ia.gerar_resposta_com_memoria, usuario, gerador.pergunta(), cartas, ASTROLOGIA_RAG
+        )
+        if resposta.startswith("Erro"):
+            raise RuntimeError(resposta)
+
+    resultado = await executar_carga(requisicao, args.requisicoes, args.concorrencia, args.aquecimento)
+    if fila_memoria is not None:
+        await asyncio.to_thread(fila_memoria.drenar)
+    return resultado
+
+
+# --- BASE E COMPARAÇÃO ---
+
+def _commit_atual() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=DIRETORIO_BACKEND,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _valor(cenario: Dict[str, Any], caminho) -> Optional[float]:
+    for chave in caminho:
+        if not isinstance(cenario, dict) or chave not in cenario:
+            return None
+        cenario = cenario[chave]
+    return cenario
+
+
+def comparar_com_base(atual: Dict[str, Any], base: Dict[str, Any], tolerancia: float) -> List[str]:
+    """Imprime a variação de cada métrica e devolve as que pioraram além da tolerância."""
+    regressoes = []
+    for nome, cenario in atual["cenarios"].items():
+        cenario_base = base.get("cenarios", {}).get(nome)
+        if not cenario_base:
+            print(f"{nome}: sem base para comparar")
+            continue
+        for caminho, maior_melhor in METRICAS_COMPARADAS:
+            novo, antigo = _valor(cenario, caminho), _valor(cenario_base, caminho)
+            if novo is None or not antigo:
+                continue
+            variacao = (novo - antigo) / antigo
+            piorou = variacao < -tolerancia if maior_melhor else variacao > tolerancia
+            rotulo = f"{nome}.{'.'.join(caminho)}"
+            print(f"{rotulo:45s} {antigo:10.2f} -> {novo:10.2f} ({variacao:+.1%}){'  REGRESSÃO' if piorou else ''}")
+            if piorou:
+                regressoes.append(rotulo)
+    return regressoes
+
+
+def imprimir_resultado(nome: str, resultado: Dict[str, Any]):
+    latencia = resultado["latencia_ms"]
+    print(f"\n[{nome}] {resultado['requisicoes']} requisições, {resultado['erros']} erros, "
+          f"{resultado['requisicoes_por_segundo']} req/s")
+    if latencia:
+        print(f"  latência ms: p50={latencia['p50']} p95={latencia['p95']} p99={latencia['p99']} max={latencia['max']}")
+    for extra, valores in resultado.get("extras_ms", {}).items():
+        print(f"  {extra} ms: p50={valores['p50']} p95={valores['p95']} p99={valores['p99']}")
+    for processo, mb in resultado.get("memoria_workers_mb", {}).items():
+        print(f"  memória {processo}: {mb} MB (pico)")
+
+
+async def executar_benchmark(args) -> Dict[str, Any]:
+    cenarios = [c.strip() for c in args.cenarios.split(",") if c.strip()]
+    config = ConfigSubstitutos(
+        latencia_chat_ms=args.latencia_chat_ms, tokens_resposta=args.tokens_resposta,
+        intervalo_token_ms=args.intervalo_token_ms, latencia_embedding_ms=args.latencia_embedding_ms,
+        latencia_supabase_ms=args.latencia_supabase_ms,
+    )
+    extras_ambiente = dict(item.split("=", 1) for item in args.env)
+    processos: List[subprocess.Popen] = []
+    diretorio_cache = tempfile.mkdtemp(prefix="benchmark-tarot-")
+
+    try:
+        porta_substitutos = args.porta_substitutos or porta_livre()
+        processos.append(iniciar_substitutos(config, porta_substitutos))
+        args.url_substitutos = f"http://127.0.0.1:{porta_substitutos}"
+        ambiente = {**ambiente_substitutos(porta_substitutos, diretorio_cache), **extras_ambiente}
+
+        url = args.url
+        servidor = None
+        if not url and {"consulta", "stream"} & set(cenarios):
+            porta = porta_livre()
+            servidor = iniciar_backend(ambiente, porta, args.workers)
+            processos.append(servidor)
+            url = f"http://127.0.0.1:{porta}"
+
+        resultados: Dict[str, Any] = {}
+        for nome in cenarios:
+            gerador = GeradorConsultas(args.semente, args.perguntas_distintas, args.fracao_mapa)
+            if nome == "rag":
+                # O caminho RAG roda aqui mesmo: o ambiente precisa valer antes do import do guru_ia
+                os.environ.update(ambiente)
+                workers = [os.getpid()]
+                execucao = cenario_rag(gerador, args)
+            elif nome in ("consulta", "stream"):
+                workers = workers_do_servidor(servidor.pid) if servidor else []
+                execucao = (cenario_consulta if nome == "consulta" else cenario_stream)(url, gerador, args)
+            else:
+                raise ValueError(f"Cenário desconhecido: {nome}")
+
+            monitor = MonitorMemoria(workers)
+            parar = asyncio.Event()
+            tarefa_monitor = asyncio.create_task(monitor.executar(parar))
+            try:
+                resultado = await execucao
+            finally:
+                parar.set()
+                await tarefa_monitor
+            if monitor.picos:
+                resultado["memoria_workers_mb"] = {str(pid): round(mb, 1) for pid, mb in monitor.picos.items()}
+                resultado["memoria_pico_mb"] = round(max(monitor.picos.values()), 1)
+            resultados[nome] = resultado
+            imprimir_resultado(nome, resultado)
+    finally:
+        for processo in reversed(processos):
+            encerrar(processo)
+
+    return {
+        "versao": VERSAO_BASE,
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "commit": _commit_atual(),
+        "config": {
+            "concorrencia": args.concorrencia,
+            "requisicoes": args.requisicoes,
+            "workers": args.workers,
+            "perguntas_distintas": args.perguntas_distintas,
+            "fracao_mapa": args.fracao_mapa,
+            "substitutos": asdict(config),
+            "env": extras_ambiente,
+        },
+        "cenarios": resultados,
+    }
+
+
+def _argumentos_substitutos(parser):
+    padrao = ConfigSubstitutos()
+    parser.add_argument("--latencia-chat-ms", type=float, default=padrao.latencia_chat_ms)
+    parser.add_argument("--tokens-resposta", type=int, default=padrao.tokens_resposta)
+    parser.add_argument("--intervalo-token-ms", type=float, default=padrao.intervalo_token_ms)
+    parser.add_argument("--latencia-embedding-ms", type=float, default=padrao.latencia_embedding_ms)
+    parser.add_argument("--latencia-supabase-ms", type=float, default=padrao.latencia_supabase_ms)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    if sys.argv[1:2] == ["substitutos"]:
+        import uvicorn
+
+        parser = argparse.ArgumentParser(description="Substitutos locais da OpenAI e do Supabase")
+        parser.add_argument("--porta", type=int, default=8787)
+        _argumentos_substitutos(parser)
+        args = parser.parse_args(sys.argv[2:])
+        config = ConfigSubstitutos(**{
+            nome: getattr(args, nome) for nome in asdict(ConfigSubstitutos())
+        })
+        uvicorn.run(criar_app_substitutos(config), host="127.0.0.1", port=args.porta, log_level="warning")
+        sys.exit(0)
+
+    parser = argparse.ArgumentParser(description="Benchmark offline do backend do Tarot")
+    parser.add_argument("--cenarios", default="consulta,stream,rag")
+    parser.add_argument("--concorrencia", type=int, default=16)
+    parser.add_argument("--requisicoes", type=int, default=300)
+    parser.add_argument("--aquecimento", type=int, default=10, help="Requisições descartadas antes da medição")
+    parser.add_argument("--workers", type=int, default=1, help="Workers do uvicorn")
+    parser.add_argument("--url", help="Usar um backend já em execução (que deve apontar para os substitutos)")
+    parser.add_argument("--porta-substitutos", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--perguntas-distintas", type=int, default=64)
+    parser.add_argument("--fracao-mapa", type=float, default=0.8, help="Fração das consultas com dados de nascimento")
+    parser.add_argument("--usuarios", type=int, default=20, help="Usuários do cenário rag")
+    parser.add_argument("--memorias-por-usuario", type=int, default=20)
+    parser.add_argument("--env", action="append", default=[], metavar="NOME=VALOR",
+                        help="Variável extra para o backend (p.ex. CACHE_SEMANTICO=1)")
+    parser.add_argument("--salvar-base", help="Salvar o resultado como base neste arquivo JSON")
+    parser.add_argument("--comparar", help="Comparar com a base salva neste arquivo JSON")
+    parser.add_argument("--tolerancia", type=float, default=0.15, help="Piora relativa aceita na comparação")
+    _argumentos_substitutos(parser)
+    args = parser.parse_args()
+
+    resultado = asyncio.run(executar_benchmark(args))
+
+    if args.salvar_base:
+        with open(args.salvar_base, "w", encoding="utf-8") as arquivo:
+            json.dump(resultado, arquivo, ensure_ascii=False, indent=2)
+        print(f"\nBase salva em {args.salvar_base}")
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as arquivo:
+            base = json.load(arquivo)
+        print(f"\nComparação com {args.comparar} (commit {base.get('commit')}, {base.get('data')}):")
+        regressoes = comparar_com_base(resultado, base, args.tolerancia)
+        if regressoes:
+            print(f"{len(regressoes)} métrica(s) pioraram mais que {args.tolerancia:.0%}")
+            sys.exit(1)
@@ -0,0 +1,295 @@
+"""
+Biblioteca de interpretações pré-geradas por tiragem e voz (modo rápido).
+
+Com os 22 Arcanos Maiores nas três posições fixas (Passado/Presente/Futuro) há
+22·21·20 = 9.240 tiragens ordenadas por voz. Cada uma recebe, offline, uma
+interpretação base; o arquivo compilado é mapeado em memória (compartilhado
+entre os workers pelo cache de páginas do sistema) e consultado pelo id da
+tiragem em microssegundos, sem chamada à IA.
+
+Formato do arquivo (inteiros little-endian):
+    b"TARB" | u32 tamanho do cabeçalho | cabeçalho JSON (versão, vozes, cartas)
+    | preenchimento até múltiplo de 8 | n+1 offsets u64 | textos UTF-8 comprimidos (zlib)
+A entrada da voz v e da tiragem t é v * tiragens_por_voz + t; entradas vazias
+(offset[i] == offset[i+1]) ainda não foram geradas.
+
+Geração (retomável: o progresso fica em <arquivo>.parcial.jsonl e o .bin é
+recompilado no fim):
+    python biblioteca.py gerar [--concorrencia 8] [--vozes companheira,mistica] [--limite 500]
+    python biblioteca.py gerar --modelo-local     # textos montados dos significados, sem IA
+    python biblioteca.py compilar                 # só recompila a partir do .parcial.jsonl
+"""
+
+import os
+import json
+import math
+import mmap
+import zlib
+import struct
+import asyncio
+import threading
+from itertools import permutations
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+CAMINHO_BIBLIOTECA = os.getenv(
+    "BIBLIOTECA_TIRAGENS",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "dados", "biblioteca_tiragens.bin")
+)
+MAGICO = b"TARB"
+VERSAO = 1
+POSICOES = 3
+
+
+def id_tiragem(indices: Sequence[int], total_cartas: int) -> int:
+    """Posição da tiragem ordenada (sem repetição) na enumeração de itertools.permutations."""
+    restantes = list(range(total_cartas))
+    identificador = 0
+    for indice in indices:
+        posicao = restantes.index(indice)
+        identificador = identificador * len(restantes) + posicao
+        restantes.pop(posicao)
+    return identificador
+
+
+def interpretacao_modelo_local(cartas: Sequence[Any], voz_config: Dict[str, str]) -> str:
+    """Interpretação base montada só com os significados das cartas (sem IA), no tom da voz."""
+    paragrafos = [f"Como Guru {voz_config['tom']}, leio a tiragem assim:"]
+    paragrafos += [f"{carta.posicao}: {carta.nome}. {carta.significado_geral}." for carta in cartas]
+    paragrafos.append(
+        f"Juntas, as cartas contam uma passagem de {cartas[0].nome} para {cartas[-1].nome}, "
+        f"com {cartas[1].nome} como chave do momento presente."
+    )
+    return "\n\n".join(paragrafos)
+
+
+def compilar_biblioteca(textos: Iterable[Tuple[str, int, str]], vozes: List[str], cartas: List[str],
+                        caminho: str = CAMINHO_BIBLIOTECA) -> int:
+    """
+    Grava o arquivo da biblioteca a partir de (voz, id da tiragem, texto). A troca
+    é atômica, então workers com a versão anterior mapeada não são afetados.
+    Devolve o número de entradas preenchidas.
+    """
+    tiragens_por_voz = math.perm(len(cartas), POSICOES)
+    posicao_voz = {voz: i for i, voz in enumerate(vozes)}
+    entradas: Dict[int, bytes] = {}
+    for voz, identificador, texto in textos:
+        if voz in posicao_voz and 0 <= identificador < tiragens_por_voz:
+            entradas[posicao_voz[voz] * tiragens_por_voz + identificador] = zlib.compress(texto.encode("utf-8"), 9)
+
+    cabecalho = json.dumps({"versao": VERSAO, "vozes": vozes, "cartas": cartas}, ensure_ascii=False).encode("utf-8")
+    inicio_offsets = len(MAGICO) + 4 + len(cabecalho)
+    inicio_offsets += -inicio_offsets % 8
+    total = len(vozes) * tiragens_por_voz
+    offsets = []
+    posicao = inicio_offsets + 8 * (total + 1)
+    for i in range(total):
+        offsets.append(posicao)
+        posicao += len(entradas.get(i, b""))
+    offsets.append(posicao)
+
+    os.makedirs(os.path.dirname(os.path.abspath(caminho)), exist_ok=True)
+    temporario = f"{caminho}.tmp"
+    with open(temporario, "wb") as arquivo:
+        arquivo.write(MAGICO + struct.pack("<I", len(cabecalho)) + cabecalho)
+        arquivo.write(b"\0" * (inicio_offsets - arquivo.tell()))
+        arquivo.write(struct.pack(f"<{len(offsets)}Q", *offsets))
+        for i in sorted(entradas):
+            arquivo.write(entradas[i])
+    os.replace(temporario, caminho)
+    return len(entradas)
+
+
+class BibliotecaTiragens:
+    def __init__(self, caminho: str = CAMINHO_BIBLIOTECA):
+        self.caminho = caminho
+        self.vozes: List[str] = []
+        self.cartas: List[str] = []
+        self.tiragens_por_voz = 0
+        self._indice_cartas: Dict[str, int] = {}
+        self._mapa: Optional[mmap.mmap] = None
+        self._inicio_offsets = 0
+        self.entradas = 0
+        self._carregada = False
+        self._lock = threading.Lock()
+        self.consultas = 0
+        self.acertos = 0
+
+    def carregar(self) -> bool:
+        """Mapeia o arquivo na primeira chamada; False se não houver biblioteca utilizável."""
+        if self._carregada:
+            return self._mapa is not None
+        with self._lock:
+            if self._carregada:
+                return self._mapa is not None
+            self._carregada = True
+            if not os.path.exists(self.caminho):
+                print(f"Biblioteca de tiragens não encontrada em {self.caminho}: o modo rápido usa a IA")
+                return False
+            try:
+                with open(self.caminho, "rb") as arquivo:
+                    mapa = mmap.mmap(arquivo.fileno(), 0, access=mmap.ACCESS_READ)
+                if mapa[:4] != MAGICO:
+                    raise ValueError("arquivo não é uma biblioteca de tiragens")
+                tamanho = struct.unpack_from("<I", mapa, 4)[0]
+                cabecalho = json.loads(mapa[8:8 + tamanho].decode("utf-8"))
+                if cabecalho["versao"] != VERSAO:
+                    raise ValueError(f"versão {cabecalho['versao']} não suportada")
+                inicio_offsets = 8 + tamanho
+                inicio_offsets += -inicio_offsets % 8
+                self.vozes = cabecalho["vozes"]
+                self.cartas = cabecalho["cartas"]
+                self.tiragens_por_voz = math.perm(len(self.cartas), POSICOES)
+                self._indice_cartas = {nome: i for i, nome in enumerate(self.cartas)}
+                self.entradas = len(self.vozes) * self.tiragens_por_voz
+                if len(mapa) < inicio_offsets + 8 * (self.entradas + 1):
+                    raise ValueError("arquivo truncado")
+                self._inicio_offsets = inicio_offsets
+                self._mapa = mapa
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Erro ao carregar biblioteca de tiragens: {e}")
+                return False
+        return True
+
+    def buscar(self, voz: str, cartas: Sequence[str]) -> Optional[str]:
+        """Interpretação base da tiragem (nomes das cartas em Passado/Presente/Futuro), ou None."""
+        self.consultas += 1
+        if not self.carregar():
+            return None
+        try:
+            posicao_voz = self.vozes.index(voz)
+            indices = [self._indice_cartas[nome] for nome in cartas]
+        except (ValueError, KeyError):
+            return None
+        if len(indices) != POSICOES or len(set(indices)) != POSICOES:
+            return None
+        entrada = posicao_voz * self.tiragens_por_voz + id_tiragem(indices, len(self.cartas))
+        inicio, fim = struct.unpack_from("<QQ", self._mapa, self._inicio_offsets + 8 * entrada)
+        if inicio == fim:
+            return None
+        self.acertos += 1
+        return zlib.decompress(self._mapa[inicio:fim]).decode("utf-8")
+
+    def estatisticas(self) -> Dict[str, Any]:
+        return {
+            "disponivel": self._mapa is not None,
+            "vozes": self.vozes,
+            "entradas": self.entradas,
+            "consultas": self.consultas,
+            "acertos": self.acertos,
+        }
+
+    def fechar(self):
+        with self._lock:
+            mapa, self._mapa = self._mapa, None
+            self._carregada = False
+        if mapa is not None:
+            mapa.close()
+
+
+biblioteca_tiragens = BibliotecaTiragens()
+
+
+def ler_parcial(caminho_parcial: str) -> Dict[Tuple[str, int], str]:
+    textos: Dict[Tuple[str, int], str] = {}
+    if os.path.exists(caminho_parcial):
+        with open(caminho_parcial, encoding="utf-8") as arquivo:
+            for linha in arquivo:
+                try:
+                    item = json.loads(linha)
+                except json.JSONDecodeError:
+                    continue  # última linha cortada por uma interrupção
+                textos[(item["voz"], item["id"])] = item["texto"]
+    return textos
+
+
+async def gerar_textos(vozes: List[str], total_cartas: int,
+                       gerar: Callable[[str, Tuple[int, ...]], Awaitable[str]],
+                       caminho_parcial: str, concorrencia: int = 8, limite: Optional[int] = None) -> int:
+    """
+    Gera as interpretações que ainda não estão no arquivo parcial (JSON lines),
+    com até `concorrencia` chamadas em paralelo. Falhas ficam para a próxima
+    execução. Devolve quantas foram geradas agora.
+    """
+    feitas = ler_parcial(caminho_parcial)
+    pendentes = [
+        (voz, identificador, tiragem)
+        for voz in vozes
+        for identificador, tiragem in enumerate(permutations(range(total_cartas), POSICOES))
+        if (voz, identificador) not in feitas
+    ][:limite]
+    semaforo = asyncio.Semaphore(concorrencia)
+    geradas = 0
+    os.makedirs(os.path.dirname(os.path.abspath(caminho_parcial)), exist_ok=True)
+
+    with open(caminho_parcial, "a", encoding="utf-8") as arquivo:
+        async def gerar_uma(voz: str, identificador: int, tiragem: Tuple[int, ...]):
+            nonlocal geradas
+            async with semaforo:
+                try:
+                    texto = await gerar(voz, tiragem)
+                except Exception as e:
+                    print(f"Erro ao gerar a tiragem {identificador} da voz {voz}: {e}")
+                    return
+            arquivo.write(json.dumps({"voz": voz, "id": identificador, "texto": texto}, ensure_ascii=False) + "\n")
+            arquivo.flush()
+            geradas += 1
+            if geradas % 500 == 0:
+                print(f"{geradas}/{len(pendentes)} interpretações geradas")
+
+        await asyncio.gather(*[gerar_uma(*pendente) for pendente in pendentes])
+    return geradas
+
+
+if __name__ == "__main__":
+    import time
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Biblioteca de interpretações pré-geradas (modo rápido)")
+    parser.add_argument("comando", choices=["gerar", "compilar"])
+    parser.add_argument("--arquivo", default=CAMINHO_BIBLIOTECA)
+    parser.add_argument("--vozes", help="Vozes a gerar, separadas por vírgula (padrão: todas)")
+    parser.add_argument("--concorrencia", type=int, default=8)
+    parser.add_argument("--limite", type=int, help="Gerar no máximo este número de interpretações nesta execução")
+    parser.add_argument("--modelo", default="gpt-4.1-mini")
+    parser.add_argument("--modelo-local", action="store_true",
+                        help="Montar os textos a partir dos significados das cartas, sem chamar a IA")
+    args = parser.parse_args()
+
+    # Cartas, vozes e prompts são os mesmos da API
+    import main
+    from clientes import registro_clientes
+
+    cartas = [carta["nome"] for carta in main.ARCANOS_MAIORES]
+    vozes = list(main.VOZES_GURU)
+    caminho_parcial = f"{args.arquivo}.parcial.jsonl"
+
+    if args.comando == "gerar":
+        selecionadas = args.vozes.split(",") if args.vozes else vozes
+
+        async def gerar_com_ia(voz: str, tiragem: Tuple[int, ...]) -> str:
+            resposta = await registro_clientes.openai_async.chat.completions.create(
+                model=args.modelo,
+                messages=main.montar_mensagens_interpretacao(
+                    main.PERGUNTA_BIBLIOTECA, main.cartas_da_tiragem(tiragem), None, voz
+                ),
+                max_tokens=600,
+                temperature=0.7
+            )
+            return resposta.choices[0].message.content
+
+        async def gerar_local(voz: str, tiragem: Tuple[int, ...]) -> str:
+            return interpretacao_modelo_local(main.cartas_da_tiragem(tiragem), main.VOZES_GURU[voz])
+
+        inicio = time.perf_counter()
+        geradas = asyncio.run(gerar_textos(
+            selecionadas, len(cartas), gerar_local if args.modelo_local else gerar_com_ia,
+            caminho_parcial, args.concorrencia, args.limite
+        ))
+        print(f"{geradas} interpretações geradas em {time.perf_counter() - inicio:.1f} s")
+
+    textos = ler_parcial(caminho_parcial)
+    preenchidas = compilar_biblioteca(
+        ((voz, identificador, texto) for (voz, identificador), texto in textos.items()), vozes, cartas, args.arquivo
+    )
+    total = len(vozes) * math.perm(len(cartas), POSICOES)
+    print(f"{args.arquivo}: {preenchidas}/{total} entradas, {os.path.getsize(args.arquivo) / 1e6:.1f} MB")
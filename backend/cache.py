@@ -0,0 +1,148 @@
+"""
+Caches reutilizáveis do backend: LRU em memória e armazenamento persistente em SQLite.
+"""
+
+import os
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+# Diretório padrão dos caches persistentes
+CACHE_DIR = os.getenv("CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+
+
+class CacheLRU:
+    """Cache em memória, limitado em número de itens, com descarte do menos usado."""
+
+    def __init__(self, max_itens: int = 1024):
+        self.max_itens = max_itens
+        self._itens: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+
+    def obter(self, chave: str) -> Optional[Any]:
+        with self._lock:
+            if chave not in self._itens:
+                self.falhas += 1
+                return None
+            self._itens.move_to_end(chave)
+            self.acertos += 1
+            return self._itens[chave]
+
+    def guardar(self, chave: str, valor: Any):
+        with self._lock:
+            self._itens[chave] = valor
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._itens)
+
+    def estatisticas(self) -> Dict[str, Any]:
+        return {
+            "itens": len(self._itens),
+            "max_itens": self.max_itens,
+            "acertos": self.acertos,
+            "falhas": self.falhas,
+        }
+
+
+class CacheSQLite:
+    """
+    Cache persistente chave/valor (JSON) em SQLite.
+    Sobrevive a reinícios e é compartilhado entre os workers do uvicorn.
+    """
+
+    def __init__(self, caminho: str, tabela: str = "cache"):
+        self.caminho = caminho
+        self.tabela = tabela
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+
+        os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+        self._conexao = sqlite3.connect(caminho, timeout=10, check_same_thread=False)
+        self._conexao.execute("PRAGMA journal_mode=WAL")
+        self._conexao.execute(
+            f"CREATE TABLE IF NOT EXISTS {tabela} (chave TEXT PRIMARY KEY, valor TEXT NOT NULL)"
+        )
+        self._conexao.commit()
+
+    def obter(self, chave: str) -> Optional[Any]:
+        with self._lock:
+            linha = self._conexao.execute(
+                f"SELECT valor FROM {self.tabela} WHERE chave = ?", (chave,)
+            ).fetchone()
+            if linha is None:
+                self.falhas += 1
+                return None
+            self.acertos += 1
+            return json.loads(linha[0])
+
+    def guardar(self, chave: str, valor: Any):
+        with self._lock:
+            self._conexao.execute(
+                f"INSERT OR REPLACE INTO {self.tabela} (chave, valor) VALUES (?, ?)",
+                (chave, json.dumps(valor, ensure_ascii=False))
+            )
+            self._conexao.commit()
+
+    def estatisticas(self) -> Dict[str, Any]:
+        return {
+            "caminho": self.caminho,
+            "acertos": self.acertos,
+            "falhas": self.falhas,
+        }
+
+
+class CacheDoisNiveis:
+    """
+    Cache em duas camadas: LRU em memória na frente de um armazenamento persistente.
+    Acertos na camada persistente são promovidos para a memória.
+    """
+
+    def __init__(self, memoria: CacheLRU, persistente: Optional[CacheSQLite] = None):
+        self.memoria = memoria
+        self.persistente = persistente
+
+    def obter(self, chave: str) -> Optional[Any]:
+        valor = self.memoria.obter(chave)
+        if valor is not None or self.persistente is None:
+            return valor
+
+        try:
+            valor = self.persistente.obter(chave)
+        except Exception as e:
+            print(f"Erro ao ler cache persistente: {e}")
+            return None
+
+        if valor is not None:
+            self.memoria.guardar(chave, valor)
+        return valor
+
+    def guardar(self, chave: str, valor: Any):
+        self.memoria.guardar(chave, valor)
+        if self.persistente is not None:
+            try:
+                self.persistente.guardar(chave, valor)
+            except Exception as e:
+                print(f"Erro ao gravar cache persistente: {e}")
+
+    def estatisticas(self) -> Dict[str, Any]:
+        return {
+            "memoria": self.memoria.estatisticas(),
+            "persistente": self.persistente.estatisticas() if self.persistente else None,
+        }
+
+
+def criar_cache_persistente(nome_arquivo: str, tabela: str = "cache") -> Optional[CacheSQLite]:
+    """Abre um cache SQLite em CACHE_DIR; devolve None se o disco não estiver disponível."""
+    try:
+        return CacheSQLite(os.path.join(CACHE_DIR, nome_arquivo), tabela)
+    except Exception as e:
+        print(f"Cache persistente indisponível ({nome_arquivo}): {e}")
+        return None
@@ -0,0 +1,114 @@
+"""
+Cache semântico de interpretações.
+
+Uma interpretação só é reaproveitada quando a tiragem é exatamente a mesma
+(cartas e posições, voz da Guru e signos astrológicos) e a pergunta é
+semanticamente próxima de uma já respondida (similaridade de cosseno entre os
+embeddings acima do limiar). Entradas expiram por TTL e, quando o cache enche,
+sai a tiragem usada há mais tempo.
+"""
+
+import time
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+
+@dataclass
+class EntradaCache:
+    # Só o tamanho: o texto da pergunta é privado do consulente e não sai nas estatísticas
+    tamanho_pergunta: int
+    vetor: np.ndarray
+    resposta: str
+    criada_em: float = field(default_factory=time.monotonic)
+    acertos: int = 0
+
+
+class CacheSemantico:
+    def __init__(self, limiar: float = 0.95, ttl_segundos: float = 3600, max_entradas: int = 5000):
+        self.limiar = limiar
+        self.ttl_segundos = ttl_segundos
+        self.max_entradas = max_entradas
+        self._tiragens: "OrderedDict[str, List[EntradaCache]]" = OrderedDict()
+        self._total = 0
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+
+    @staticmethod
+    def _normalizar(vetor: List[float]) -> Optional[np.ndarray]:
+        vetor = np.asarray(vetor, dtype=np.float32)
+        norma = np.linalg.norm(vetor)
+        return vetor / norma if norma > 0 else None
+
+    def _remover_expiradas(self, chave: str, agora: float) -> List[EntradaCache]:
+        entradas = self._tiragens.get(chave, [])
+        validas = [e for e in entradas if agora - e.criada_em <= self.ttl_segundos]
+        self._total -= len(entradas) - len(validas)
+        if validas:
+            self._tiragens[chave] = validas
+        else:
+            self._tiragens.pop(chave, None)
+        return validas
+
+    def buscar(self, chave: str, vetor_pergunta: List[float]) -> Optional[str]:
+        """Resposta cacheada para a tiragem `chave` com pergunta parecida, ou None."""
+        consulta = self._normalizar(vetor_pergunta)
+        with self._lock:
+            entradas = self._remover_expiradas(chave, time.monotonic())
+            if consulta is None or not entradas:
+                self.falhas += 1
+                return None
+
+            similaridades = np.stack([e.vetor for e in entradas]) @ consulta
+            melhor = int(np.argmax(similaridades))
+            if similaridades[melhor] < self.limiar:
+                self.falhas += 1
+                return None
+
+            self._tiragens.move_to_end(chave)
+            entradas[melhor].acertos += 1
+            self.acertos += 1
+            return entradas[melhor].resposta
+
+    def reserva(self, chave: str) -> Optional[str]:
+        """Resposta mais recente da tiragem `chave` para qualquer pergunta (fallback com a IA fora do ar)."""
+        with self._lock:
+            entradas = self._remover_expiradas(chave, time.monotonic())
+            return entradas[-1].resposta if entradas else None
+
+    def guardar(self, chave: str, pergunta: str, vetor_pergunta: List[float], resposta: str):
+        vetor = self._normalizar(vetor_pergunta)
+        if vetor is None:
+            # Sem embedding válido não há como comparar perguntas depois
+            return
+        with self._lock:
+            self._remover_expiradas(chave, time.monotonic())
+            self._tiragens.setdefault(chave, []).append(EntradaCache(len(pergunta), vetor, resposta))
+            self._tiragens.move_to_end(chave)
+            self._total += 1
+
+            while self._total > self.max_entradas:
+                chave_antiga, entradas = next(iter(self._tiragens.items()))
+                entradas.pop(0)
+                self._total -= 1
+                if not entradas:
+                    del self._tiragens[chave_antiga]
+
+    def estatisticas(self, top: int = 10) -> Dict[str, Any]:
+        with self._lock:
+            entradas = [(chave, e) for chave, lista in self._tiragens.items() for e in lista]
+        mais_usadas = sorted(entradas, key=lambda item: item[1].acertos, reverse=True)[:top]
+        return {
+            "entradas": len(entradas),
+            "max_entradas": self.max_entradas,
+            "acertos": self.acertos,
+            "falhas": self.falhas,
+            "mais_usadas": [
+                {"tiragem": chave, "tamanho_pergunta": e.tamanho_pergunta, "acertos": e.acertos}
+                for chave, e in mais_usadas if e.acertos
+            ],
+        }
@@ -0,0 +1,165 @@
+"""
+Registro único dos clientes externos (OpenAI síncrono/assíncrono e Supabase).
+
+Todos os módulos do backend usam as mesmas instâncias, que compartilham pools de
+conexões HTTP (keep-alive e HTTP/2 quando o pacote h2 está instalado) com
+limites e timeouts configuráveis. O registro é iniciado e fechado no lifespan
+do FastAPI; fora dele (scripts), os clientes são criados no primeiro uso. Os
+pacotes httpx, openai e supabase só são importados quando um cliente é criado.
+"""
+
+import os
+import threading
+import importlib.util
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Optional
+
+from inicializacao import importar
+
+if TYPE_CHECKING:
+    import httpx
+    from openai import OpenAI, AsyncOpenAI
+
+
+def _env_float(nome: str, padrao: str) -> float:
+    return float(os.getenv(nome, padrao))
+
+
+@dataclass
+class ConfigClientes:
+    max_conexoes: int = field(default_factory=lambda: int(os.getenv("CLIENTES_MAX_CONEXOES", "100")))
+    max_keepalive: int = field(default_factory=lambda: int(os.getenv("CLIENTES_MAX_KEEPALIVE", "20")))
+    keepalive_s: float = field(default_factory=lambda: _env_float("CLIENTES_KEEPALIVE_S", "30"))
+    http2: bool = field(default_factory=lambda: os.getenv("CLIENTES_HTTP2", "1") == "1")
+    openai_timeout_s: float = field(default_factory=lambda: _env_float("OPENAI_TIMEOUT_S", "30"))
+    openai_connect_timeout_s: float = field(default_factory=lambda: _env_float("OPENAI_CONNECT_TIMEOUT_S", "5"))
+    openai_max_retries: int = field(default_factory=lambda: int(os.getenv("OPENAI_MAX_RETRIES", "2")))
+    supabase_timeout_s: float = field(default_factory=lambda: _env_float("SUPABASE_TIMEOUT_S", "10"))
+
+    def limites(self) -> "httpx.Limits":
+        return importar("httpx").Limits(
+            max_connections=self.max_conexoes,
+            max_keepalive_connections=self.max_keepalive,
+            keepalive_expiry=self.keepalive_s,
+        )
+
+    def usar_http2(self) -> bool:
+        # HTTP/2 depende do pacote opcional h2 (httpx[http2])
+        return self.http2 and importlib.util.find_spec("h2") is not None
+
+
+class RegistroClientes:
+    def __init__(self, config: Optional[ConfigClientes] = None):
+        self._config = config
+        self._lock = threading.Lock()
+        self._http: Optional["httpx.Client"] = None
+        self._http_async: Optional["httpx.AsyncClient"] = None
+        self._openai: Optional["OpenAI"] = None
+        self._openai_async: Optional["AsyncOpenAI"] = None
+        self._supabase = None
+
+    @property
+    def config(self) -> ConfigClientes:
+        # Lida só no primeiro uso, depois de o .env ter sido carregado
+        if self._config is None:
+            self._config = ConfigClientes()
+        return self._config
+
+    def _timeout_openai(self) -> "httpx.Timeout":
+        return importar("httpx").Timeout(self.config.openai_timeout_s, connect=self.config.openai_connect_timeout_s)
+
+    @property
+    def http(self) -> "httpx.Client":
+        """Pool HTTP síncrono compartilhado (OpenAI e Supabase)."""
+        httpx = importar("httpx")
+        with self._lock:
+            if self._http is None:
+                self._http = httpx.Client(
+                    limits=self.config.limites(),
+                    http2=self.config.usar_http2(),
+                    timeout=self._timeout_openai(),
+                )
+            return self._http
+
+    @property
+    def http_async(self) -> "httpx.AsyncClient":
+        """Pool HTTP assíncrono compartilhado."""
+        httpx = importar("httpx")
+        with self._lock:
+            if self._http_async is None:
+                self._http_async = httpx.AsyncClient(
+                    limits=self.config.limites(),
+                    http2=self.config.usar_http2(),
+                    timeout=self._timeout_openai(),
+                )
+            return self._http_async
+
+    @property
+    def openai(self) -> "OpenAI":
+        if self._openai is None:
+            cliente = importar("openai").OpenAI(
+                api_key=os.getenv("OPENAI_API_KEY"),
+                http_client=self.http,
+                timeout=self._timeout_openai(),
+                max_retries=self.config.openai_max_retries,
+            )
+            with self._lock:
+                self._openai = self._openai or cliente
+        return self._openai
+
+    @property
+    def openai_async(self) -> "AsyncOpenAI":
+        if self._openai_async is None:
+            cliente = importar("openai").AsyncOpenAI(
+                api_key=os.getenv("OPENAI_API_KEY"),
+                http_client=self.http_async,
+                timeout=self._timeout_openai(),
+                max_retries=self.config.openai_max_retries,
+            )
+            with self._lock:
+                self._openai_async = self._openai_async or cliente
+        return self._openai_async
+
+    @property
+    def supabase(self):
+        if self._supabase is None:
+            supabase = importar("supabase")
+            url = os.getenv("SUPABASE_URL")
+            chave = os.getenv("SUPABASE_SERVICE_ROLE_KEY") # Chave Service Role (JWT)
+            try:
+                opcoes = supabase.ClientOptions(
+                    postgrest_client_timeout=self.config.supabase_timeout_s,
+                    httpx_client=self.http,
+                )
+            except TypeError:
+                # Versões antigas do supabase-py não aceitam um httpx.Client externo
+                opcoes = supabase.ClientOptions(postgrest_client_timeout=self.config.supabase_timeout_s)
+            cliente = supabase.create_client(url, chave, options=opcoes)
+            with self._lock:
+                self._supabase = self._supabase or cliente
+        return self._supabase
+
+    def iniciar(self):
+        """Cria antecipadamente os clientes que têm configuração no ambiente."""
+        if os.getenv("OPENAI_API_KEY"):
+            self.openai
+            self.openai_async
+        if os.getenv("SUPABASE_URL") and os.getenv("SUPABASE_SERVICE_ROLE_KEY"):
+            try:
+                self.supabase
+            except Exception as e:
+                print(f"Erro ao inicializar cliente Supabase: {e}")
+
+    async def fechar(self):
+        """Fecha os pools de conexões (encerramento da aplicação)."""
+        with self._lock:
+            http, http_async = self._http, self._http_async
+            self._http = self._http_async = None
+            self._openai = self._openai_async = self._supabase = None
+        if http_async is not None:
+            await http_async.aclose()
+        if http is not None:
+            http.close()
+
+
+registro_clientes = RegistroClientes()
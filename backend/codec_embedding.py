@@ -0,0 +1,119 @@
+"""
+Codecs compactos para embeddings (no lugar de json.dumps de 1536 floats).
+
+- float32: bytes do vetor em float32 (4 bytes por dimensão)
+- float16: meia precisão (2 bytes por dimensão)
+- int8: quantização escalar com uma escala float32 por vetor (1 byte por dimensão)
+
+Para 1536 dimensões, o JSON ocupa ~30 KB por vetor; em base64 os codecs ficam
+com ~8 KB, ~4 KB e ~2 KB, respectivamente. Matrizes quantizadas podem ser
+pontuadas diretamente (ver `similaridades`), sem reconstruir o float32.
+"""
+
+import base64
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+class CodecEmbedding:
+    """Codec float32 (sem perda); base para os demais."""
+
+    nome = "float32"
+    dtype = np.float32
+
+    def quantizar(self, matriz: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """Converte uma matriz (n, d) para o formato do codec; devolve (dados, escalas)."""
+        return np.ascontiguousarray(matriz, dtype=self.dtype), None
+
+    def reconstruir(self, dados: np.ndarray, escalas: Optional[np.ndarray]) -> np.ndarray:
+        """Volta do formato do codec para float32."""
+        return dados.astype(np.float32)
+
+    def similaridades(self, dados: np.ndarray, escalas: Optional[np.ndarray],
+                      consulta: np.ndarray) -> np.ndarray:
+        """Produto interno de cada linha com a consulta, direto no formato do codec."""
+        return dados @ consulta.astype(np.float32)
+
+    def codificar(self, vetor: List[float]) -> bytes:
+        dados, escalas = self.quantizar(np.asarray(vetor, dtype=np.float32).reshape(1, -1))
+        prefixo = escalas.astype(np.float32).tobytes() if escalas is not None else b""
+        return prefixo + dados.tobytes()
+
+    def decodificar(self, conteudo: bytes) -> List[float]:
+        dados = np.frombuffer(conteudo, dtype=self.dtype).reshape(1, -1)
+        return self.reconstruir(dados, None)[0].tolist()
+
+
+class CodecFloat16(CodecEmbedding):
+    nome = "float16"
+    dtype = np.float16
+
+
+class CodecInt8(CodecEmbedding):
+    """Quantização escalar simétrica: v ≈ escala * q, com q em [-127, 127]."""
+
+    nome = "int8"
+    dtype = np.int8
+
+    def quantizar(self, matriz: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        matriz = np.asarray(matriz, dtype=np.float32)
+        escalas = np.abs(matriz).max(axis=1) / 127.0
+        escalas[escalas == 0] = 1.0
+        dados = np.clip(np.rint(matriz / escalas[:, None]), -127, 127).astype(np.int8)
+        return dados, escalas.astype(np.float32)
+
+    def reconstruir(self, dados: np.ndarray, escalas: Optional[np.ndarray]) -> np.ndarray:
+        return dados.astype(np.float32) * escalas[:, None]
+
+    def similaridades(self, dados: np.ndarray, escalas: Optional[np.ndarray],
+                      consulta: np.ndarray) -> np.ndarray:
+        return (dados @ consulta.astype(np.float32)) * escalas
+
+    def decodificar(self, conteudo: bytes) -> List[float]:
+        escala = np.frombuffer(conteudo[:4], dtype=np.float32)
+        dados = np.frombuffer(conteudo[4:], dtype=np.int8).reshape(1, -1)
+        return self.reconstruir(dados, escala)[0].tolist()
+
+
+CODECS: Dict[str, CodecEmbedding] = {
+    codec.nome: codec for codec in (CodecEmbedding(), CodecFloat16(), CodecInt8())
+}
+
+
+def obter_codec(nome: str) -> CodecEmbedding:
+    try:
+        return CODECS[nome]
+    except KeyError:
+        raise ValueError(f"Codec de embedding desconhecido: {nome} (opções: {', '.join(CODECS)})")
+
+
+def codificar_base64(vetor: List[float], codec: str) -> str:
+    """Vetor -> texto base64 no formato do codec (para colunas text/JSON)."""
+    return base64.b64encode(obter_codec(codec).codificar(vetor)).decode("ascii")
+
+
+def decodificar_base64(texto: str, codec: str) -> List[float]:
+    return obter_codec(codec).decodificar(base64.b64decode(texto))
+
+
+def avaliar_recall(vetores: np.ndarray, consultas: np.ndarray, codec: str, top_k: int = 3) -> float:
+    """
+    Recall@k do codec em relação à busca exata em float32: fração dos top-k
+    verdadeiros que continuam no top-k ao pontuar no formato quantizado.
+    """
+    vetores = np.asarray(vetores, dtype=np.float32)
+    vetores = vetores / np.linalg.norm(vetores, axis=1, keepdims=True)
+    consultas = np.asarray(consultas, dtype=np.float32)
+    consultas = consultas / np.linalg.norm(consultas, axis=1, keepdims=True)
+
+    implementacao = obter_codec(codec)
+    dados, escalas = implementacao.quantizar(vetores)
+    k = min(top_k, len(vetores))
+
+    acertos = 0
+    for consulta in consultas:
+        exatos = set(np.argsort(-(vetores @ consulta))[:k])
+        aproximados = set(np.argsort(-implementacao.similaridades(dados, escalas, consulta))[:k])
+        acertos += len(exatos & aproximados)
+    return acertos / (k * len(consultas))
@@ -0,0 +1,115 @@
+"""
+Montagem do contexto de memória (RAG) dentro de um orçamento de tokens.
+
+As memórias recuperadas passam por três etapas antes de entrar no prompt:
+1. seleção com diversidade (MMR) sobre os embeddings já recuperados, descartando
+   quase-duplicatas;
+2. compactação para uma forma canônica curta
+   ("pergunta | cartas | sol X, lua Y, asc Z");
+3. corte pelo orçamento de tokens, contados localmente.
+Assim o tamanho do prompt fica estável mesmo com um histórico grande.
+"""
+
+import json
+import re
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from prompts import contar_tokens
+
+# Similaridade acima da qual duas memórias são consideradas a mesma
+LIMIAR_DUPLICATA = 0.95
+
+_FORMATO_MEMORIA = re.compile(
+    r"^Pergunta: (?P<pergunta>.*?)\. Cartas: (?P<cartas>.*?)\. Astrologia: (?P<astrologia>.*)$",
+    re.DOTALL,
+)
+_ABREVIACOES = {"ascendente": "asc"}
+
+
+def _compactar_astrologia(texto: str) -> str:
+    try:
+        astrologia = json.loads(texto)
+    except ValueError:
+        return " ".join(texto.split())
+    if not isinstance(astrologia, dict):
+        return " ".join(str(astrologia).split())
+
+    partes = []
+    for chave, valor in astrologia.items():
+        if isinstance(valor, dict):
+            valor = valor.get("signo", "")
+        if valor:
+            partes.append(f"{_ABREVIACOES.get(chave, chave)} {valor}")
+    return ", ".join(partes)
+
+
+def compactar_memoria(texto: str) -> str:
+    """Forma canônica curta de uma memória salva por guru_ia."""
+    correspondencia = _FORMATO_MEMORIA.match(texto.strip())
+    if not correspondencia:
+        return " ".join(texto.split())
+
+    partes = [
+        " ".join(correspondencia["pergunta"].split()),
+        " ".join(correspondencia["cartas"].split()),
+        _compactar_astrologia(correspondencia["astrologia"]),
+    ]
+    return " | ".join(parte for parte in partes if parte)
+
+
+def selecionar_mmr(candidatos: Sequence[Tuple[str, float, Optional[np.ndarray]]],
+                   max_itens: int, lambda_mmr: float = 0.7,
+                   limiar_duplicata: float = LIMIAR_DUPLICATA) -> List[int]:
+    """
+    Maximal Marginal Relevance: a cada passo escolhe a memória que equilibra
+    relevância para a pergunta e diferença das já escolhidas. Candidatos sem
+    embedding são deduplicados pelo texto compactado.
+    """
+    if any(vetor is None for _, _, vetor in candidatos):
+        vistos, escolhidos = set(), []
+        for i, (texto, _, _) in enumerate(candidatos):
+            compacto = compactar_memoria(texto).lower()
+            if compacto not in vistos:
+                vistos.add(compacto)
+                escolhidos.append(i)
+        return escolhidos[:max_itens]
+
+    if not candidatos:
+        return []
+
+    relevancias = np.array([relevancia for _, relevancia, _ in candidatos], dtype=np.float32)
+    vetores = np.stack([vetor for _, _, vetor in candidatos]).astype(np.float32)
+    similaridades = vetores @ vetores.T
+
+    escolhidos: List[int] = []
+    restantes = list(range(len(candidatos)))
+    while restantes and len(escolhidos) < max_itens:
+        if escolhidos:
+            redundancia = similaridades[np.ix_(restantes, escolhidos)].max(axis=1)
+        else:
+            redundancia = np.zeros(len(restantes), dtype=np.float32)
+        pontuacao = lambda_mmr * relevancias[restantes] - (1 - lambda_mmr) * redundancia
+        melhor = int(np.argmax(pontuacao))
+        if redundancia[melhor] < limiar_duplicata:
+            escolhidos.append(restantes[melhor])
+        restantes.pop(melhor)
+    return escolhidos
+
+
+def montar_contexto_memoria(candidatos: Sequence[Tuple[str, float, Optional[np.ndarray]]],
+                            orcamento_tokens: int = 300, max_itens: int = 5) -> List[str]:
+    """
+    Seleciona, compacta e encaixa as memórias no orçamento de tokens.
+    Devolve as linhas prontas ("- ...") na ordem de relevância.
+    """
+    linhas, usados = [], 0
+    for i in selecionar_mmr(candidatos, max_itens):
+        linha = f"- {compactar_memoria(candidatos[i][0])}"
+        tokens = contar_tokens(linha)
+        if usados + tokens > orcamento_tokens:
+            continue
+        linhas.append(linha)
+        usados += tokens
+    return linhas
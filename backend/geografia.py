@@ -0,0 +1,176 @@
+"""
+Gazetteer offline de cidades (nome, país, latitude/longitude e fuso horário).
+
+Substitui a consulta online ao GeoNames feita pelo Kerykeion: o arquivo
+dados/cidades.tsv é carregado uma única vez em arrays compactos e um índice
+ordenado de nomes normalizados (sem acentos, minúsculos) permite busca exata
+pelo nome ou por um apelido explícito. Qualquer outra grafia fica para o
+geocoder online: um palpite por prefixo ou semelhança daria o mapa de outra
+cidade sem aviso.
+"""
+
+import os
+import re
+import sys
+import bisect
+import threading
+import unicodedata
+from array import array
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+CAMINHO_CIDADES = os.getenv(
+    "GAZETTEER_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "dados", "cidades.tsv")
+)
+
+# Nomes e siglas aceitos para cada país (já normalizados)
+PAISES = {
+    "BR": ("brasil", "brazil", "br"),
+    "PT": ("portugal", "pt"),
+    "AO": ("angola", "ao"),
+    "MZ": ("mocambique", "mozambique", "mz"),
+    "CV": ("cabo verde", "cape verde", "cv"),
+    "AR": ("argentina", "ar"),
+    "UY": ("uruguai", "uruguay", "uy"),
+    "CL": ("chile", "cl"),
+    "PE": ("peru", "pe"),
+    "CO": ("colombia", "co"),
+    "VE": ("venezuela", "ve"),
+    "PY": ("paraguai", "paraguay", "py"),
+    "BO": ("bolivia", "bo"),
+    "EC": ("equador", "ecuador", "ec"),
+    "MX": ("mexico", "mx"),
+    "US": ("estados unidos", "eua", "usa", "us", "united states"),
+    "CA": ("canada", "ca"),
+    "GB": ("reino unido", "inglaterra", "united kingdom", "england", "uk", "gb"),
+    "IE": ("irlanda", "ireland", "ie"),
+    "FR": ("franca", "france", "fr"),
+    "ES": ("espanha", "spain", "espana", "es"),
+    "IT": ("italia", "italy", "it"),
+    "DE": ("alemanha", "germany", "deutschland", "de"),
+    "NL": ("holanda", "paises baixos", "netherlands", "nl"),
+    "BE": ("belgica", "belgium", "be"),
+    "CH": ("suica", "switzerland", "ch"),
+    "AT": ("austria", "at"),
+    "JP": ("japao", "japan", "jp"),
+    "AU": ("australia", "au"),
+}
+
+
+@dataclass(frozen=True)
+class Cidade:
+    nome: str
+    uf: str
+    pais: str
+    lat: float
+    lng: float
+    fuso: str
+
+
+def normalizar(texto: str) -> str:
+    """Minúsculas, sem acentos e sem pontuação, com espaços simples."""
+    texto = unicodedata.normalize("NFKD", texto)
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    texto = re.sub(r"[^a-z0-9 ]", " ", texto.lower())
+    return " ".join(texto.split())
+
+
+class Gazetteer:
+    """Índice em memória das cidades conhecidas."""
+
+    def __init__(self, caminho: str = CAMINHO_CIDADES):
+        self.nomes: List[str] = []
+        self.ufs: List[str] = []
+        self.paises: List[str] = []
+        self.lats = array("d")
+        self.lngs = array("d")
+        self.fusos: List[str] = []
+
+        entradas: List[Tuple[str, int]] = []
+        with open(caminho, encoding="utf-8") as arquivo:
+            for linha in arquivo:
+                if not linha.strip() or linha.startswith("#"):
+                    continue
+                nome, uf, pais, lat, lng, fuso, apelidos = linha.rstrip("\n").split("\t")
+                indice = len(self.nomes)
+                self.nomes.append(nome)
+                self.ufs.append(sys.intern(uf))
+                self.paises.append(sys.intern(pais))
+                self.lats.append(float(lat))
+                self.lngs.append(float(lng))
+                self.fusos.append(sys.intern(fuso))
+
+                entradas.append((normalizar(nome), indice))
+                for apelido in filter(None, apelidos.split(",")):
+                    entradas.append((normalizar(apelido), indice))
+
+        # Índice ordenado (chave normalizada -> posição da cidade) para busca binária
+        entradas.sort()
+        self.chaves: List[str] = [chave for chave, _ in entradas]
+        self.posicoes = array("H", [indice for _, indice in entradas])
+
+    def __len__(self) -> int:
+        return len(self.nomes)
+
+    def cidade(self, indice: int) -> Cidade:
+        return Cidade(
+            nome=self.nomes[indice],
+            uf=self.ufs[indice],
+            pais=self.paises[indice],
+            lat=self.lats[indice],
+            lng=self.lngs[indice],
+            fuso=self.fusos[indice],
+        )
+
+    def _exatos(self, chave: str) -> List[int]:
+        inicio = bisect.bisect_left(self.chaves, chave)
+        fim = bisect.bisect_right(self.chaves, chave)
+        return [self.posicoes[i] for i in range(inicio, fim)]
+
+    def _combina_dica(self, indice: int, dica: str) -> bool:
+        return dica == self.ufs[indice].lower() or dica in PAISES.get(self.paises[indice], ())
+
+    def buscar(self, consulta: str) -> Optional[Cidade]:
+        """
+        Resolve "Cidade", "Cidade, País" ou "Cidade, UF, País" para uma cidade conhecida.
+        Só aceita o nome exato ou um apelido explícito; com UF/país informados, só
+        candidatos que combinam com todos eles. Na dúvida devolve None, e quem chama
+        recorre ao geocoder online.
+        """
+        partes = [normalizar(parte) for parte in consulta.split(",")]
+        partes = [parte for parte in partes if parte]
+        if not partes:
+            return None
+
+        chave, dicas = partes[0], partes[1:]
+        candidatos = sorted(set(self._exatos(chave)))
+        if dicas:
+            candidatos = [i for i in candidatos if all(self._combina_dica(i, dica) for dica in dicas)]
+        if len(candidatos) != 1:
+            return None
+
+        return self.cidade(candidatos[0])
+
+
+_gazetteer: Optional[Gazetteer] = None
+_lock = threading.Lock()
+
+
+def carregar_gazetteer() -> Gazetteer:
+    """Carrega o gazetteer uma única vez por processo."""
+    global _gazetteer
+    if _gazetteer is None:
+        with _lock:
+            if _gazetteer is None:
+                _gazetteer = Gazetteer()
+    return _gazetteer
+
+
+def buscar_cidade(consulta: str) -> Optional[Cidade]:
+    """Busca uma cidade no gazetteer offline; devolve None se não encontrada."""
+    try:
+        return carregar_gazetteer().buscar(consulta)
+    except Exception as e:
+        print(f"Erro ao consultar gazetteer: {e}")
+        return None
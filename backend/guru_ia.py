@@ -2,16 +2,24 @@
 import json
 from dotenv import load_dotenv
 from typing import List, Optional
-from openai import OpenAI
-from memoria import gerar_embedding, salvar_memoria, recuperar_memoria # Importa as funções de memória
+from memoria import gerar_embedding, enfileirar_memoria, recuperar_memoria_detalhada, EmbeddingIndisponivel # Importa as funções de memória
+from prompts import registro_prompts, compactar
+from contexto import montar_contexto_memoria
+from clientes import registro_clientes
+from resiliencia import disjuntor, limitar_timeout
 
 # Carregar variáveis de ambiente
-load_dotenv("/home/ubuntu/tarotconclusivo/.env")
+load_dotenv()
 
-# Inicialização do Cliente OpenAI (Assumindo que o erro de conectividade foi contornado em produção)
-# No sandbox, a chamada real da API falhará, mas a lógica de prompt será testada.
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-client = OpenAI(api_key=OPENAI_API_KEY)
+# Cliente OpenAI compartilhado: registro_clientes.openai. Com GURU_RESPOSTA_SIMULADA=0
+# a resposta vem da API (ou de um substituto local, ver benchmark.py); senão é simulada
+GURU_RESPOSTA_SIMULADA = os.getenv("GURU_RESPOSTA_SIMULADA", "1") == "1"
+
+# Orçamento do contexto histórico (RAG): candidatos recuperados, máximo de memórias
+# no prompt e tokens que elas podem ocupar
+RAG_CANDIDATOS = int(os.getenv("RAG_CANDIDATOS", "12"))
+RAG_MAX_MEMORIAS = int(os.getenv("RAG_MAX_MEMORIAS", "5"))
+RAG_ORCAMENTO_TOKENS = int(os.getenv("RAG_ORCAMENTO_TOKENS", "300"))
 
 # --- ESTRUTURA DE PROMPT (Baseado no conhecimento do projeto) ---
 
@@ -36,6 +44,12 @@ def get_system_prompt(voz: dict) -> str:
     4. Não mencione explicitamente que você é uma IA, a menos que seja perguntado diretamente.
     """
 
+# Prefixo estático pré-compilado por voz (registrado na primeira vez que a voz é usada)
+def template_guru(voz: dict):
+    return registro_prompts.obter_ou_registrar(f"guru:{voz['nome']}", lambda: get_system_prompt(voz))
+
+template_guru(VOZ_GURU)
+
 # 3. Função Principal de Resposta
 def gerar_resposta_com_memoria(
     user_id: str,
@@ -53,57 +67,64 @@ def gerar_resposta_com_memoria(
     
     # --- LÓGICA RAG: RECUPERAÇÃO ---
     
-    # 2. Gerar o vetor de busca (MOCK no sandbox)
-    vetor_busca = gerar_embedding(pergunta)
-    
-    # 3. Recuperar o contexto histórico (RAG)
-    contexto_historico_list = recuperar_memoria(user_id, vetor_busca, top_k=3)
-    
-    # 4. Formatar o Contexto Histórico para o Prompt
+    # 2. Gerar o vetor de busca e 3. recuperar candidatos do contexto histórico (RAG).
+    # Com a OpenAI ou o Supabase fora do ar (ou o prazo da requisição acabar), a resposta segue sem memória
+    try:
+        vetor_busca = gerar_embedding(pergunta)
+        candidatos = recuperar_memoria_detalhada(user_id, vetor_busca, top_k=RAG_CANDIDATOS)
+    except EmbeddingIndisponivel:
+        candidatos = []
+    
+    # 4. Selecionar memórias diversas, compactá-las e encaixá-las no orçamento de tokens
+    contexto_historico_list = montar_contexto_memoria(
+        candidatos, orcamento_tokens=RAG_ORCAMENTO_TOKENS, max_itens=RAG_MAX_MEMORIAS
+    )
     if contexto_historico_list:
-        contexto_formatado = "\n".join([f"- {c}" for c in contexto_historico_list])
-        bloco_memoria = f"""
+        contexto_formatado = "\n".join(contexto_historico_list)
+        bloco_memoria = compactar(f"""
         --- CONTEXTO HISTÓRICO RECUPERADO (MEMÓRIA) ---
         O consulente já fez as seguintes consultas ou recebeu os seguintes conselhos:
-        {contexto_formatado}
-        --- FIM CONTEXTO HISTÓRICO ---
-        Use este contexto para dar uma resposta mais profunda e consistente.
-        """
+        """) + f"\n{contexto_formatado}\n--- FIM CONTEXTO HISTÓRICO ---\nUse este contexto para dar uma resposta mais profunda e consistente."
     else:
         bloco_memoria = "O consulente não possui histórico relevante ou é a primeira consulta. Responda de forma completa e genérica."
 
     # --- MONTAGEM DO PROMPT ---
+    # Prefixo estático da voz (system) + sufixo dinâmico compacto (user), com a
+    # pergunta por último
     
-    system_prompt = get_system_prompt(voz)
+    user_prompt = "\n".join([
+        bloco_memoria,
+        "--- DADOS DA CONSULTA ATUAL ---",
+        f"Contexto Astrológico do Consulente: {json.dumps(astrologia, ensure_ascii=False)}",
+        f"Cartas Sorteadas (e Posição): {', '.join(cartas)}",
+        f"PERGUNTA DO CONSULENTE: {pergunta}",
+        "Baseado em tudo isso, forneça a interpretação e o conselho."
+    ])
+    mensagens = template_guru(voz).montar(user_prompt)
     
-    user_prompt = f"""
-    {bloco_memoria}
-    
-    --- DADOS DA CONSULTA ATUAL ---
-    
-    Contexto Astrológico do Consulente: {json.dumps(astrologia)}
-    Cartas Sorteadas (e Posição): {', '.join(cartas)}
-    
-    PERGUNTA DO CONSULENTE: {pergunta}
-    
-    Baseado em tudo isso, forneça a interpretação e o conselho.
-    """
-    
-    # --- GERAÇÃO DA RESPOSTA (MOCK no sandbox) ---
+    # --- GERAÇÃO DA RESPOSTA (MOCK no sandbox, salvo GURU_RESPOSTA_SIMULADA=0) ---
     
     try:
-        # A chamada real da API será esta:
-        # response = client.chat.completions.create(...)
-        
-        # Simulação de resposta para o sandbox
-        resposta_ia = f"**[RESPOSTA SIMULADA - RAG FUNCIONAL]**\n\nSua pergunta sobre '{pergunta}' foi recebida. A memória da Guru foi ativada. O conselho é profundamente baseado em seu histórico e nas cartas {', '.join(cartas)}. Analisamos seu contexto astrológico ({astrologia['sol']}).\n\n**Memória Utilizada:**\n{bloco_memoria}"
+        if not GURU_RESPOSTA_SIMULADA:
+            # O prazo é conferido antes do disjuntor: esgotá-lo não é falha da OpenAI
+            timeout = limitar_timeout(registro_clientes.config.openai_timeout_s)
+            response = disjuntor("openai_chat").chamar(
+                registro_clientes.openai.chat.completions.create,
+                model="gpt-4.1-mini",
+                messages=mensagens,
+                timeout=timeout
+            )
+            resposta_ia = response.choices[0].message.content
+        else:
+            # Simulação de resposta para o sandbox
+            resposta_ia = f"**[RESPOSTA SIMULADA - RAG FUNCIONAL]**\n\nSua pergunta sobre '{pergunta}' foi recebida. A memória da Guru foi ativada. O conselho é profundamente baseado em seu histórico e nas cartas {', '.join(cartas)}. Analisamos seu contexto astrológico ({astrologia['sol']}).\n\n**Memória Utilizada:**\n{bloco_memoria}"
         
         # --- LÓGICA RAG: ARMAZENAMENTO ---
         
         # 5. Salvar a nova consulta na memória (para uso futuro)
-        # Geramos o embedding da consulta completa (pergunta + cartas + astrologia)
-        vetor_para_salvar = gerar_embedding(texto_consulta_completa)
-        salvar_memoria(user_id, texto_consulta_completa, vetor_para_salvar)
+        # O embedding da consulta completa (pergunta + cartas + astrologia) e o insert
+        # no Supabase acontecem em segundo plano, fora do tempo de resposta
+        enfileirar_memoria(user_id, texto_consulta_completa)
         
         return resposta_ia
         
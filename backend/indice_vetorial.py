@@ -0,0 +1,207 @@
+"""
+Índice vetorial local para a memória RAG.
+
+Cada usuário tem um shard em disco com os embeddings normalizados em uma matriz
+float32 contígua (memory-mapped) e os textos correspondentes. A busca é exata por
+similaridade de cosseno (produto de matrizes + argpartition), pontuando direto no
+formato do codec configurado (float32, float16 ou int8). O Supabase continua
+sendo a fonte durável: os shards são reconstruídos a partir dele quando não
+existem ou ficam mais velhos que o TTL configurado.
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from cache import CACHE_DIR
+from codec_embedding import obter_codec
+
+DIRETORIO_INDICE = os.getenv("INDICE_DIR", os.path.join(CACHE_DIR, "indice"))
+TTL_INDICE_SEGUNDOS = float(os.getenv("INDICE_TTL_SEGUNDOS", "300"))
+CODEC_INDICE = os.getenv("INDICE_CODEC", "float32")
+# Shards mantidos mapeados por worker; os usados há mais tempo são descartados
+MAX_SHARDS_ABERTOS = int(os.getenv("MAX_SHARDS_ABERTOS", "256"))
+
+
+def normalizar_linhas(matriz: np.ndarray) -> np.ndarray:
+    """Normaliza cada linha para norma 1 (linhas nulas continuam nulas)."""
+    normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+    normas[normas == 0] = 1.0
+    return (matriz / normas).astype(np.float32, copy=False)
+
+
+class ShardUsuario:
+    """Embeddings e textos de um único usuário, lidos de um shard em disco."""
+
+    def __init__(self, diretorio: str):
+        self.diretorio = diretorio
+        caminho_meta = os.path.join(diretorio, "meta.json")
+        self.modificado_em = os.stat(caminho_meta).st_mtime_ns
+        with open(caminho_meta, encoding="utf-8") as arquivo:
+            meta = json.load(arquivo)
+        self.textos: List[str] = meta["textos"]
+        self.dimensao: int = meta["dimensao"]
+        self.sincronizado_em: float = meta["sincronizado_em"]
+        self.versao: str = meta["versao"]
+        self.codec = obter_codec(meta.get("codec", "float32"))
+
+        self.escalas = None
+        if self.textos:
+            self.vetores = np.memmap(
+                os.path.join(diretorio, f"vetores-{self.versao}.bin"),
+                dtype=self.codec.dtype, mode="r", shape=(len(self.textos), self.dimensao)
+            )
+            caminho_escalas = os.path.join(diretorio, f"escalas-{self.versao}.f32")
+            if os.path.exists(caminho_escalas):
+                self.escalas = np.fromfile(caminho_escalas, dtype=np.float32)
+        else:
+            self.vetores = np.zeros((0, self.dimensao), dtype=self.codec.dtype)
+
+    def matriz_float32(self) -> np.ndarray:
+        """Embeddings normalizados reconstruídos em float32."""
+        return self.codec.reconstruir(np.asarray(self.vetores), self.escalas)
+
+    def __len__(self) -> int:
+        return len(self.textos)
+
+    def buscar_indices(self, vetor_busca: List[float], top_k: int = 3,
+                       limiar: float = 0.5) -> List[Tuple[int, float]]:
+        """Top-k exato por cosseno como (linha, similaridade), descartando as abaixo do limiar."""
+        if not self.textos or top_k <= 0:
+            return []
+
+        consulta = np.asarray(vetor_busca, dtype=np.float32)
+        norma = np.linalg.norm(consulta)
+        if norma == 0:
+            return []
+        similaridades = self.codec.similaridades(self.vetores, self.escalas, consulta / norma)
+
+        if len(similaridades) > top_k:
+            candidatos = np.argpartition(-similaridades, top_k - 1)[:top_k]
+        else:
+            candidatos = np.arange(len(similaridades))
+        candidatos = candidatos[np.argsort(-similaridades[candidatos])]
+
+        return [
+            (int(i), float(similaridades[i]))
+            for i in candidatos
+            if similaridades[i] >= limiar
+        ]
+
+    def buscar(self, vetor_busca: List[float], top_k: int = 3,
+               limiar: float = 0.5) -> List[Tuple[str, float]]:
+        """Top-k exato por cosseno como (texto, similaridade)."""
+        return [(self.textos[i], similaridade) for i, similaridade in self.buscar_indices(vetor_busca, top_k, limiar)]
+
+    def vetores_linhas(self, linhas: List[int]) -> np.ndarray:
+        """Embeddings normalizados (float32) de algumas linhas do shard."""
+        escalas = self.escalas[linhas] if self.escalas is not None else None
+        return self.codec.reconstruir(np.asarray(self.vetores[linhas]), escalas)
+
+
+class IndiceVetorial:
+    """
+    Gerencia os shards por usuário (criação, acréscimo e recarga). Só os
+    `max_shards` usados mais recentemente ficam abertos; um shard descartado é
+    desmapeado assim que a última busca em andamento deixa de usá-lo.
+    """
+
+    def __init__(self, diretorio: str = DIRETORIO_INDICE, ttl_segundos: float = TTL_INDICE_SEGUNDOS,
+                 dimensao: int = 1536, codec: str = CODEC_INDICE, max_shards: int = MAX_SHARDS_ABERTOS):
+        self.diretorio = diretorio
+        self.dimensao = dimensao
+        self.codec = obter_codec(codec)
+        self.ttl_segundos = ttl_segundos
+        self.max_shards = max_shards
+        self._shards: "OrderedDict[str, ShardUsuario]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _diretorio_usuario(self, user_id: str) -> str:
+        nome = hashlib.sha1(user_id.encode("utf-8")).hexdigest()
+        return os.path.join(self.diretorio, nome)
+
+    def _gravar(self, user_id: str, textos: List[str], vetores: np.ndarray,
+                sincronizado_em: Optional[float] = None):
+        """Grava um novo shard e troca o meta.json atomicamente."""
+        diretorio = self._diretorio_usuario(user_id)
+        os.makedirs(diretorio, exist_ok=True)
+        versao = f"{time.time_ns()}-{os.getpid()}"
+
+        vetores = normalizar_linhas(np.asarray(vetores, dtype=np.float32).reshape(len(textos), self.dimensao))
+        dados, escalas = self.codec.quantizar(vetores)
+        dados.tofile(os.path.join(diretorio, f"vetores-{versao}.bin"))
+        if escalas is not None:
+            escalas.tofile(os.path.join(diretorio, f"escalas-{versao}.f32"))
+
+        meta = {
+            "textos": textos,
+            "dimensao": self.dimensao,
+            "sincronizado_em": sincronizado_em or time.time(),
+            "versao": versao,
+            "codec": self.codec.nome,
+        }
+        temporario = os.path.join(diretorio, f"meta-{versao}.json")
+        with open(temporario, "w", encoding="utf-8") as arquivo:
+            json.dump(meta, arquivo, ensure_ascii=False)
+        os.replace(temporario, os.path.join(diretorio, "meta.json"))
+
+        # Remove versões antigas (quem ainda as mapeia mantém o arquivo aberto)
+        for nome in os.listdir(diretorio):
+            if nome.startswith(("vetores-", "escalas-")) and versao not in nome:
+                try:
+                    os.remove(os.path.join(diretorio, nome))
+                except OSError:
+                    pass
+
+    def obter_shard(self, user_id: str) -> Optional[ShardUsuario]:
+        """Shard atual do usuário, ou None se não existir ou estiver vencido."""
+        diretorio = self._diretorio_usuario(user_id)
+        try:
+            modificado_em = os.stat(os.path.join(diretorio, "meta.json")).st_mtime_ns
+        except OSError:
+            return None
+
+        with self._lock:
+            shard = self._shards.get(user_id)
+            if shard is None or shard.modificado_em != modificado_em:
+                try:
+                    shard = ShardUsuario(diretorio)
+                except (OSError, ValueError, KeyError):
+                    # Outro worker trocou o shard no meio da leitura
+                    return None
+                self._shards[user_id] = shard
+                while len(self._shards) > self.max_shards:
+                    self._shards.popitem(last=False)
+            self._shards.move_to_end(user_id)
+
+        # Shards vencidos ou gravados com outro codec são reconstruídos a partir da fonte
+        if time.time() - shard.sincronizado_em > self.ttl_segundos or shard.codec is not self.codec:
+            return None
+        return shard
+
+    def sincronizar(self, user_id: str, linhas: List[Tuple[str, List[float]]]) -> ShardUsuario:
+        """Reconstrói o shard do usuário a partir das linhas (texto, embedding) da fonte durável."""
+        textos = [texto for texto, _ in linhas]
+        vetores = np.array([vetor for _, vetor in linhas], dtype=np.float32)
+        with self._lock:
+            self._gravar(user_id, textos, vetores)
+            self._shards.pop(user_id, None)
+        return self.obter_shard(user_id)
+
+    def adicionar(self, user_id: str, texto: str, vetor: List[float]):
+        """Acrescenta uma memória a um shard já existente (se não houver, a próxima busca sincroniza)."""
+        shard = self.obter_shard(user_id)
+        if shard is None:
+            return
+        with self._lock:
+            textos = shard.textos + [texto]
+            vetores = np.vstack([shard.matriz_float32(), np.asarray([vetor], dtype=np.float32)])
+            # Um acréscimo local não conta como sincronização com o Supabase
+            self._gravar(user_id, textos, vetores, sincronizado_em=shard.sincronizado_em)
+            self._shards.pop(user_id, None)
@@ -0,0 +1,164 @@
+"""
+Inicialização rápida (cold start) do backend.
+
+As dependências pesadas (kerykeion, numpy, openai, supabase, sentry) são
+importadas no primeiro uso por meio de `importar`, que mede quanto cada uma
+custou. Com INICIO_RAPIDO=1 a aplicação sobe sem aquecer nada e o
+pré-aquecimento roda em segundo plano depois da primeira requisição.
+
+Relatório de tempo de import, para acompanhar regressões de cold start:
+    python inicializacao.py [--top 25] [--json inicializacao.json]
+"""
+
+import os
+import sys
+import time
+import threading
+import importlib
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+# Sobe sem pré-aquecimento; o aquecimento acontece depois da primeira requisição
+INICIO_RAPIDO = os.getenv("INICIO_RAPIDO") == "1"
+
+
+class RelatorioInicializacao:
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.etapas: Dict[str, float] = {}
+        self.imports: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def importar(self, nome: str):
+        """Importa um módulo no primeiro uso, registrando o tempo gasto."""
+        modulo = sys.modules.get(nome)
+        # Um módulo que outra thread (o pré-aquecimento) ainda está importando já
+        # aparece em sys.modules pela metade: nesse caso import_module espera o lock
+        if modulo is not None and not getattr(getattr(modulo, "__spec__", None), "_initializing", False):
+            return modulo
+        inicio = time.perf_counter()
+        modulo = importlib.import_module(nome)
+        with self._lock:
+            self.imports.setdefault(nome, time.perf_counter() - inicio)
+        return modulo
+
+    @contextmanager
+    def medir(self, etapa: str):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.etapas[etapa] = time.perf_counter() - inicio
+
+    def marcar(self, etapa: str):
+        """Registra o instante de uma etapa, contado desde o início do import do backend."""
+        with self._lock:
+            self.etapas.setdefault(etapa, time.perf_counter() - self.inicio)
+
+    def relatorio(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "inicio_rapido": INICIO_RAPIDO,
+                "etapas_ms": {nome: round(s * 1000, 1) for nome, s in self.etapas.items()},
+                "imports_sob_demanda_ms": {nome: round(s * 1000, 1) for nome, s in self.imports.items()},
+            }
+
+
+relatorio_inicializacao = RelatorioInicializacao()
+importar = relatorio_inicializacao.importar
+
+
+class PreAquecimento:
+    """Executa as etapas de aquecimento uma única vez, em uma thread de fundo ou no startup."""
+
+    def __init__(self):
+        self._etapas: List[Callable[[], Any]] = []
+        self._lock = threading.Lock()
+        self.iniciado = False
+        self.concluido = threading.Event()
+
+    def registrar(self, etapa: Callable[[], Any]) -> Callable[[], Any]:
+        self._etapas.append(etapa)
+        return etapa
+
+    def executar(self):
+        with self._lock:
+            if self.iniciado:
+                return
+            self.iniciado = True
+        with relatorio_inicializacao.medir("pre_aquecimento"):
+            for etapa in self._etapas:
+                try:
+                    with relatorio_inicializacao.medir(f"pre_aquecimento:{etapa.__name__}"):
+                        etapa()
+                except Exception as e:
+                    print(f"Erro no pré-aquecimento ({etapa.__name__}): {e}")
+        self.concluido.set()
+
+    def iniciar_em_segundo_plano(self) -> Optional[threading.Thread]:
+        if self.iniciado:
+            return None
+        thread = threading.Thread(target=self.executar, name="pre-aquecimento", daemon=True)
+        thread.start()
+        return thread
+
+
+pre_aquecimento = PreAquecimento()
+
+
+def medir_imports(modulo: str = "main", top: int = 25) -> Dict[str, Any]:
+    """
+    Roda `python -X importtime -c "import <modulo>"` em um processo novo e devolve
+    o tempo total e os módulos com maior tempo acumulado.
+    """
+    import subprocess
+
+    ambiente = dict(os.environ)
+    ambiente.setdefault("OPENAI_API_KEY", "relatorio-inicializacao")
+    inicio = time.perf_counter()
+    processo = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {modulo}"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=ambiente, capture_output=True, text=True
+    )
+    total = time.perf_counter() - inicio
+    if processo.returncode != 0:
+        raise RuntimeError(f"Falha ao importar {modulo}: {processo.stderr.strip().splitlines()[-1:]}")
+
+    modulos = []
+    for linha in processo.stderr.splitlines():
+        if not linha.startswith("import time:") or "|" not in linha:
+            continue
+        # "import time: <próprio us> | <acumulado us> | <módulo>"
+        _, acumulado, nome = linha.split("|")
+        try:
+            modulos.append((nome.strip(), int(acumulado) / 1000))
+        except ValueError:
+            continue  # cabeçalho
+    topo = sorted(modulos, key=lambda m: m[1], reverse=True)[:top]
+    return {
+        "modulo": modulo,
+        "processo_ms": round(total * 1000, 1),
+        "import_ms": next((ms for nome, ms in modulos if nome == modulo), None),
+        "mais_lentos_ms": {nome: round(ms, 1) for nome, ms in topo},
+    }
+
+
+if __name__ == "__main__":
+    import json
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Relatório de tempo de import do backend")
+    parser.add_argument("modulo", nargs="?", default="main")
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--json", help="Salvar o relatório neste arquivo")
+    args = parser.parse_args()
+
+    resultado = medir_imports(args.modulo, args.top)
+    print(f"import {resultado['modulo']}: {resultado['import_ms']} ms (processo: {resultado['processo_ms']} ms)")
+    for nome, ms in resultado["mais_lentos_ms"].items():
+        print(f"{ms:10.1f} ms  {nome}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as arquivo:
+            json.dump(resultado, arquivo, ensure_ascii=False, indent=2)
@@ -3,35 +3,93 @@ Tarot com IA - Backend FastAPI
 Sistema de Tarot com Inteligência Artificial focado em experiência ritualística
 """
 
+from inicializacao import relatorio_inicializacao, pre_aquecimento, importar, INICIO_RAPIDO
+
 import os
+import sys
+import time
 import random
+import asyncio
+import json
+from contextlib import asynccontextmanager
 from datetime import datetime
-from typing import List, Optional, Dict, Any
-from fastapi import FastAPI, HTTPException, Depends
+from typing import List, Optional, Dict, Any, AsyncIterator, Tuple, Literal, Sequence
+from fastapi import FastAPI, HTTPException, Depends, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel, Field
 from dotenv import load_dotenv
-import sentry_sdk
-from sentry_sdk.integrations.fastapi import FastApiIntegration
-from openai import OpenAI
-import kerykeion as k
+from cache import CacheLRU, CacheDoisNiveis, criar_cache_persistente
+from geografia import buscar_cidade, carregar_gazetteer
+from prompts import registro_prompts
+from clientes import registro_clientes
+from astrologia import executor_mapas
+from biblioteca import biblioteca_tiragens
+from metricas import (metricas, medir_etapa, iniciar_etapas_requisicao, cabecalho_server_timing,
+                      registrar_erro_upstream, series_cache, criar_amostrador_traces)
+from resiliencia import (CircuitoAberto, PrazoEsgotado, disjuntor, iniciar_prazo, tempo_restante,
+                         limitar_timeout, erro_timeout, estatisticas_disjuntores, series_disjuntores)
 
 # Carregar variáveis de ambiente
 load_dotenv()
 
-# Configurar Sentry (opcional)
+# Configurar Sentry (opcional; o SDK só é importado quando há DSN)
 if os.getenv("SENTRY_DSN"):
+    sentry_sdk = importar("sentry_sdk")
+    FastApiIntegration = importar("sentry_sdk.integrations.fastapi").FastApiIntegration
     sentry_sdk.init(
         dsn=os.getenv("SENTRY_DSN"),
         integrations=[FastApiIntegration()],
-        traces_sample_rate=1.0,
+        # Amostragem configurável e limitada sob carga (SENTRY_TRACES_TAXA, SENTRY_TRACES_POR_SEGUNDO)
+        traces_sampler=criar_amostrador_traces(),
     )
 
+# Etapas de aquecimento: no startup ou, com INICIO_RAPIDO=1, depois da primeira requisição
+@pre_aquecimento.registrar
+def iniciar_executor_mapas():
+    # Sobe o pool de processos de mapas (cada processo importa o Kerykeion)
+    executor_mapas.iniciar()
+
+# Carregar o gazetteer offline uma única vez, antes das consultas com mapa
+pre_aquecimento.registrar(carregar_gazetteer)
+
+@pre_aquecimento.registrar
+def iniciar_clientes():
+    # Pools de conexões compartilhados com OpenAI e Supabase
+    registro_clientes.iniciar()
+
+@pre_aquecimento.registrar
+def carregar_biblioteca():
+    # Mapeia a biblioteca de interpretações pré-geradas do modo rápido
+    biblioteca_tiragens.carregar()
+
+@pre_aquecimento.registrar
+def importar_memoria():
+    # Embeddings (numpy, índice local) só entram no caminho da consulta com o cache semântico
+    if cache_interpretacoes is not None:
+        importar("memoria")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Inicialização e encerramento da aplicação"""
+    if not INICIO_RAPIDO:
+        await asyncio.to_thread(pre_aquecimento.executar)
+    relatorio_inicializacao.marcar("pronto_para_requisicoes")
+    yield
+    # Gravar as memórias pendentes antes de fechar as conexões
+    memoria = sys.modules.get("memoria")
+    if memoria is not None:
+        await asyncio.to_thread(memoria.fila_memoria.drenar)
+    await registro_clientes.fechar()
+    await asyncio.to_thread(executor_mapas.fechar)
+
 # Inicializar FastAPI
 app = FastAPI(
     title="Tarot com IA - API",
     description="API para sistema de Tarot com Inteligência Artificial",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configurar CORS
@@ -43,8 +101,55 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Inicializar cliente OpenAI
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+@app.middleware("http")
+async def medir_requisicao(request, call_next):
+    """Histograma de latência por rota e cabeçalho Server-Timing com as etapas da consulta
+    
+    Em respostas streaming o cabeçalho sai antes da interpretação: lá só entram as
+    etapas já concluídas (as demais continuam indo para o /metrics).
+    """
+    etapas = iniciar_etapas_requisicao()
+    # Prazo total da requisição, respeitado por todas as etapas (PRAZO_REQUISICAO_S)
+    iniciar_prazo()
+    inicio = time.perf_counter()
+    response = await call_next(request)
+    duracao = time.perf_counter() - inicio
+    rota = getattr(request.scope.get("route"), "path", "desconhecida")
+    metricas.duracao_requisicao.observar(duracao, rota=rota, metodo=request.method, status=str(response.status_code))
+    response.headers["Server-Timing"] = cabecalho_server_timing(etapas, duracao)
+    return response
+
+@app.middleware("http")
+async def pre_aquecer_apos_primeira_requisicao(request, call_next):
+    """No modo INICIO_RAPIDO, responde a primeira requisição e então aquece em segundo plano"""
+    response = await call_next(request)
+    if not pre_aquecimento.iniciado:
+        relatorio_inicializacao.marcar("primeira_requisicao")
+        pre_aquecimento.iniciar_em_segundo_plano()
+    return response
+
+# Limite de consultas processadas simultaneamente por worker
+MAX_CONSULTAS_SIMULTANEAS = int(os.getenv("MAX_CONSULTAS_SIMULTANEAS", "32"))
+semaforo_consultas = asyncio.Semaphore(MAX_CONSULTAS_SIMULTANEAS)
+
+# Consultas em lote: itens por requisição e interpretações simultâneas somando
+# todos os lotes do worker (ajuste ao rate limit da OpenAI)
+MAX_CONSULTAS_LOTE = int(os.getenv("MAX_CONSULTAS_LOTE", "1000"))
+LOTE_IA_SIMULTANEAS = int(os.getenv("LOTE_IA_SIMULTANEAS", "8"))
+semaforo_lote = asyncio.Semaphore(LOTE_IA_SIMULTANEAS)
+
+# Cache de mapas natais (LRU em memória + SQLite compartilhado entre workers)
+cache_mapas = CacheDoisNiveis(
+    CacheLRU(int(os.getenv("MAX_MAPAS_CACHE", "2048"))),
+    criar_cache_persistente("mapas.sqlite3", "mapas") if os.getenv("CACHE_MAPAS_PERSISTENTE", "1") == "1" else None
+)
+
+# Cache semântico de interpretações (opcional: CACHE_SEMANTICO=1)
+cache_interpretacoes = importar("cache_semantico").CacheSemantico(
+    limiar=float(os.getenv("CACHE_SEMANTICO_LIMIAR", "0.95")),
+    ttl_segundos=float(os.getenv("CACHE_SEMANTICO_TTL", "3600")),
+    max_entradas=int(os.getenv("CACHE_SEMANTICO_MAX", "5000"))
+) if os.getenv("CACHE_SEMANTICO") == "1" else None
 
 # Modelos Pydantic
 class DadosNascimento(BaseModel):
@@ -57,6 +162,9 @@ class PerguntaTarot(BaseModel):
     pergunta: str = Field(..., description="Pergunta para o Tarot")
     dados_nascimento: Optional[DadosNascimento] = None
     voz_guru: str = Field(default="companheira", description="Estilo da Guru IA")
+    ignorar_cache: bool = Field(default=False, description="Gerar uma interpretação nova, sem usar o cache semântico")
+    modo_rapido: bool = Field(default=False, description="Modo fast: interpretação pré-gerada da biblioteca de tiragens, sem esperar a IA")
+    personalizar: bool = Field(default=False, description="No modo rápido, acrescentar um parágrafo curto da IA ligando a leitura à pergunta")
 
 class CartaTarot(BaseModel):
     nome: str
@@ -70,6 +178,20 @@ class RespostaTarot(BaseModel):
     elementos_astrologicos: Optional[Dict[str, Any]] = None
     timestamp: datetime
 
+class ConsultaLote(BaseModel):
+    consultas: List[PerguntaTarot] = Field(..., min_length=1, max_length=MAX_CONSULTAS_LOTE,
+                                           description="Consultas do lote")
+
+class ItemLote(BaseModel):
+    indice: int = Field(..., description="Posição da consulta no lote")
+    resultado: Optional[RespostaTarot] = None
+    erro: Optional[str] = None
+
+class RespostaLote(BaseModel):
+    resultados: List[ItemLote]
+    total: int
+    erros: int
+
 # Dados do Tarot (Arcanos Maiores)
 ARCANOS_MAIORES = [
     {"nome": "O Louco", "significado": "Novos começos, espontaneidade, fé no desconhecido"},
@@ -115,51 +237,129 @@ VOZES_GURU = {
     }
 }
 
-def obter_dados_astrologicos(dados: DadosNascimento) -> Dict[str, Any]:
-    """Obter dados astrológicos usando Kerykeion"""
-    try:
-        # Converter local para formato aceito pelo Kerykeion (inglês)
-        local_en = dados.local_nascimento
-        if "São Paulo" in local_en or "Sao Paulo" in local_en:
-            local_en = "Sao Paulo, Brazil"
-        elif "Rio de Janeiro" in local_en:
-            local_en = "Rio de Janeiro, Brazil"
-        elif "Brasil" in local_en or "Brazil" in local_en:
-            local_en = local_en.replace("Brasil", "Brazil")
-        
-        # Criar objeto de nascimento
-        nascimento = k.AstrologicalSubject(
-            name=dados.nome,
-            year=int(dados.data_nascimento.split('-')[0]),
-            month=int(dados.data_nascimento.split('-')[1]),
-            day=int(dados.data_nascimento.split('-')[2]),
-            hour=int(dados.hora_nascimento.split(':')[0]),
-            minute=int(dados.hora_nascimento.split(':')[1]),
-            city=local_en
-        )
-        
+MENSAGEM_ERRO_INTERPRETACAO = "Desculpe, não foi possível gerar a interpretação no momento. Tente novamente."
+
+# Disjuntor do chat da OpenAI: com o circuito aberto, as consultas vão direto para
+# a leitura de reserva (cache ou biblioteca pré-gerada)
+disjuntor_chat = disjuntor("openai_chat")
+
+def resolver_local(local_nascimento: str) -> Dict[str, Any]:
+    """Resolver o local de nascimento em parâmetros de localização do Kerykeion.
+    
+    Usa o gazetteer offline (coordenadas + fuso, sem rede); cidades desconhecidas
+    caem na busca online do Kerykeion pelo nome em inglês.
+    """
+    cidade = buscar_cidade(local_nascimento)
+    if cidade:
         return {
-            "sol": {
-                "signo": nascimento.sun["sign"],
-                "casa": nascimento.sun["house"]
-            },
-            "lua": {
-                "signo": nascimento.moon["sign"],
-                "casa": nascimento.moon["house"]
-            },
-            "ascendente": nascimento.first_house["sign"]
+            "city": cidade.nome,
+            "nation": cidade.pais,
+            "lat": cidade.lat,
+            "lng": cidade.lng,
+            "tz_str": cidade.fuso,
+            "online": False
         }
+    
+    # Converter local para formato aceito pelo Kerykeion (inglês)
+    local_en = local_nascimento.strip()
+    if "Brasil" in local_en or "Brazil" in local_en:
+        local_en = local_en.replace("Brasil", "Brazil")
+    return {"city": local_en}
+
+def chave_mapa(dados: DadosNascimento, local: Dict[str, Any]) -> str:
+    """Chave normalizada do mapa natal: data, hora e cidade resolvida (o nome não influencia o mapa)"""
+    ano, mes, dia = (int(parte) for parte in dados.data_nascimento.split('-'))
+    hora, minuto = (int(parte) for parte in dados.hora_nascimento.split(':')[:2])
+    cidade = f"{local['city']},{local.get('nation', '')}"
+    return f"{ano:04d}-{mes:02d}-{dia:02d}T{hora:02d}:{minuto:02d}|{' '.join(cidade.lower().split())}"
+
+def preparar_mapa(dados: DadosNascimento) -> Tuple[str, Dict[str, Any]]:
+    """Chave do cache e argumentos do Kerykeion (dicionário simples, enviado ao pool de processos)"""
+    local = resolver_local(dados.local_nascimento)
+    ano, mes, dia = (int(parte) for parte in dados.data_nascimento.split('-'))
+    hora, minuto = (int(parte) for parte in dados.hora_nascimento.split(':')[:2])
+    parametros = {
+        "name": dados.nome,
+        "year": ano,
+        "month": mes,
+        "day": dia,
+        "hour": hora,
+        "minute": minuto,
+        **local
+    }
+    return chave_mapa(dados, local), parametros
+
+def consultar_mapa(dados: DadosNascimento) -> Tuple[str, Dict[str, Any], Optional[Dict[str, Any]]]:
+    """Resolve o local (gazetteer ou geocoder online) e consulta o cache de mapas: I/O, roda em thread"""
+    chave, parametros = preparar_mapa(dados)
+    return chave, parametros, cache_mapas.obter(chave)
+
+def guardar_mapas(mapas: Dict[str, Optional[Dict[str, Any]]]):
+    """Grava no cache (SQLite) os mapas calculados: I/O, roda em thread"""
+    for chave, elementos in mapas.items():
+        if elementos is not None:
+            cache_mapas.guardar(chave, elementos)
+
+async def calcular_dados_astrologicos(dados: Optional[DadosNascimento]) -> Optional[Dict[str, Any]]:
+    """Obter dados astrológicos (com cache por dados de nascimento) sem bloquear o event loop"""
+    if not dados:
+        return None
+    try:
+        with medir_etapa("astrologia"):
+            chave, parametros, elementos = await asyncio.to_thread(consultar_mapa, dados)
+            if elementos is None:
+                # O Kerykeion é CPU-bound: o cálculo roda no pool de processos
+                elementos = await asyncio.wait_for(executor_mapas.calcular(parametros), tempo_restante())
+                await asyncio.to_thread(guardar_mapas, {chave: elementos})
+        return elementos
     except Exception as e:
         print(f"Erro ao obter dados astrológicos: {e}")
         return None
 
+def consultar_mapas_lote(lista_dados: List[DadosNascimento]) -> Tuple[List[Optional[str]], Dict[str, Optional[Dict[str, Any]]], Dict[str, Dict[str, Any]]]:
+    """Chaves, mapas já em cache e parâmetros dos mapas a calcular de um lote: I/O, roda em thread"""
+    chaves: List[Optional[str]] = []
+    elementos_por_chave: Dict[str, Optional[Dict[str, Any]]] = {}
+    pendentes: Dict[str, Dict[str, Any]] = {}
+    for dados in lista_dados:
+        try:
+            chave, parametros = preparar_mapa(dados)
+        except Exception as e:
+            print(f"Erro ao obter dados astrológicos: {e}")
+            chaves.append(None)
+            continue
+        chaves.append(chave)
+        if chave in elementos_por_chave or chave in pendentes:
+            continue
+        elementos = cache_mapas.obter(chave)
+        if elementos is not None:
+            elementos_por_chave[chave] = elementos
+        else:
+            pendentes[chave] = parametros
+    return chaves, elementos_por_chave, pendentes
+
+async def calcular_dados_astrologicos_lote(lista_dados: List[DadosNascimento]) -> List[Optional[Dict[str, Any]]]:
+    """Obter os mapas de vários nascimentos de uma vez (mapas repetidos são calculados uma única vez)"""
+    chaves, elementos_por_chave, pendentes = await asyncio.to_thread(consultar_mapas_lote, lista_dados)
+    
+    if pendentes:
+        calculados = await asyncio.wait_for(executor_mapas.calcular_lote(list(pendentes.values())), tempo_restante())
+        novos = dict(zip(pendentes, calculados))
+        await asyncio.to_thread(guardar_mapas, novos)
+        elementos_por_chave.update(novos)
+    
+    return [elementos_por_chave.get(chave) if chave else None for chave in chaves]
+
 def sortear_cartas(quantidade: int = 3) -> List[CartaTarot]:
     """Sortear cartas do Tarot"""
-    cartas_sorteadas = random.sample(ARCANOS_MAIORES, quantidade)
-    posicoes = ["Passado", "Presente", "Futuro"] if quantidade == 3 else [f"Carta {i+1}" for i in range(quantidade)]
+    return cartas_da_tiragem(random.sample(range(len(ARCANOS_MAIORES)), quantidade))
+
+def cartas_da_tiragem(indices: Sequence[int]) -> List[CartaTarot]:
+    """Cartas de uma tiragem a partir dos índices em ARCANOS_MAIORES, na ordem das posições"""
+    posicoes = ["Passado", "Presente", "Futuro"] if len(indices) == 3 else [f"Carta {i+1}" for i in range(len(indices))]
     
     cartas = []
-    for i, carta in enumerate(cartas_sorteadas):
+    for i, carta in enumerate(ARCANOS_MAIORES[indice] for indice in indices):
         cartas.append(CartaTarot(
             nome=carta["nome"],
             arcano="Maior",
@@ -169,58 +369,321 @@ def sortear_cartas(quantidade: int = 3) -> List[CartaTarot]:
     
     return cartas
 
-def gerar_interpretacao_ia(pergunta: str, cartas: List[CartaTarot], 
-                          elementos_astrologicos: Optional[Dict], voz: str) -> str:
+def prefixo_interpretacao(voz_config: Dict[str, str]) -> str:
+    """Parte estática do prompt de uma voz (idêntica em todas as chamadas)"""
+    return f"""
+    Você é uma Guru do Tarot com personalidade {voz_config['tom']}. Seu estilo é {voz_config['estilo']} 
+    e sua linguagem é {voz_config['linguagem']}.
+    
+    Você receberá as cartas sorteadas (com posição e significado), os elementos astrológicos 
+    do consulente quando disponíveis e, por último, a pergunta do consulente.
+    
+    Forneça uma interpretação profunda e personalizada, conectando as cartas com a pergunta e, 
+    se disponível, com os elementos astrológicos. Seja empática, sábia e ofereça insights 
+    práticos para a vida da pessoa. Use uma linguagem {voz_config['linguagem']}.
+    
+    Estruture sua resposta de forma fluida e natural, como uma conversa íntima.
+    """
+
+def prefixo_personalizacao(voz_config: Dict[str, str]) -> str:
+    """Parte estática do prompt que adapta uma leitura pré-gerada à pergunta (modo rápido)"""
+    return f"""
+    Você é uma Guru do Tarot com personalidade {voz_config['tom']}. Seu estilo é {voz_config['estilo']}.
+    
+    Você receberá uma leitura já escrita para as cartas sorteadas, os elementos astrológicos
+    do consulente quando disponíveis e, por último, a pergunta do consulente.
+    
+    Não repita a leitura. Escreva apenas um parágrafo curto (duas ou três frases) que ligue
+    a leitura à pergunta e, se houver, aos elementos astrológicos. Use uma linguagem {voz_config['linguagem']}.
+    """
+
+# Pré-compilar o prefixo estático de cada voz
+for nome_voz, voz_config in VOZES_GURU.items():
+    registro_prompts.registrar(f"interpretacao:{nome_voz}", prefixo_interpretacao(voz_config))
+    registro_prompts.registrar(f"personalizacao:{nome_voz}", prefixo_personalizacao(voz_config))
+
+# Pergunta usada nas interpretações base da biblioteca de tiragens (biblioteca.py)
+PERGUNTA_BIBLIOTECA = "O que esta tiragem revela sobre o meu momento atual?"
+PERSONALIZACAO_MAX_TOKENS = int(os.getenv("PERSONALIZACAO_MAX_TOKENS", "180"))
+
+def montar_mensagens_interpretacao(pergunta: str, cartas: List[CartaTarot],
+                                   elementos_astrologicos: Optional[Dict], voz: str) -> List[Dict[str, str]]:
+    """Montar as mensagens de interpretação: prefixo estático da voz + sufixo compacto da consulta"""
+    template = registro_prompts.obter(f"interpretacao:{voz}", padrao="interpretacao:companheira")
+    
+    # Construir contexto das cartas
+    linhas = ["Cartas sorteadas:"]
+    linhas += [f"- {carta.posicao}: {carta.nome} - {carta.significado_geral}" for carta in cartas]
+    
+    # Construir contexto astrológico
+    if elementos_astrologicos:
+        linhas += [
+            "Elementos Astrológicos:",
+            f"- Sol em {elementos_astrologicos['sol']['signo']} (Casa {elementos_astrologicos['sol']['casa']})",
+            f"- Lua em {elementos_astrologicos['lua']['signo']} (Casa {elementos_astrologicos['lua']['casa']})",
+            f"- Ascendente em {elementos_astrologicos['ascendente']}"
+        ]
+    
+    # A pergunta é a parte mais variável, por isso vai por último
+    linhas.append(f'Pergunta do consulente: "{pergunta}"')
+    
+    return template.montar("\n".join(linhas))
+
+async def gerar_interpretacao_ia(pergunta: str, cartas: List[CartaTarot], 
+                                elementos_astrologicos: Optional[Dict], voz: str) -> str:
     """Gerar interpretação usando IA"""
+    padrao = registro_clientes.config.openai_timeout_s
+    async def chamar(timeout: float):
+        # O timeout cobre também as novas tentativas do SDK
+        try:
+            return await asyncio.wait_for(
+                registro_clientes.openai_async.chat.completions.create(
+                    model="gpt-4.1-mini",
+                    messages=montar_mensagens_interpretacao(pergunta, cartas, elementos_astrologicos, voz),
+                    max_tokens=800,
+                    temperature=0.7
+                ),
+                timeout
+            )
+        except asyncio.TimeoutError as e:
+            raise erro_timeout(timeout, padrao, f"chat não respondeu em {timeout:.2f} s") from e
+    
     try:
-        voz_config = VOZES_GURU.get(voz, VOZES_GURU["companheira"])
-        
-        # Construir contexto astrológico
-        contexto_astro = ""
-        if elementos_astrologicos:
-            contexto_astro = f"""
-            Elementos Astrológicos:
-            - Sol em {elementos_astrologicos['sol']['signo']} (Casa {elementos_astrologicos['sol']['casa']})
-            - Lua em {elementos_astrologicos['lua']['signo']} (Casa {elementos_astrologicos['lua']['casa']})
-            - Ascendente em {elementos_astrologicos['ascendente']}
-            """
-        
-        # Construir contexto das cartas
-        contexto_cartas = "\\n".join([
-            f"- {carta.posicao}: {carta.nome} - {carta.significado_geral}"
-            for carta in cartas
-        ])
-        
-        prompt = f"""
-        Você é uma Guru do Tarot com personalidade {voz_config['tom']}. Seu estilo é {voz_config['estilo']} 
-        e sua linguagem é {voz_config['linguagem']}.
-        
-        Pergunta do consulente: "{pergunta}"
-        
-        Cartas sorteadas:
-        {contexto_cartas}
-        
-        {contexto_astro}
-        
-        Forneça uma interpretação profunda e personalizada, conectando as cartas com a pergunta e, 
-        se disponível, com os elementos astrológicos. Seja empática, sábia e ofereça insights 
-        práticos para a vida da pessoa. Use uma linguagem {voz_config['linguagem']}.
-        
-        Estruture sua resposta de forma fluida e natural, como uma conversa íntima.
-        """
-        
-        response = client.chat.completions.create(
-            model="gpt-4.1-mini",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=800,
-            temperature=0.7
-        )
+        # O prazo é conferido antes do disjuntor: prazo esgotado na fila não é falha da OpenAI
+        timeout = limitar_timeout(padrao)
+        with medir_etapa("llm"):
+            response = await disjuntor_chat.chamar_async(chamar, timeout)
         
         return response.choices[0].message.content
         
+    except (CircuitoAberto, PrazoEsgotado) as e:
+        print(f"Interpretação IA indisponível: {e}")
+        return MENSAGEM_ERRO_INTERPRETACAO
     except Exception as e:
+        registrar_erro_upstream("openai", "chat")
         print(f"Erro ao gerar interpretação IA: {e}")
-        return "Desculpe, não foi possível gerar a interpretação no momento. Tente novamente."
+        return MENSAGEM_ERRO_INTERPRETACAO
+
+async def gerar_interpretacao_ia_stream(pergunta: str, cartas: List[CartaTarot],
+                                       elementos_astrologicos: Optional[Dict], voz: str) -> AsyncIterator[str]:
+    """Gerar interpretação usando IA, devolvendo os tokens à medida que chegam"""
+    timeout = limitar_timeout(registro_clientes.config.openai_timeout_s)
+    disjuntor_chat.verificar()
+    with medir_etapa("llm"):
+        concluido = False
+        try:
+            stream = await registro_clientes.openai_async.chat.completions.create(
+                model="gpt-4.1-mini",
+                messages=montar_mensagens_interpretacao(pergunta, cartas, elementos_astrologicos, voz),
+                max_tokens=800,
+                temperature=0.7,
+                stream=True,
+                timeout=timeout
+            )
+            
+            async for chunk in stream:
+                if tempo_restante() == 0:
+                    raise PrazoEsgotado("prazo da requisição esgotado durante o stream")
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+            concluido = True
+        except PrazoEsgotado:
+            # Prazo da requisição, não falha da OpenAI: o finally só libera o disjuntor
+            raise
+        except Exception:
+            disjuntor_chat.registrar_falha()
+            registrar_erro_upstream("openai", "chat_stream")
+            raise
+        finally:
+            if concluido:
+                disjuntor_chat.registrar_sucesso()
+            else:
+                # Stream abandonado (cliente desconectou): não conta como falha
+                disjuntor_chat.liberar()
+
+async def personalizar_interpretacao(texto_base: str, pergunta: str,
+                                     elementos_astrologicos: Optional[Dict], voz: str) -> Optional[str]:
+    """Parágrafo curto da IA que liga a leitura pré-gerada à pergunta (None em caso de falha)"""
+    template = registro_prompts.obter(f"personalizacao:{voz}", padrao="personalizacao:companheira")
+    linhas = [f"Leitura das cartas:\n{texto_base}"]
+    if elementos_astrologicos:
+        linhas.append(
+            f"Elementos Astrológicos: Sol em {elementos_astrologicos['sol']['signo']}, "
+            f"Lua em {elementos_astrologicos['lua']['signo']}, Ascendente em {elementos_astrologicos['ascendente']}"
+        )
+    linhas.append(f'Pergunta do consulente: "{pergunta}"')
+    padrao = registro_clientes.config.openai_timeout_s
+    async def chamar(timeout: float):
+        try:
+            return await asyncio.wait_for(
+                registro_clientes.openai_async.chat.completions.create(
+                    model="gpt-4.1-mini",
+                    messages=template.montar("\n".join(linhas)),
+                    max_tokens=PERSONALIZACAO_MAX_TOKENS,
+                    temperature=0.7
+                ),
+                timeout
+            )
+        except asyncio.TimeoutError as e:
+            raise erro_timeout(timeout, padrao, f"chat não respondeu em {timeout:.2f} s") from e
+    
+    try:
+        timeout = limitar_timeout(padrao)
+        with medir_etapa("llm_personalizacao"):
+            response = await disjuntor_chat.chamar_async(chamar, timeout)
+        return response.choices[0].message.content
+    except (CircuitoAberto, PrazoEsgotado) as e:
+        print(f"Personalização indisponível: {e}")
+        return None
+    except Exception as e:
+        registrar_erro_upstream("openai", "personalizacao")
+        print(f"Erro ao personalizar interpretação: {e}")
+        return None
+
+async def interpretacao_rapida(pergunta_data: PerguntaTarot, cartas: List[CartaTarot],
+                               elementos_astrologicos: Optional[Dict]) -> Optional[str]:
+    """Modo rápido: leitura pré-gerada da tiragem (+ personalização opcional); None se não houver"""
+    if not pergunta_data.modo_rapido:
+        return None
+    with medir_etapa("biblioteca"):
+        texto = biblioteca_tiragens.buscar(pergunta_data.voz_guru, [carta.nome for carta in cartas])
+    if texto is None or not pergunta_data.personalizar:
+        return texto
+    personalizacao = await personalizar_interpretacao(
+        texto, pergunta_data.pergunta, elementos_astrologicos, pergunta_data.voz_guru
+    )
+    # Sem a personalização, a leitura base continua valendo
+    return f"{texto}\n\n{personalizacao}" if personalizacao else texto
+
+def chave_tiragem(cartas: List[CartaTarot], elementos_astrologicos: Optional[Dict], voz: str) -> str:
+    """Identifica a tiragem exata: voz, cartas nas posições e signos astrológicos"""
+    tiragem = "|".join(f"{carta.posicao}:{carta.nome}" for carta in cartas)
+    signos = ""
+    if elementos_astrologicos:
+        signos = "/".join([
+            elementos_astrologicos['sol']['signo'],
+            elementos_astrologicos['lua']['signo'],
+            elementos_astrologicos['ascendente']
+        ])
+    return f"{voz}#{tiragem}#{signos}"
+
+def iniciar_embedding_pergunta(pergunta_data: PerguntaTarot) -> Optional[asyncio.Task]:
+    """Disparar o embedding da pergunta para o cache semântico (None se o cache não se aplica)"""
+    if cache_interpretacoes is None or pergunta_data.ignorar_cache or pergunta_data.modo_rapido:
+        return None
+    gerar_embedding = importar("memoria").gerar_embedding
+    return asyncio.create_task(asyncio.to_thread(gerar_embedding, pergunta_data.pergunta))
+
+async def aguardar_embedding(tarefa_embedding: Optional[asyncio.Task]) -> Optional[List[float]]:
+    """Vetor da pergunta dentro do prazo da requisição; None (sem cache semântico) se falhar ou demorar"""
+    if tarefa_embedding is None:
+        return None
+    try:
+        return await asyncio.wait_for(tarefa_embedding, tempo_restante())
+    except Exception as e:
+        print(f"Embedding da pergunta indisponível, seguindo sem cache semântico: {e}")
+        return None
+
+def leitura_reserva(pergunta_data: PerguntaTarot, cartas: List[CartaTarot],
+                    elementos_astrologicos: Optional[Dict]) -> Optional[str]:
+    """Fallback com a IA indisponível: última leitura em cache da mesma tiragem ou a pré-gerada"""
+    if cache_interpretacoes is not None:
+        leitura = cache_interpretacoes.reserva(chave_tiragem(cartas, elementos_astrologicos, pergunta_data.voz_guru))
+        if leitura is not None:
+            return leitura
+    return biblioteca_tiragens.buscar(pergunta_data.voz_guru, [carta.nome for carta in cartas])
+
+async def obter_interpretacao(pergunta_data: PerguntaTarot, cartas: List[CartaTarot],
+                              elementos_astrologicos: Optional[Dict],
+                              tarefa_embedding: Optional[asyncio.Task]) -> str:
+    """Interpretação da tiragem: pré-gerada (modo rápido), reaproveitada do cache semântico
+    (tiragem idêntica com pergunta parecida) ou gerada pela IA"""
+    interpretacao = await interpretacao_rapida(pergunta_data, cartas, elementos_astrologicos)
+    if interpretacao is not None:
+        return interpretacao
+    
+    chave = chave_tiragem(cartas, elementos_astrologicos, pergunta_data.voz_guru)
+    vetor_pergunta = await aguardar_embedding(tarefa_embedding)
+    if vetor_pergunta is not None:
+        with medir_etapa("cache_semantico"):
+            interpretacao = cache_interpretacoes.buscar(chave, vetor_pergunta)
+        if interpretacao is not None:
+            return interpretacao
+    
+    interpretacao = await gerar_interpretacao_ia(
+        pergunta_data.pergunta,
+        cartas,
+        elementos_astrologicos,
+        pergunta_data.voz_guru
+    )
+    if interpretacao == MENSAGEM_ERRO_INTERPRETACAO:
+        return leitura_reserva(pergunta_data, cartas, elementos_astrologicos) or interpretacao
+    if vetor_pergunta is not None:
+        cache_interpretacoes.guardar(chave, pergunta_data.pergunta, vetor_pergunta, interpretacao)
+    return interpretacao
+
+async def consultar_item_lote(indice: int, pergunta_data: PerguntaTarot,
+                              elementos_astrologicos: Optional[Dict], erro_mapa: Optional[str] = None) -> ItemLote:
+    """Uma consulta do lote; a falha fica no próprio item e não derruba as demais"""
+    if erro_mapa is not None:
+        # Sem o mapa pedido não há leitura completa: não gasta chamada à IA
+        return ItemLote(indice=indice, erro=erro_mapa)
+    try:
+        async with semaforo_lote:
+            # Cada item tem o próprio prazo, contado a partir de quando sai da fila do lote
+            iniciar_prazo()
+            tarefa_embedding = iniciar_embedding_pergunta(pergunta_data)
+            with medir_etapa("cartas"):
+                cartas = sortear_cartas(3)
+            interpretacao = await obter_interpretacao(pergunta_data, cartas, elementos_astrologicos, tarefa_embedding)
+        if interpretacao == MENSAGEM_ERRO_INTERPRETACAO:
+            return ItemLote(indice=indice, erro=interpretacao)
+        return ItemLote(indice=indice, resultado=RespostaTarot(
+            cartas=cartas,
+            interpretacao=interpretacao,
+            elementos_astrologicos=elementos_astrologicos,
+            timestamp=datetime.now()
+        ))
+    except Exception as e:
+        print(f"Erro na consulta {indice} do lote: {e}")
+        return ItemLote(indice=indice, erro=f"Erro interno: {str(e)}")
+
+async def iniciar_consultas_lote(consultas: List[PerguntaTarot]) -> List[asyncio.Task]:
+    """Calcular os mapas do lote de uma vez e disparar uma tarefa por consulta"""
+    # Nascimentos repetidos (p.ex. o mesmo assinante em várias consultas) viram um único mapa
+    indices_mapa = [i for i, consulta in enumerate(consultas) if consulta.dados_nascimento]
+    mapas: Dict[int, Optional[Dict[str, Any]]] = {}
+    erro_mapas: Optional[str] = None
+    if indices_mapa:
+        try:
+            with medir_etapa("astrologia"):
+                calculados = await calcular_dados_astrologicos_lote(
+                    [consultas[i].dados_nascimento for i in indices_mapa]
+                )
+            mapas = dict(zip(indices_mapa, calculados))
+        except Exception as e:
+            motivo = str(e) or type(e).__name__
+            print(f"Erro ao obter dados astrológicos do lote: {motivo}")
+            # O erro vai para cada item que pediu mapa; os demais seguem normalmente
+            erro_mapas = f"Mapa astrológico indisponível: {motivo}"
+    return [
+        asyncio.create_task(consultar_item_lote(
+            i, consulta, mapas.get(i), erro_mapas if consulta.dados_nascimento else None
+        ))
+        for i, consulta in enumerate(consultas)
+    ]
+
+async def cancelar_ao_desconectar(request: Request, tarefas: List[asyncio.Task]):
+    """Cancela as tarefas do lote se o cliente desconectar antes de elas terminarem"""
+    # O corpo já foi lido: a próxima mensagem do servidor ASGI só chega na desconexão
+    while (await request.receive())["type"] != "http.disconnect":
+        pass
+    for tarefa in tarefas:
+        tarefa.cancel()
+
+def evento_sse(evento: str, dados: Any) -> str:
+    """Formatar um evento server-sent events com payload JSON"""
+    return f"event: {evento}\ndata: {json.dumps(jsonable_encoder(dados), ensure_ascii=False)}\n\n"
 
 # Rotas da API
 @app.get("/")
@@ -241,21 +704,17 @@ async def health_check():
 async def consulta_tarot(pergunta_data: PerguntaTarot):
     """Realizar consulta de Tarot com IA"""
     try:
-        # Sortear cartas
-        cartas = sortear_cartas(3)
-        
-        # Obter dados astrológicos se fornecidos
-        elementos_astrologicos = None
-        if pergunta_data.dados_nascimento:
-            elementos_astrologicos = obter_dados_astrologicos(pergunta_data.dados_nascimento)
-        
-        # Gerar interpretação com IA
-        interpretacao = gerar_interpretacao_ia(
-            pergunta_data.pergunta,
-            cartas,
-            elementos_astrologicos,
-            pergunta_data.voz_guru
-        )
+        async with semaforo_consultas:
+            # Calcular o mapa astral em paralelo ao sorteio das cartas
+            # (o Kerykeion roda no pool de processos de mapas)
+            tarefa_astro = asyncio.create_task(
+                calcular_dados_astrologicos(pergunta_data.dados_nascimento)
+            )
+            tarefa_embedding = iniciar_embedding_pergunta(pergunta_data)
+            with medir_etapa("cartas"):
+                cartas = sortear_cartas(3)
+            elementos_astrologicos = await tarefa_astro
+            interpretacao = await obter_interpretacao(pergunta_data, cartas, elementos_astrologicos, tarefa_embedding)
         
         return RespostaTarot(
             cartas=cartas,
@@ -267,11 +726,180 @@ async def consulta_tarot(pergunta_data: PerguntaTarot):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
 
+@app.post("/consulta-tarot/stream")
+async def consulta_tarot_stream(pergunta_data: PerguntaTarot):
+    """Realizar consulta de Tarot com IA, enviando o resultado via server-sent events.
+    
+    Eventos emitidos, em ordem:
+    - cartas: cartas sorteadas (imediatamente)
+    - astrologia: elementos astrológicos (quando o mapa fica pronto)
+    - token: trechos da interpretação conforme são gerados
+    - fim: timestamp da consulta concluída (ou erro, em caso de falha)
+    """
+    async def eventos():
+        async with semaforo_consultas:
+            tarefa_astro = asyncio.create_task(
+                calcular_dados_astrologicos(pergunta_data.dados_nascimento)
+            )
+            tarefa_embedding = iniciar_embedding_pergunta(pergunta_data)
+            with medir_etapa("cartas"):
+                cartas = sortear_cartas(3)
+            yield evento_sse("cartas", {"cartas": cartas})
+            
+            elementos_astrologicos = await tarefa_astro
+            yield evento_sse("astrologia", {"elementos_astrologicos": elementos_astrologicos})
+            
+            interpretacao = await interpretacao_rapida(pergunta_data, cartas, elementos_astrologicos)
+            if interpretacao is not None:
+                yield evento_sse("token", {"texto": interpretacao})
+                yield evento_sse("fim", {"timestamp": datetime.now()})
+                return
+            
+            chave = chave_tiragem(cartas, elementos_astrologicos, pergunta_data.voz_guru)
+            vetor_pergunta = await aguardar_embedding(tarefa_embedding)
+            if vetor_pergunta is not None:
+                with medir_etapa("cache_semantico"):
+                    interpretacao = cache_interpretacoes.buscar(chave, vetor_pergunta)
+                if interpretacao is not None:
+                    yield evento_sse("token", {"texto": interpretacao})
+                    yield evento_sse("fim", {"timestamp": datetime.now()})
+                    return
+            
+            trechos = []
+            try:
+                async for texto in gerar_interpretacao_ia_stream(
+                    pergunta_data.pergunta,
+                    cartas,
+                    elementos_astrologicos,
+                    pergunta_data.voz_guru
+                ):
+                    trechos.append(texto)
+                    yield evento_sse("token", {"texto": texto})
+            except Exception as e:
+                print(f"Erro ao gerar interpretação IA (stream): {e}")
+                # Antes do primeiro token ainda dá para servir a leitura de reserva
+                reserva = None if trechos else leitura_reserva(pergunta_data, cartas, elementos_astrologicos)
+                if reserva is None:
+                    yield evento_sse("erro", {"detail": MENSAGEM_ERRO_INTERPRETACAO})
+                    return
+                yield evento_sse("token", {"texto": reserva})
+                yield evento_sse("fim", {"timestamp": datetime.now()})
+                return
+            
+            if vetor_pergunta is not None:
+                cache_interpretacoes.guardar(chave, pergunta_data.pergunta, vetor_pergunta, "".join(trechos))
+            
+            yield evento_sse("fim", {"timestamp": datetime.now()})
+    
+    return StreamingResponse(
+        eventos(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/consulta-tarot/lote", response_model=RespostaLote)
+async def consulta_tarot_lote(
+    lote: ConsultaLote,
+    request: Request,
+    formato: Literal["json", "ndjson"] = Query("json", description="json: resposta única; ndjson: um item por linha, na ordem em que ficam prontos")
+):
+    """Realizar muitas consultas de Tarot em uma requisição.
+    
+    Os mapas natais do lote são calculados juntos (sem repetir nascimentos) e as
+    interpretações rodam em paralelo, limitadas por LOTE_IA_SIMULTANEAS. Cada item
+    traz o índice da consulta e o resultado ou o erro dela.
+    """
+    tarefas = await iniciar_consultas_lote(lote.consultas)
+    
+    if formato == "json":
+        vigia = asyncio.create_task(cancelar_ao_desconectar(request, tarefas))
+        try:
+            itens = await asyncio.gather(*tarefas)
+        except asyncio.CancelledError:
+            if not vigia.done() or vigia.cancelled():
+                raise
+            # O vigia cancelou as tarefas: o cliente já foi embora e ninguém lê a resposta
+            return PlainTextResponse("Cliente desconectado", status_code=499)
+        finally:
+            # Cliente desconectado ou requisição cancelada: não gastar chamadas à IA à toa
+            vigia.cancel()
+            for tarefa in tarefas:
+                tarefa.cancel()
+        return RespostaLote(
+            resultados=list(itens),
+            total=len(itens),
+            erros=sum(item.erro is not None for item in itens)
+        )
+    
+    async def linhas():
+        try:
+            for proximo in asyncio.as_completed(tarefas):
+                item = await proximo
+                yield json.dumps(jsonable_encoder(item), ensure_ascii=False) + "\n"
+        finally:
+            # Se o cliente desconectar, não gastar chamadas à IA com itens que ninguém vai ler
+            for tarefa in tarefas:
+                tarefa.cancel()
+    
+    return StreamingResponse(linhas(), media_type="application/x-ndjson")
+
+@app.get("/estatisticas-cache")
+async def estatisticas_cache():
+    """Contadores de acertos/falhas dos caches do backend"""
+    return {
+        "mapas": cache_mapas.estatisticas(),
+        "executor_mapas": executor_mapas.estatisticas(),
+        "biblioteca_tiragens": biblioteca_tiragens.estatisticas(),
+        "disjuntores": estatisticas_disjuntores(),
+        "interpretacoes": cache_interpretacoes.estatisticas() if cache_interpretacoes else None
+    }
+
+def series_caches() -> List[Tuple[Dict[str, str], Dict[str, Any]]]:
+    """Contadores de todos os caches, rotulados por cache (e camada)"""
+    series = series_cache("mapas", cache_mapas.estatisticas())
+    if cache_interpretacoes:
+        series += series_cache("interpretacoes", cache_interpretacoes.estatisticas(top=0))
+    memoria = sys.modules.get("memoria")
+    if memoria is not None:
+        series += series_cache("embeddings", memoria.cache_embeddings.estatisticas())
+    return series
+
+def taxa_acerto(estatisticas: Dict[str, Any]) -> float:
+    total = estatisticas["acertos"] + estatisticas["falhas"]
+    return estatisticas["acertos"] / total if total else 0.0
+
+metricas.registrar_coletor("tarot_cache_acertos_total", "Acertos por cache",
+                           lambda: [(r, e["acertos"]) for r, e in series_caches()], tipo="counter")
+metricas.registrar_coletor("tarot_cache_falhas_total", "Falhas por cache",
+                           lambda: [(r, e["falhas"]) for r, e in series_caches()], tipo="counter")
+metricas.registrar_coletor("tarot_cache_taxa_acerto", "Fração de acertos por cache desde o início do processo",
+                           lambda: [(r, taxa_acerto(e)) for r, e in series_caches()])
+
+metricas.registrar_coletor("tarot_disjuntor_aberto", "1 se o circuito do serviço externo está aberto",
+                           series_disjuntores)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def exportar_metricas():
+    """Métricas no formato de texto do Prometheus"""
+    return PlainTextResponse(metricas.exportar(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/prompts/relatorio")
+async def relatorio_prompts():
+    """Tokens do prefixo estático e do sufixo dinâmico (médio e máximo) por template"""
+    return registro_prompts.relatorio()
+
+@app.get("/inicializacao/relatorio")
+async def relatorio_de_inicializacao():
+    """Tempos de import, de startup e do pré-aquecimento (acompanhamento do cold start)"""
+    return relatorio_inicializacao.relatorio()
+
 @app.get("/vozes-guru")
 async def listar_vozes_guru():
     """Listar vozes disponíveis da Guru IA"""
     return {"vozes": list(VOZES_GURU.keys()), "detalhes": VOZES_GURU}
 
+relatorio_inicializacao.marcar("import_main")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
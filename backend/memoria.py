@@ -1,68 +1,340 @@
 ﻿import os
 import json
+import hashlib
+import time
+import queue
+import threading
+import atexit
+from concurrent.futures import Future
 from dotenv import load_dotenv
-from supabase import create_client, Client
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 import numpy as np 
-from openai import OpenAI
+from cache import CacheLRU, CacheDoisNiveis, criar_cache_persistente
+from indice_vetorial import IndiceVetorial
+from codec_embedding import codificar_base64, decodificar_base64
+from clientes import registro_clientes
+from metricas import medir_etapa, registrar_erro_upstream
+from resiliencia import CircuitoAberto, PrazoEsgotado, disjuntor, executar_com_hedge, limitar_timeout
 
 # Carregar variáveis de ambiente
-load_dotenv("/home/ubuntu/tarotconclusivo/.env")
+load_dotenv()
 
-# Configuração do Cliente Supabase
-SUPABASE_URL: str = os.getenv("SUPABASE_URL")
-SUPABASE_KEY: str = os.getenv("SUPABASE_SERVICE_ROLE_KEY") # Chave Service Role (JWT)
-
-# Inicialização do Cliente Supabase
-try:
-    supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-except Exception as e:
-    print(f"Erro ao inicializar cliente Supabase: {e}")
-
-# Inicialização do Cliente OpenAI
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-client = OpenAI(api_key=OPENAI_API_KEY)
+# Clientes OpenAI e Supabase compartilhados (pools de conexões em clientes.py)
 
 # Dimensão do embedding 
 EMBEDDING_DIMENSION = 1536
+MODELO_EMBEDDING = "text-embedding-ada-002" # Modelo de 1536 dimensões
+
+# Timeouts e hedge (segunda tentativa depois de N ms sem resposta; 0 desliga) das
+# chamadas de embedding e de recuperação de memórias, sempre dentro do prazo da requisição
+EMBEDDING_TIMEOUT_S = float(os.getenv("EMBEDDING_TIMEOUT_S", "5"))
+HEDGE_EMBEDDING_S = float(os.getenv("HEDGE_EMBEDDING_MS", "0")) / 1000
+RECUPERACAO_TIMEOUT_S = float(os.getenv("RECUPERACAO_TIMEOUT_S", "3"))
+HEDGE_RECUPERACAO_S = float(os.getenv("HEDGE_RECUPERACAO_MS", "0")) / 1000
+
+disjuntor_embeddings = disjuntor("openai_embeddings")
+disjuntor_supabase = disjuntor("supabase")
+
+class EmbeddingIndisponivel(RuntimeError):
+    """Falha (ou circuito aberto) na geração de embeddings: quem chama segue sem cache semântico/RAG."""
+
+# Cache de embeddings endereçado pelo conteúdo (hash do modelo + texto)
+cache_embeddings = CacheDoisNiveis(
+    CacheLRU(int(os.getenv("MAX_EMBEDDINGS_CACHE", "4096"))),
+    criar_cache_persistente("embeddings.sqlite3", "embeddings") if os.getenv("CACHE_EMBEDDINGS_PERSISTENTE") == "1" else None
+)
+
+def chave_embedding(texto: str, modelo: str = MODELO_EMBEDDING) -> str:
+    """Chave do cache de embeddings: o mesmo texto em outro modelo gera outro vetor."""
+    return f"{modelo}:{hashlib.sha256(texto.encode('utf-8')).hexdigest()}"
+
+def _chamar_api_embeddings(textos: List[str], modelo: str) -> List[List[float]]:
+    """Uma única chamada embeddings.create para uma lista de textos."""
+    # O prazo da requisição é conferido antes do disjuntor: esgotá-lo não é falha da API
+    timeout = limitar_timeout(EMBEDDING_TIMEOUT_S)
+    def chamar():
+        return registro_clientes.openai.embeddings.create(
+            input=textos,
+            model=modelo,
+            timeout=timeout
+        )
+    try:
+        response = disjuntor_embeddings.chamar(
+            executar_com_hedge, chamar, atraso_s=HEDGE_EMBEDDING_S, timeout_s=EMBEDDING_TIMEOUT_S
+        )
+    except (CircuitoAberto, PrazoEsgotado):
+        raise
+    except Exception:
+        registrar_erro_upstream("openai", "embeddings")
+        raise
+    # A API devolve os vetores com o campo index indicando a posição da entrada
+    return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+
+class AgrupadorEmbeddings:
+    """
+    Micro-batcher de embeddings entre usuários concorrentes.
+    
+    Junta os pedidos que chegam dentro de uma janela curta (ou até atingir o tamanho
+    máximo do lote), envia tudo em uma única chamada embeddings.create e devolve a
+    cada chamador apenas os seus vetores. A fila é limitada: quando está cheia, o
+    chamador espera até `timeout_fila` segundos e então recebe erro (backpressure).
+    """
+    
+    def __init__(self, janela_ms: float = 10, max_lote: int = 256,
+                 max_fila: int = 1000, timeout_fila: float = 5.0):
+        self.janela = janela_ms / 1000
+        self.max_lote = max_lote
+        self.timeout_fila = timeout_fila
+        self._fila: "queue.Queue[Tuple[List[str], str, Future]]" = queue.Queue(maxsize=max_fila)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.lotes_enviados = 0
+        self.textos_enviados = 0
+        self.pedidos_rejeitados = 0
+    
+    def _iniciar(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._executar, name="agrupador-embeddings", daemon=True)
+                self._thread.start()
+    
+    def solicitar(self, textos: List[str], modelo: str = MODELO_EMBEDDING) -> "Future[List[List[float]]]":
+        """Enfileira textos para o próximo lote; o Future resolve com os vetores na mesma ordem."""
+        self._iniciar()
+        futuro: Future = Future()
+        try:
+            self._fila.put((textos, modelo, futuro), timeout=self.timeout_fila)
+        except queue.Full:
+            self.pedidos_rejeitados += 1
+            raise RuntimeError("Fila de embeddings cheia, tente novamente em instantes")
+        return futuro
+    
+    def _coletar(self) -> List[Tuple[List[str], str, Future]]:
+        """Bloqueia até o primeiro pedido e junta os seguintes até fechar a janela ou o lote."""
+        pedidos = [self._fila.get()]
+        total = len(pedidos[0][0])
+        limite = time.monotonic() + self.janela
+        while total < self.max_lote:
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                break
+            try:
+                pedido = self._fila.get(timeout=restante)
+            except queue.Empty:
+                break
+            pedidos.append(pedido)
+            total += len(pedido[0])
+        return pedidos
+    
+    def _executar(self):
+        while True:
+            pedidos = self._coletar()
+            por_modelo: Dict[str, List[Tuple[List[str], Future]]] = {}
+            for textos, modelo, futuro in pedidos:
+                por_modelo.setdefault(modelo, []).append((textos, futuro))
+            
+            for modelo, grupo in por_modelo.items():
+                # Textos repetidos entre chamadores vão uma única vez para a API
+                unicos = list(dict.fromkeys(texto for textos, _ in grupo for texto in textos))
+                try:
+                    vetores = dict(zip(unicos, _chamar_api_embeddings(unicos, modelo)))
+                    self.lotes_enviados += 1
+                    self.textos_enviados += len(unicos)
+                except Exception as e:
+                    for _, futuro in grupo:
+                        futuro.set_exception(e)
+                    continue
+                for textos, futuro in grupo:
+                    futuro.set_result([vetores[texto] for texto in textos])
+    
+    def estatisticas(self) -> Dict[str, int]:
+        return {
+            "fila": self._fila.qsize(),
+            "lotes_enviados": self.lotes_enviados,
+            "textos_enviados": self.textos_enviados,
+            "pedidos_rejeitados": self.pedidos_rejeitados,
+        }
+
+# Agrupador compartilhado (desligue com EMBEDDINGS_AGRUPAR=0 para chamar a API direto)
+agrupador_embeddings = AgrupadorEmbeddings(
+    janela_ms=float(os.getenv("EMBEDDINGS_JANELA_MS", "10")),
+    max_lote=int(os.getenv("EMBEDDINGS_LOTE_MAX", "256")),
+    max_fila=int(os.getenv("EMBEDDINGS_FILA_MAX", "1000")),
+) if os.getenv("EMBEDDINGS_AGRUPAR", "1") == "1" else None
+
+@medir_etapa("embedding")
+def gerar_embeddings_lote(textos: List[str], modelo: str = MODELO_EMBEDDING) -> List[List[float]]:
+    """
+    Gera os embeddings de vários textos com no máximo uma chamada à API da OpenAI.
+    Textos já vistos saem do cache; os demais vão para o agrupador, que os junta
+    aos pedidos de outros usuários concorrentes em um único lote. Levanta
+    EmbeddingIndisponivel se a API falhar, estourar o prazo ou estiver com o
+    circuito aberto.
+    """
+    chaves = [chave_embedding(texto, modelo) for texto in textos]
+    vetores = {}
+    pendentes = {}
+    for chave, texto in zip(chaves, textos):
+        if chave in vetores or chave in pendentes:
+            continue
+        vetor = cache_embeddings.obter(chave)
+        if vetor is not None:
+            vetores[chave] = vetor
+        else:
+            pendentes[chave] = texto
+    
+    if pendentes:
+        if disjuntor_embeddings.estado == "aberto":
+            raise EmbeddingIndisponivel("circuito de embeddings aberto")
+        try:
+            if agrupador_embeddings is not None:
+                futuro = agrupador_embeddings.solicitar(list(pendentes.values()), modelo)
+                novos = futuro.result(timeout=limitar_timeout(EMBEDDING_TIMEOUT_S))
+            else:
+                novos = _chamar_api_embeddings(list(pendentes.values()), modelo)
+            for chave, vetor in zip(pendentes, novos):
+                vetores[chave] = vetor
+                cache_embeddings.guardar(chave, vetor)
+        except Exception as e:
+            motivo = str(e) or type(e).__name__
+            print(f"ERRO REAL NA GERAÇÃO DE EMBEDDING: {motivo}")
+            # Sem vetor de zeros: um embedding degradado não pode ir para o cache,
+            # para a busca nem para a memória_vetorial
+            raise EmbeddingIndisponivel(motivo) from e
+    
+    return [vetores[chave] for chave in chaves]
 
 def gerar_embedding(texto: str) -> List[float]:
     """Gera o embedding de um texto usando a API da OpenAI."""
+    return gerar_embeddings_lote([texto])[0]
+
+# Limite de similaridade (cosseno) para uma memória entrar no contexto (ajustável)
+LIMIAR_SIMILARIDADE = 0.5
+
+# Índice vetorial local por usuário (desligue com INDICE_LOCAL=0 para usar só o match_memoria)
+indice_local = IndiceVetorial(dimensao=EMBEDDING_DIMENSION) if os.getenv("INDICE_LOCAL", "1") == "1" else None
+
+# Formato de armazenamento dos embeddings no Supabase.
+# "json" mantém só a coluna pgvector `embedding` (formato original). Com "float32",
+# "float16" ou "int8" o vetor vai compacto, em base64, para `embedding_codificado`
+# (com o nome do codec em `codec`). Requer a migração:
+#
+#   ALTER TABLE memoria_vetorial
+#       ADD COLUMN embedding_codificado text,
+#       ADD COLUMN codec text;
+#   ALTER TABLE memoria_vetorial ALTER COLUMN embedding DROP NOT NULL;
+#
+# e, para as linhas já existentes, migrar_embeddings(). MEMORIA_GRAVAR_PGVECTOR=0
+# deixa de gravar a coluna pgvector (o fallback match_memoria passa a ignorar as
+# linhas novas; a busca fica a cargo do índice local).
+CODEC_MEMORIA = os.getenv("MEMORIA_CODEC", "json")
+GRAVAR_PGVECTOR = CODEC_MEMORIA == "json" or os.getenv("MEMORIA_GRAVAR_PGVECTOR", "1") == "1"
+
+def serializar_embedding(embedding: List[float]) -> dict:
+    """Colunas da tabela memoria_vetorial que guardam o embedding, conforme o codec."""
+    colunas = {}
+    if GRAVAR_PGVECTOR:
+        colunas["embedding"] = json.dumps(embedding)
+    if CODEC_MEMORIA != "json":
+        colunas["embedding_codificado"] = codificar_base64(embedding, CODEC_MEMORIA)
+        colunas["codec"] = CODEC_MEMORIA
+    return colunas
+
+def desserializar_embedding(item: dict) -> List[float]:
+    """Lê o embedding de uma linha, preferindo o formato compacto quando existir."""
+    if item.get('embedding_codificado'):
+        return decodificar_base64(item['embedding_codificado'], item['codec'])
+    embedding = item['embedding']
+    # O pgvector chega pelo PostgREST como texto "[0.1, 0.2, ...]"
+    if isinstance(embedding, str):
+        embedding = json.loads(embedding)
+    return embedding
+
+def carregar_memorias_usuario(user_id: str) -> List[Tuple[str, List[float]]]:
+    """
+    Lê do Supabase (fonte durável) todas as memórias do usuário como (texto, embedding).
+    """
+    colunas = 'consulta_texto, embedding'
+    if CODEC_MEMORIA != "json":
+        colunas += ', embedding_codificado, codec'
+    consulta = registro_clientes.supabase.table('memoria_vetorial').select(colunas).eq('user_id', user_id)
+    # O prazo da requisição é conferido antes do disjuntor: esgotá-lo não é falha do Supabase
+    limitar_timeout(RECUPERACAO_TIMEOUT_S)
     try:
-        response = client.embeddings.create(
-            input=texto,
-            model="text-embedding-ada-002" # Modelo de 1536 dimensões
+        response = disjuntor_supabase.chamar(
+            executar_com_hedge, consulta.execute, atraso_s=HEDGE_RECUPERACAO_S, timeout_s=RECUPERACAO_TIMEOUT_S
         )
-        # Retorna a lista de floats do embedding
-        return response.data[0].embedding
-    except Exception as e:
-        print(f"ERRO REAL NA GERAÇÃO DE EMBEDDING: {e}")
-        # Em caso de falha, retorne um vetor de zeros para evitar quebrar o fluxo
-        # ou levante o erro, dependendo da sua estratégia de produção.
-        return [0.0] * EMBEDDING_DIMENSION
+    except (CircuitoAberto, PrazoEsgotado):
+        raise
+    except Exception:
+        registrar_erro_upstream("supabase", "carregar_memorias")
+        raise
+    
+    return [(item['consulta_texto'], desserializar_embedding(item)) for item in response.data]
+
+@medir_etapa("salvar_memoria")
+def salvar_memorias_lote(registros: List[Tuple[str, str, List[float]]]):
+    """
+    Salva várias memórias (user_id, consulta_texto, embedding) na tabela memoria_vetorial
+    com um único insert de múltiplas linhas. Levanta exceção em caso de falha.
+    """
+    try:
+        data, count = registro_clientes.supabase.table('memoria_vetorial').insert([
+            {
+                "user_id": user_id,
+                "consulta_texto": consulta_texto,
+                **serializar_embedding(embedding)
+            }
+            for user_id, consulta_texto, embedding in registros
+        ]).execute()
+    except Exception:
+        registrar_erro_upstream("supabase", "salvar_memorias")
+        raise
+    
+    # Mantém os shards locais em dia sem esperar a próxima sincronização
+    if indice_local is not None:
+        for user_id, consulta_texto, embedding in registros:
+            indice_local.adicionar(user_id, consulta_texto, embedding)
+    
+    return data
 
 def salvar_memoria(user_id: str, consulta_texto: str, embedding: List[float]):
     """
     Salva o texto da consulta e seu embedding na tabela memoria_vetorial.
     """
     try:
-        embedding_str = json.dumps(embedding)
-        
-        data, count = supabase.table('memoria_vetorial').insert({
-            "user_id": user_id,
-            "consulta_texto": consulta_texto,
-            "embedding": embedding_str
-        }).execute()
-        
-        return data
+        return salvar_memorias_lote([(user_id, consulta_texto, embedding)])
     except Exception as e:
         print(f"❌ Erro ao salvar memória no Supabase: {e}")
         return None
 
-def recuperar_memoria(user_id: str, vetor_busca: List[float], top_k: int = 3) -> List[str]:
+@medir_etapa("recuperacao_memoria")
+def recuperar_memoria_detalhada(user_id: str, vetor_busca: List[float],
+                                top_k: int = 3) -> List[Tuple[str, float, Optional[np.ndarray]]]:
     """
-    Recupera as consultas mais similares do histórico do usuário usando pgvector (RAG).
+    Recupera as consultas mais similares do histórico do usuário (RAG) como
+    (texto, similaridade, embedding normalizado). Usa o índice vetorial local quando
+    disponível; senão, o pgvector via match_memoria (que não devolve os embeddings).
     """
+    if indice_local is not None:
+        try:
+            shard = indice_local.obter_shard(user_id)
+            if shard is None:
+                shard = indice_local.sincronizar(user_id, carregar_memorias_usuario(user_id))
+            encontrados = shard.buscar_indices(vetor_busca, top_k, LIMIAR_SIMILARIDADE)
+            if not encontrados:
+                return []
+            vetores = shard.vetores_linhas([linha for linha, _ in encontrados])
+            return [
+                (shard.textos[linha], similaridade, vetor)
+                for (linha, similaridade), vetor in zip(encontrados, vetores)
+            ]
+        except (CircuitoAberto, PrazoEsgotado):
+            # Supabase fora do ar ou prazo esgotado: segue sem contexto histórico
+            return []
+        except Exception as e:
+            print(f"❌ Erro no índice local, usando match_memoria: {e}")
+    
     try:
         # 1. Formata o vetor de busca para a query SQL
         vetor_busca_str = json.dumps(vetor_busca)
@@ -72,26 +344,205 @@ def recuperar_memoria(user_id: str, vetor_busca: List[float], top_k: int = 3) ->
         
         # ATENÇÃO: Esta chamada falhará até que a função 'match_memoria' seja criada no Supabase.
         
-        response = supabase.rpc(
+        rpc = registro_clientes.supabase.rpc(
             'match_memoria', 
             {
                 'query_embedding': vetor_busca_str,
                 'match_user_id': user_id,
-                'match_threshold': 0.5, # Limite de similaridade (ajustável)
+                'match_threshold': LIMIAR_SIMILARIDADE,
                 'match_count': top_k
             }
-        ).execute()
+        )
+        limitar_timeout(RECUPERACAO_TIMEOUT_S)
+        response = disjuntor_supabase.chamar(
+            executar_com_hedge, rpc.execute, atraso_s=HEDGE_RECUPERACAO_S, timeout_s=RECUPERACAO_TIMEOUT_S
+        )
         
         # O resultado do RPC é um objeto com a chave 'data'
-        contexto_recuperado = [item['consulta_texto'] for item in response.data]
-        
-        return contexto_recuperado
+        return [
+            (item['consulta_texto'], item.get('similarity', 0.0), None)
+            for item in response.data
+        ]
         
+    except (CircuitoAberto, PrazoEsgotado):
+        return []
     except Exception as e:
+        registrar_erro_upstream("supabase", "match_memoria")
         print(f"❌ Erro ao recuperar memória: {e}")
         # Retorna um contexto vazio em caso de falha
         return []
 
+def recuperar_memoria(user_id: str, vetor_busca: List[float], top_k: int = 3) -> List[str]:
+    """
+    Recupera os textos das consultas mais similares do histórico do usuário (RAG).
+    """
+    return [texto for texto, _, _ in recuperar_memoria_detalhada(user_id, vetor_busca, top_k)]
+
+def migrar_embeddings(tamanho_lote: int = 500) -> int:
+    """
+    Preenche embedding_codificado/codec (no codec MEMORIA_CODEC) das linhas antigas
+    que só têm a coluna pgvector. Pode ser interrompida e retomada; devolve o total migrado.
+    """
+    if CODEC_MEMORIA == "json":
+        raise ValueError("Defina MEMORIA_CODEC (float32, float16 ou int8) antes de migrar")
+    
+    total = 0
+    while True:
+        response = registro_clientes.supabase.table('memoria_vetorial') \
+            .select('id, user_id, consulta_texto, embedding') \
+            .is_('embedding_codificado', 'null') \
+            .limit(tamanho_lote) \
+            .execute()
+        if not response.data:
+            return total
+        
+        registro_clientes.supabase.table('memoria_vetorial').upsert([
+            {
+                "id": item['id'],
+                "user_id": item['user_id'],
+                "consulta_texto": item['consulta_texto'],
+                "embedding_codificado": codificar_base64(desserializar_embedding(item), CODEC_MEMORIA),
+                "codec": CODEC_MEMORIA
+            }
+            for item in response.data
+        ]).execute()
+        total += len(response.data)
+        print(f"Migrados {total} embeddings para {CODEC_MEMORIA}")
+
+class FilaMemoria:
+    """
+    Persistência write-behind das memórias, fora do caminho da resposta.
+    
+    As consultas enfileiram (user_id, texto) e retornam na hora. Um worker em segundo
+    plano junta os registros em lotes, gera os embeddings que faltam em uma única
+    chamada e grava tudo com um insert de múltiplas linhas. Lotes que falham são
+    tentados de novo com espera crescente; a fila é limitada e é drenada no
+    encerramento do processo.
+    """
+    
+    def __init__(self, max_fila: int = 1000, max_lote: int = 50, janela_s: float = 1.0,
+                 max_tentativas: int = 5, espera_inicial_s: float = 0.5):
+        self.max_lote = max_lote
+        self.janela = janela_s
+        self.max_tentativas = max_tentativas
+        self.espera_inicial = espera_inicial_s
+        self._fila: "queue.Queue[Tuple[str, str, Optional[List[float]]]]" = queue.Queue(maxsize=max_fila)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._encerrando = False
+        self.gravados = 0
+        self.descartados = 0
+    
+    def _iniciar(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._executar, name="fila-memoria", daemon=True)
+                self._thread.start()
+    
+    def enfileirar(self, user_id: str, consulta_texto: str,
+                   embedding: Optional[List[float]] = None, timeout: float = 0.1) -> bool:
+        """Agenda a gravação de uma memória; devolve False se a fila estiver cheia ou encerrada."""
+        if self._encerrando:
+            return False
+        self._iniciar()
+        try:
+            self._fila.put((user_id, consulta_texto, embedding), timeout=timeout)
+            return True
+        except queue.Full:
+            self.descartados += 1
+            print(f"❌ Fila de memórias cheia, memória descartada (user_id={user_id})")
+            return False
+    
+    def _coletar(self) -> List[Tuple[str, str, Optional[List[float]]]]:
+        registros = [self._fila.get()]
+        limite = time.monotonic() + self.janela
+        while len(registros) < self.max_lote:
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                break
+            try:
+                registros.append(self._fila.get(timeout=restante))
+            except queue.Empty:
+                break
+        return registros
+    
+    def _gravar(self, registros: List[Tuple[str, str, Optional[List[float]]]]):
+        """Gera os embeddings que faltam e grava o lote; levanta exceção para nova tentativa."""
+        sem_embedding = [texto for _, texto, embedding in registros if embedding is None]
+        novos = iter(gerar_embeddings_lote(sem_embedding)) if sem_embedding else iter(())
+        completos = [
+            (user_id, texto, embedding if embedding is not None else next(novos))
+            for user_id, texto, embedding in registros
+        ]
+        salvar_memorias_lote(completos)
+    
+    def _descartar_nulos(self, registros: List[Tuple[str, str, Optional[List[float]]]]) -> List[Tuple[str, str, Optional[List[float]]]]:
+        """
+        Tira do lote os registros enfileirados com vetor nulo (embedding degradado de
+        quem chamou): nunca são persistidos, mas não impedem a gravação dos demais.
+        """
+        validos = []
+        for registro in registros:
+            user_id, _, embedding = registro
+            if embedding is not None and not any(embedding):
+                self.descartados += 1
+                print(f"❌ Memória com embedding nulo descartada (user_id={user_id})")
+            else:
+                validos.append(registro)
+        return validos
+    
+    def _executar(self):
+        while True:
+            registros = self._coletar()
+            validos = self._descartar_nulos(registros)
+            espera = self.espera_inicial
+            for tentativa in range(1, self.max_tentativas + 1):
+                if not validos:
+                    break
+                try:
+                    self._gravar(validos)
+                    self.gravados += len(validos)
+                    break
+                except Exception as e:
+                    # Só falhas do lote inteiro (embeddings, insert) chegam aqui
+                    print(f"❌ Erro ao gravar lote de memórias (tentativa {tentativa}/{self.max_tentativas}): {e}")
+                    if tentativa == self.max_tentativas:
+                        self.descartados += len(validos)
+                    else:
+                        time.sleep(espera)
+                        espera *= 2
+            for _ in registros:
+                self._fila.task_done()
+    
+    def drenar(self, timeout: float = 10.0) -> bool:
+        """Para de aceitar registros e espera a fila esvaziar (até `timeout` segundos)."""
+        self._encerrando = True
+        limite = time.monotonic() + timeout
+        while self._fila.unfinished_tasks and time.monotonic() < limite:
+            time.sleep(0.05)
+        return not self._fila.unfinished_tasks
+    
+    def estatisticas(self) -> Dict[str, int]:
+        return {
+            "fila": self._fila.qsize(),
+            "gravados": self.gravados,
+            "descartados": self.descartados,
+        }
+
+fila_memoria = FilaMemoria(
+    max_fila=int(os.getenv("MEMORIA_FILA_MAX", "1000")),
+    max_lote=int(os.getenv("MEMORIA_LOTE_MAX", "50")),
+    janela_s=float(os.getenv("MEMORIA_JANELA_S", "1.0")),
+)
+atexit.register(fila_memoria.drenar)
+
+def enfileirar_memoria(user_id: str, consulta_texto: str, embedding: Optional[List[float]] = None) -> bool:
+    """
+    Agenda a gravação da consulta na memória sem bloquear a resposta.
+    O embedding, se não informado, é gerado em lote pelo worker da fila.
+    """
+    return fila_memoria.enfileirar(user_id, consulta_texto, embedding)
+
 # Exemplo de uso (para teste de funcionalidade)
 if __name__ == "__main__":
     # ATENÇÃO: user_id DEVE ser um UUID válido. Usaremos o placeholder.
@@ -0,0 +1,225 @@
+"""
+Instrumentação do caminho quente: tempos por etapa, métricas Prometheus e
+amostragem de traces.
+
+- `medir_etapa("astrologia")` cronometra uma etapa; o tempo vai para o
+  histograma da etapa e, dentro de uma requisição, para o cabeçalho
+  Server-Timing (etapas repetidas na mesma requisição são somadas).
+- `registrar_erro_upstream("openai", "chat")` conta falhas em serviços externos.
+- `metricas.exportar()` gera o texto do /metrics (formato Prometheus), incluindo
+  valores lidos na hora por coletores (p.ex. acertos dos caches).
+- `AmostradorTraces` substitui o traces_sample_rate fixo do Sentry.
+"""
+
+import os
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+# Limites dos buckets de latência, em segundos
+BUCKETS_LATENCIA = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+Rotulos = Tuple[Tuple[str, str], ...]
+
+
+def _escapar(valor: Any) -> str:
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _formatar_rotulos(rotulos: Rotulos, extra: Optional[Tuple[str, str]] = None) -> str:
+    pares = list(rotulos) + ([extra] if extra else [])
+    if not pares:
+        return ""
+    return "{" + ",".join(f'{nome}="{_escapar(valor)}"' for nome, valor in pares) + "}"
+
+
+class Contador:
+    def __init__(self, nome: str, ajuda: str):
+        self.nome = nome
+        self.ajuda = ajuda
+        self._valores: Dict[Rotulos, float] = {}
+        self._lock = threading.Lock()
+
+    def incrementar(self, valor: float = 1, **rotulos: str):
+        chave = tuple(sorted(rotulos.items()))
+        with self._lock:
+            self._valores[chave] = self._valores.get(chave, 0) + valor
+
+    def exportar(self) -> List[str]:
+        with self._lock:
+            valores = dict(self._valores)
+        linhas = [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} counter"]
+        linhas += [f"{self.nome}{_formatar_rotulos(r)} {v}" for r, v in sorted(valores.items())]
+        return linhas
+
+
+class Histograma:
+    def __init__(self, nome: str, ajuda: str, buckets: Tuple[float, ...] = BUCKETS_LATENCIA):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.buckets = buckets
+        # rótulos -> (contagem por bucket, soma, total)
+        self._series: Dict[Rotulos, Tuple[List[int], float, int]] = {}
+        self._lock = threading.Lock()
+
+    def observar(self, valor: float, **rotulos: str):
+        chave = tuple(sorted(rotulos.items()))
+        posicao = bisect_left(self.buckets, valor)
+        with self._lock:
+            contagens, soma, total = self._series.get(chave) or ([0] * len(self.buckets), 0.0, 0)
+            if posicao < len(contagens):
+                contagens[posicao] += 1
+            self._series[chave] = (contagens, soma + valor, total + 1)
+
+    def exportar(self) -> List[str]:
+        with self._lock:
+            series = {r: (list(c), s, t) for r, (c, s, t) in self._series.items()}
+        linhas = [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} histogram"]
+        for rotulos, (contagens, soma, total) in sorted(series.items()):
+            acumulado = 0
+            for limite, contagem in zip(self.buckets, contagens):
+                acumulado += contagem
+                linhas.append(f"{self.nome}_bucket{_formatar_rotulos(rotulos, ('le', repr(limite)))} {acumulado}")
+            linhas.append(f"{self.nome}_bucket{_formatar_rotulos(rotulos, ('le', '+Inf'))} {total}")
+            linhas.append(f"{self.nome}_sum{_formatar_rotulos(rotulos)} {soma}")
+            linhas.append(f"{self.nome}_count{_formatar_rotulos(rotulos)} {total}")
+        return linhas
+
+
+class RegistroMetricas:
+    def __init__(self):
+        self.duracao_requisicao = Histograma(
+            "tarot_requisicao_duracao_segundos", "Duração das requisições HTTP por rota")
+        self.duracao_etapa = Histograma(
+            "tarot_etapa_duracao_segundos", "Duração de cada etapa da consulta")
+        self.erros_upstream = Contador(
+            "tarot_upstream_erros_total", "Falhas em chamadas a serviços externos")
+        # nome -> função que devolve [(rótulos, valor)] na hora da coleta
+        self._coletores: Dict[str, Tuple[str, str, Callable[[], List[Tuple[Dict[str, str], float]]]]] = {}
+
+    def registrar_coletor(self, nome: str, ajuda: str,
+                          coletar: Callable[[], List[Tuple[Dict[str, str], float]]], tipo: str = "gauge"):
+        self._coletores[nome] = (ajuda, tipo, coletar)
+
+    def exportar(self) -> str:
+        linhas: List[str] = []
+        for metrica in (self.duracao_requisicao, self.duracao_etapa, self.erros_upstream):
+            linhas += metrica.exportar()
+        for nome, (ajuda, tipo, coletar) in self._coletores.items():
+            try:
+                valores = coletar()
+            except Exception as e:
+                print(f"Erro ao coletar métrica {nome}: {e}")
+                continue
+            linhas += [f"# HELP {nome} {ajuda}", f"# TYPE {nome} {tipo}"]
+            linhas += [f"{nome}{_formatar_rotulos(tuple(sorted(r.items())))} {v}" for r, v in valores]
+        return "\n".join(linhas) + "\n"
+
+
+metricas = RegistroMetricas()
+
+# Tempos das etapas da requisição corrente (None fora de requisições)
+_etapas_requisicao: ContextVar[Optional[Dict[str, float]]] = ContextVar("etapas_requisicao", default=None)
+
+
+def iniciar_etapas_requisicao() -> Dict[str, float]:
+    """Abre o acumulador de etapas da requisição (visível nas tasks e threads que ela dispara)."""
+    etapas: Dict[str, float] = {}
+    _etapas_requisicao.set(etapas)
+    return etapas
+
+
+def registrar_etapa(etapa: str, segundos: float):
+    metricas.duracao_etapa.observar(segundos, etapa=etapa)
+    etapas = _etapas_requisicao.get()
+    if etapas is not None:
+        etapas[etapa] = etapas.get(etapa, 0.0) + segundos
+
+
+@contextmanager
+def medir_etapa(etapa: str) -> Iterator[None]:
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        registrar_etapa(etapa, time.perf_counter() - inicio)
+
+
+def registrar_erro_upstream(servico: str, operacao: str):
+    metricas.erros_upstream.incrementar(servico=servico, operacao=operacao)
+
+
+def cabecalho_server_timing(etapas: Dict[str, float], total: Optional[float] = None) -> str:
+    """Valor do cabeçalho Server-Timing (durações em milissegundos)."""
+    partes = [f"{etapa};dur={segundos * 1000:.1f}" for etapa, segundos in etapas.items()]
+    if total is not None:
+        partes.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(partes)
+
+
+def series_cache(nome: str, estatisticas: Dict[str, Any]) -> List[Tuple[Dict[str, str], Dict[str, Any]]]:
+    """Achata as estatísticas de um cache (simples ou de duas camadas) em (rótulos, contadores)."""
+    if "acertos" in estatisticas:
+        return [({"cache": nome}, estatisticas)]
+    return [
+        ({"cache": nome, "camada": camada}, valores)
+        for camada, valores in estatisticas.items()
+        if isinstance(valores, dict) and "acertos" in valores
+    ]
+
+
+class AmostradorTraces:
+    """
+    traces_sampler do Sentry: taxa base configurável, limitada para não passar
+    de `traces_por_segundo` traces em média (a taxa cai sob carga), sem traces
+    para rotas de infraestrutura e respeitando a decisão do trace pai.
+    """
+
+    def __init__(self, taxa_base: float = 0.1, traces_por_segundo: float = 1.0,
+                 janela_segundos: float = 60.0, rotas_ignoradas: Tuple[str, ...] = ("/health", "/metrics")):
+        self.taxa_base = taxa_base
+        self.traces_por_segundo = traces_por_segundo
+        self.janela_segundos = janela_segundos
+        self.rotas_ignoradas = rotas_ignoradas
+        self._inicio_janela = time.monotonic()
+        self._requisicoes_janela = 0
+        self._taxa_requisicoes = 0.0
+        self._lock = threading.Lock()
+
+    def _observar_requisicao(self) -> float:
+        """Conta a requisição e devolve a taxa (req/s) estimada na última janela completa."""
+        agora = time.monotonic()
+        with self._lock:
+            self._requisicoes_janela += 1
+            decorrido = agora - self._inicio_janela
+            if decorrido >= self.janela_segundos:
+                self._taxa_requisicoes = self._requisicoes_janela / decorrido
+                self._requisicoes_janela = 0
+                self._inicio_janela = agora
+            # Antes da primeira janela fechar, usa a taxa parcial
+            return self._taxa_requisicoes or self._requisicoes_janela / max(decorrido, 1.0)
+
+    def taxa_atual(self, requisicoes_por_segundo: float) -> float:
+        if requisicoes_por_segundo <= 0 or self.traces_por_segundo <= 0:
+            return self.taxa_base
+        return min(self.taxa_base, self.traces_por_segundo / requisicoes_por_segundo)
+
+    def __call__(self, contexto_amostragem: Dict[str, Any]) -> float:
+        pai = contexto_amostragem.get("parent_sampled")
+        if pai is not None:
+            return 1.0 if pai else 0.0
+        caminho = (contexto_amostragem.get("asgi_scope") or {}).get("path", "")
+        if caminho in self.rotas_ignoradas:
+            return 0.0
+        return self.taxa_atual(self._observar_requisicao())
+
+
+def criar_amostrador_traces() -> AmostradorTraces:
+    """Amostrador configurado pelo ambiente (SENTRY_TRACES_TAXA, SENTRY_TRACES_POR_SEGUNDO)."""
+    return AmostradorTraces(
+        taxa_base=float(os.getenv("SENTRY_TRACES_TAXA", "0.1")),
+        traces_por_segundo=float(os.getenv("SENTRY_TRACES_POR_SEGUNDO", "1.0")),
+    )
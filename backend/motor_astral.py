@@ -0,0 +1,343 @@
+"""
+Motor astral leve: só sol, lua e ascendente (com as casas de Placidus do sol e da lua).
+
+O Kerykeion monta um AstrologicalSubject completo (todos os planetas, casas e
+metadados) para cada consulta, mas o backend só lê três campos. Este motor:
+- interpola (Lagrange cúbica) tabelas diárias pré-computadas com a Swiss
+  Ephemeris das longitudes do sol e da lua, da obliquidade verdadeira e da
+  correção do tempo sideral (dados/efemerides.npz, 1900-2100);
+- calcula o ascendente e as cúspides de Placidus direto do tempo sideral local
+  e da latitude;
+- avalia muitos nascimentos de uma vez com NumPy.
+
+O resultado tem o mesmo formato de astrologia.calcular_mapa. Casos fora do
+alcance (sem coordenadas/fuso, fora das tabelas, horário ambíguo no horário de
+verão, latitudes polares) devolvem None e ficam com o Kerykeion.
+
+    python motor_astral.py gerar            # regenera as tabelas (precisa do pyswisseph)
+    python motor_astral.py validar -n 1000  # compara com o Kerykeion
+"""
+
+import os
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+ARQUIVO_EFEMERIDES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dados", "efemerides.npz")
+
+SIGNOS = ("Ari", "Tau", "Gem", "Can", "Leo", "Vir", "Lib", "Sco", "Sag", "Cap", "Aqu", "Pis")
+CASAS = (
+    "First_House", "Second_House", "Third_House", "Fourth_House", "Fifth_House", "Sixth_House",
+    "Seventh_House", "Eighth_House", "Ninth_House", "Tenth_House", "Eleventh_House", "Twelfth_House",
+)
+
+J2000 = 2451545.0
+_EPOCA_UTC = datetime(2000, 1, 1, 12, tzinfo=timezone.utc)
+_ITERACOES_PLACIDUS = 50
+SERIES = ("sol", "lua", "obliquidade", "correcao_sideral")
+
+
+def tempo_sideral_medio(jd: np.ndarray) -> np.ndarray:
+    """Tempo sideral médio de Greenwich em graus (IAU 1982)."""
+    dias = jd - J2000
+    t = dias / 36525
+    return (280.46061837 + 360.98564736629 * dias + 0.000387933 * t * t - t ** 3 / 38710000) % 360
+
+
+def dia_juliano_ut(parametros: Dict[str, Any]) -> Optional[float]:
+    """
+    Dia juliano (UT) do nascimento, convertendo a hora local pelo fuso com o
+    pytz, como o Kerykeion faz. None sem fuso ou quando a hora local é
+    ambígua/inexistente (mudança de horário de verão), horários que o Kerykeion
+    também recusa.
+    """
+    fuso = parametros.get("tz_str")
+    if not fuso:
+        return None
+    import pytz
+
+    local = datetime(parametros["year"], parametros["month"], parametros["day"],
+                     parametros["hour"], parametros["minute"])
+    try:
+        utc = pytz.timezone(fuso).localize(local, is_dst=None).astimezone(timezone.utc)
+    except (pytz.exceptions.InvalidTimeError, pytz.exceptions.UnknownTimeZoneError):
+        return None
+    return J2000 + (utc - _EPOCA_UTC).total_seconds() / 86400
+
+
+def casas_dos_pontos(cuspides: np.ndarray, pontos: np.ndarray) -> np.ndarray:
+    """
+    Índice (0-11) da casa de cada ponto, com o mesmo critério do Kerykeion para
+    "ponto entre duas cúspides"; -1 se nenhuma casa contém o ponto.
+    cuspides: (n, 12); pontos: (n, k) -> (n, k).
+    """
+    inicio = cuspides[:, None, :]
+    arco = np.fmod(np.roll(cuspides, -1, axis=1)[:, None, :] - inicio + 360, 360)
+    ate_ponto = np.fmod(pontos[:, :, None] - inicio + 360, 360)
+    dentro = (arco <= 180) != (ate_ponto > arco)
+    return np.where(dentro.any(axis=2), dentro.argmax(axis=2), -1)
+
+
+def cuspides_placidus(ramc: np.ndarray, obliquidade: np.ndarray, latitude: np.ndarray) -> np.ndarray:
+    """Cúspides de Placidus (n, 12) em graus, a partir do RAMC, da obliquidade e da latitude."""
+    e = np.radians(obliquidade)
+    tan_lat = np.tan(np.radians(latitude))
+
+    def longitude_ecliptica(ascensao_reta):
+        ar = np.radians(ascensao_reta)
+        return np.degrees(np.arctan2(np.sin(ar), np.cos(ar) * np.cos(e))) % 360
+
+    r = np.radians(ramc)
+    ascendente = np.degrees(np.arctan2(np.cos(r), -(np.sin(r) * np.cos(e) + tan_lat * np.sin(e)))) % 360
+    meio_do_ceu = longitude_ecliptica(ramc)
+
+    # Cúspides 11, 12, 2 e 3 resolvidas juntas: cada uma divide o semiarco diurno
+    # (ou noturno) do seu próprio grau na fração indicada. Para um ponto da
+    # eclíptica, tan(declinação) = tan(obliquidade) * sen(ascensão reta), então
+    # a iteração de ponto fixo fica só na ascensão reta:
+    #   AR = RAMC + base + fração * diferença ascensional
+    fracao = np.array([1 / 3, 2 / 3, 2 / 3, 1 / 3])[:, None]
+    base = ramc + np.array([30.0, 60.0, 120.0, 150.0])[:, None]
+    fator = tan_lat * np.tan(e)
+    ascensao = base
+    for _ in range(_ITERACOES_PLACIDUS):
+        diferenca = np.degrees(np.arcsin(np.clip(fator * np.sin(np.radians(ascensao)), -1, 1)))
+        nova = base + fracao * diferenca
+        convergiu = np.abs(nova - ascensao).max() < 1e-9
+        ascensao = nova
+        if convergiu:
+            break
+
+    c11, c12, c2, c3 = longitude_ecliptica(ascensao)
+    primeiras = [ascendente, c2, c3, (meio_do_ceu + 180) % 360, (c11 + 180) % 360, (c12 + 180) % 360]
+    return np.stack(primeiras + [(c + 180) % 360 for c in primeiras], axis=1)
+
+
+class MotorAstral:
+    def __init__(self, arquivo: str = ARQUIVO_EFEMERIDES):
+        self.arquivo = arquivo
+        self._tabelas: Optional[Dict[str, np.ndarray]] = None
+        self._lock = threading.Lock()
+
+    @property
+    def carregado(self) -> bool:
+        """True depois que as tabelas foram lidas do disco."""
+        return self._tabelas is not None
+
+    @property
+    def tabelas(self) -> Dict[str, Any]:
+        with self._lock:
+            if self._tabelas is None:
+                with np.load(self.arquivo) as dados:
+                    self._tabelas = {
+                        "jd_inicial": float(dados["jd_inicial"]),
+                        "passo_dias": float(dados["passo_dias"]),
+                        # Linhas: sol, lua, obliquidade, correção sideral (uma única indexação por consulta)
+                        "series": np.stack([dados[nome] for nome in SERIES]).astype(np.float64),
+                    }
+            return self._tabelas
+
+    def _interpolar(self, posicao: np.ndarray) -> np.ndarray:
+        """
+        Lagrange cúbica nos quatro dias em volta de cada instante, para todas as
+        séries de uma vez (longitudes desenroladas em relação ao dia central).
+        """
+        tabelas = self.tabelas
+        indice = np.floor(posicao).astype(np.int64)
+        y = tabelas["series"][:, indice[None, :] + np.arange(-1, 3)[:, None]]  # (séries, 4, n)
+        y[:2] = y[:2, 1:2] + (y[:2] - y[:2, 1:2] + 180) % 360 - 180
+        t = posicao - indice
+        pesos = np.stack([-t * (t - 1) * (t - 2) / 6, (t + 1) * (t - 1) * (t - 2) / 2,
+                          -(t + 1) * t * (t - 2) / 2, (t + 1) * t * (t - 1) / 6])
+        valores = (y * pesos).sum(axis=1)
+        valores[:2] %= 360
+        return valores
+
+    def calcular_vetorizado(self, jd: np.ndarray, latitude: np.ndarray, longitude: np.ndarray) -> Dict[str, np.ndarray]:
+        """Longitudes do sol, da lua e cúspides para arrays de nascimentos (jd em UT)."""
+        tabelas = self.tabelas
+        sol, lua, obliquidade, correcao = self._interpolar((jd - tabelas["jd_inicial"]) / tabelas["passo_dias"])
+
+        ramc = (tempo_sideral_medio(jd) + correcao + longitude) % 360
+        cuspides = cuspides_placidus(ramc, obliquidade, latitude)
+        return {"sol": sol, "lua": lua, "cuspides": cuspides}
+
+    def calcular(self, lista_parametros: Sequence[Dict[str, Any]]) -> List[Optional[Dict[str, Any]]]:
+        """Mapas no formato de astrologia.calcular_mapa; None onde o motor não se aplica."""
+        resultados: List[Optional[Dict[str, Any]]] = [None] * len(lista_parametros)
+        tabelas = self.tabelas
+        inicio = tabelas["jd_inicial"]
+        fim = inicio + (tabelas["series"].shape[1] - 3) * tabelas["passo_dias"]
+
+        validos, jds, latitudes, longitudes = [], [], [], []
+        for i, parametros in enumerate(lista_parametros):
+            latitude, longitude = parametros.get("lat"), parametros.get("lng")
+            if latitude is None or longitude is None:
+                continue
+            # Placidus não é definido acima dos círculos polares
+            if abs(latitude) >= 66:
+                continue
+            try:
+                jd = dia_juliano_ut(parametros)
+            except Exception:
+                jd = None
+            if jd is None or not inicio + 1 <= jd < fim:
+                continue
+            validos.append(i)
+            jds.append(jd)
+            latitudes.append(latitude)
+            longitudes.append(longitude)
+
+        if not validos:
+            return resultados
+
+        mapa = self.calcular_vetorizado(np.array(jds), np.array(latitudes, dtype=np.float64),
+                                        np.array(longitudes, dtype=np.float64))
+        signo_sol = (mapa["sol"] // 30).astype(np.int64) % 12
+        signo_lua = (mapa["lua"] // 30).astype(np.int64) % 12
+        signo_asc = (mapa["cuspides"][:, 0] // 30).astype(np.int64) % 12
+        casa_sol, casa_lua = casas_dos_pontos(mapa["cuspides"], np.stack([mapa["sol"], mapa["lua"]], axis=1)).T
+
+        for j, i in enumerate(validos):
+            if casa_sol[j] < 0 or casa_lua[j] < 0:
+                continue
+            resultados[i] = {
+                "sol": {"signo": SIGNOS[signo_sol[j]], "casa": CASAS[casa_sol[j]]},
+                "lua": {"signo": SIGNOS[signo_lua[j]], "casa": CASAS[casa_lua[j]]},
+                "ascendente": SIGNOS[signo_asc[j]]
+            }
+        return resultados
+
+
+motor_astral = MotorAstral()
+
+
+def gerar_tabelas(ano_inicial: int = 1900, ano_final: int = 2100, arquivo: str = ARQUIVO_EFEMERIDES):
+    """Gera as tabelas diárias com a Swiss Ephemeris, nas mesmas condições do Kerykeion."""
+    import swisseph as swe
+    import kerykeion
+
+    swe.set_ephe_path(os.path.join(os.path.dirname(kerykeion.__file__), "sweph"))
+    # Um dia de folga em cada ponta para a interpolação cúbica
+    jd_inicial = swe.julday(ano_inicial, 1, 1, 0.0) - 1
+    jd_final = swe.julday(ano_final + 1, 1, 1, 0.0) + 2
+    jds = np.arange(jd_inicial, jd_final + 1, 1.0)
+
+    sol = np.empty(len(jds))
+    lua = np.empty(len(jds))
+    obliquidade = np.empty(len(jds))
+    correcao = np.empty(len(jds))
+    fluxo = swe.FLG_SWIEPH + swe.FLG_SPEED
+    for i, jd in enumerate(jds):
+        # O Kerykeion passa o dia juliano UT direto para swe.calc
+        sol[i] = swe.calc(jd, swe.SUN, fluxo)[0][0]
+        lua[i] = swe.calc(jd, swe.MOON, fluxo)[0][0]
+        obliquidade[i] = swe.calc_ut(jd, swe.ECL_NUT)[0][0]
+        correcao[i] = (swe.sidtime(jd) * 15 - tempo_sideral_medio(jd) + 180) % 360 - 180
+
+    np.savez_compressed(
+        arquivo,
+        jd_inicial=np.float64(jd_inicial),
+        passo_dias=np.float64(1.0),
+        sol=sol.astype(np.float32),
+        lua=lua.astype(np.float32),
+        obliquidade=obliquidade.astype(np.float32),
+        correcao_sideral=correcao.astype(np.float32),
+    )
+    return arquivo
+
+
+def validar(amostras: int = 500, semente: int = 42, motor: Optional[MotorAstral] = None) -> Dict[str, Any]:
+    """
+    Compara o motor com o Kerykeion em nascimentos aleatórios (datas de 1900 a
+    2100, cidades do gazetteer) e devolve as taxas de concordância por campo,
+    as divergências e o custo por mapa de cada um.
+    """
+    import time
+    import random
+    from geografia import carregar_gazetteer
+    from astrologia import calcular_mapa
+
+    motor = motor or motor_astral
+    gazetteer = carregar_gazetteer()
+    aleatorio = random.Random(semente)
+
+    lista = []
+    for _ in range(amostras):
+        cidade = gazetteer.cidade(aleatorio.randrange(len(gazetteer)))
+        lista.append({
+            "name": "validacao",
+            "year": aleatorio.randint(1900, 2100),
+            "month": aleatorio.randint(1, 12),
+            "day": aleatorio.randint(1, 28),
+            "hour": aleatorio.randint(0, 23),
+            "minute": aleatorio.randint(0, 59),
+            "city": cidade.nome,
+            "nation": cidade.pais,
+            "lat": cidade.lat,
+            "lng": cidade.lng,
+            "tz_str": cidade.fuso,
+            "online": False
+        })
+
+    inicio = time.perf_counter()
+    leves = motor.calcular(lista)
+    tempo_motor = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    referencias = []
+    for parametros in lista:
+        try:
+            referencias.append(calcular_mapa(parametros))
+        except Exception:
+            referencias.append(None)
+    tempo_kerykeion = time.perf_counter() - inicio
+
+    campos = {
+        "sol.signo": lambda m: m["sol"]["signo"],
+        "sol.casa": lambda m: m["sol"]["casa"],
+        "lua.signo": lambda m: m["lua"]["signo"],
+        "lua.casa": lambda m: m["lua"]["casa"],
+        "ascendente": lambda m: m["ascendente"],
+    }
+    comparados = [(p, l, r) for p, l, r in zip(lista, leves, referencias) if l is not None and r is not None]
+    concordancia = {
+        campo: round(sum(ler(l) == ler(r) for _, l, r in comparados) / len(comparados), 5) if comparados else None
+        for campo, ler in campos.items()
+    }
+    divergencias = [
+        {"nascimento": {k: p[k] for k in ("year", "month", "day", "hour", "minute", "city")},
+         "motor": l, "kerykeion": r}
+        for p, l, r in comparados if l != r
+    ]
+    return {
+        "amostras": amostras,
+        "comparados": len(comparados),
+        "sem_motor": sum(l is None for l in leves),
+        "concordancia": concordancia,
+        "divergencias": divergencias[:20],
+        "us_por_mapa_motor": round(tempo_motor / amostras * 1e6, 1),
+        "us_por_mapa_kerykeion": round(tempo_kerykeion / amostras * 1e6, 1),
+    }
+
+
+if __name__ == "__main__":
+    import json
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Motor astral leve (sol, lua e ascendente)")
+    subcomandos = parser.add_subparsers(dest="comando", required=True)
+    gerar = subcomandos.add_parser("gerar", help="Gerar as tabelas de efemérides")
+    gerar.add_argument("--inicio", type=int, default=1900)
+    gerar.add_argument("--fim", type=int, default=2100)
+    validacao = subcomandos.add_parser("validar", help="Comparar com o Kerykeion")
+    validacao.add_argument("-n", "--amostras", type=int, default=500)
+    validacao.add_argument("--semente", type=int, default=42)
+    args = parser.parse_args()
+
+    if args.comando == "gerar":
+        print(f"Tabelas salvas em {gerar_tabelas(args.inicio, args.fim)}")
+    else:
+        print(json.dumps(validar(args.amostras, args.semente), ensure_ascii=False, indent=2))
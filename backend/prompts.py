@@ -0,0 +1,112 @@
+"""
+Registro de templates de prompt.
+
+Cada voz da Guru tem um prefixo estático pré-compilado (mensagem de sistema),
+idêntico byte a byte entre chamadas, seguido de um sufixo dinâmico compacto
+(cartas, astrologia, memória e pergunta) na mensagem do usuário. O registro
+conta os tokens de cada prefixo uma única vez, na compilação, e estima os do
+sufixo a cada chamada (~4 caracteres por token, sem tokenizar no caminho quente).
+
+Os prefixos atuais (~200 tokens) ficam abaixo do mínimo de 1024 tokens do
+cache automático de prompts da OpenAI; completá-los só para atingir o mínimo
+custaria mais tokens de entrada do que o desconto do cache devolve.
+"""
+
+import textwrap
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+_codificador = None
+_codificador_carregado = False
+
+
+def contar_tokens(texto: str) -> int:
+    """Conta tokens com o tiktoken, se instalado; senão estima ~4 caracteres por token."""
+    global _codificador, _codificador_carregado
+    if not _codificador_carregado:
+        _codificador_carregado = True
+        try:
+            import tiktoken
+            _codificador = tiktoken.get_encoding("o200k_base")
+        except Exception:
+            _codificador = None
+    if _codificador is not None:
+        return len(_codificador.encode(texto))
+    return estimar_tokens(texto)
+
+
+def estimar_tokens(texto: str) -> int:
+    """Estimativa barata de tokens (~4 caracteres por token)."""
+    return max(1, len(texto) // 4)
+
+
+def compactar(texto: str) -> str:
+    """Remove a indentação do código-fonte e as linhas em branco das pontas."""
+    return textwrap.dedent(texto).strip()
+
+
+@dataclass
+class TemplatePrompt:
+    nome: str
+    prefixo: str
+    tokens_prefixo: int
+    chamadas: int = 0
+    tokens_sufixo_total: int = 0
+    tokens_sufixo_max: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def montar(self, sufixo: str) -> List[Dict[str, str]]:
+        """Mensagens para a API: prefixo estático (system) + sufixo dinâmico (user)."""
+        tokens_sufixo = estimar_tokens(sufixo)
+        with self._lock:
+            self.chamadas += 1
+            self.tokens_sufixo_total += tokens_sufixo
+            self.tokens_sufixo_max = max(self.tokens_sufixo_max, tokens_sufixo)
+        return [
+            {"role": "system", "content": self.prefixo},
+            {"role": "user", "content": sufixo},
+        ]
+
+    def relatorio(self) -> Dict[str, Any]:
+        return {
+            "tokens_prefixo": self.tokens_prefixo,
+            # Sufixo estimado por ~4 caracteres por token
+            "tokens_sufixo_medio": round(self.tokens_sufixo_total / self.chamadas, 1) if self.chamadas else None,
+            "tokens_sufixo_max": self.tokens_sufixo_max,
+            "chamadas": self.chamadas,
+        }
+
+
+class RegistroPrompts:
+    def __init__(self):
+        self._templates: Dict[str, TemplatePrompt] = {}
+        self._lock = threading.Lock()
+
+    def registrar(self, nome: str, prefixo: str) -> TemplatePrompt:
+        """Pré-compila o prefixo estático de um template."""
+        prefixo = compactar(prefixo)
+        template = TemplatePrompt(nome=nome, prefixo=prefixo, tokens_prefixo=contar_tokens(prefixo))
+        with self._lock:
+            self._templates[nome] = template
+        return template
+
+    def obter(self, nome: str, padrao: Optional[str] = None) -> TemplatePrompt:
+        template = self._templates.get(nome)
+        if template is None and padrao is not None:
+            template = self._templates[padrao]
+        if template is None:
+            raise KeyError(f"Template de prompt não registrado: {nome}")
+        return template
+
+    def obter_ou_registrar(self, nome: str, gerar_prefixo: Callable[[], str]) -> TemplatePrompt:
+        template = self._templates.get(nome)
+        if template is None:
+            template = self.registrar(nome, gerar_prefixo())
+        return template
+
+    def relatorio(self) -> Dict[str, Dict[str, Any]]:
+        return {nome: template.relatorio() for nome, template in self._templates.items()}
+
+
+registro_prompts = RegistroPrompts()
@@ -0,0 +1,248 @@
+"""
+Prazos, disjuntores e requisições com hedge para as chamadas externas.
+
+- Prazo por requisição: o middleware abre um prazo (PRAZO_REQUISICAO_S) que vale
+  para todas as etapas da consulta, inclusive nas tasks e threads (to_thread) que
+  ela dispara. Cada chamada externa usa `limitar_timeout(padrao)`, que nunca passa
+  do que resta do prazo.
+- Disjuntores: depois de DISJUNTOR_FALHAS falhas seguidas de um serviço, as
+  chamadas a ele falham na hora (CircuitoAberto) por DISJUNTOR_ABERTO_S segundos;
+  então uma chamada de teste decide se o circuito fecha. Quem chama usa o
+  fallback: sem RAG, leitura em cache ou pré-gerada.
+- Hedge: `executar_com_hedge` dispara uma segunda tentativa se a primeira não
+  responder em `atraso_s` e fica com a que terminar antes (recuperação de
+  memórias e embeddings; desligado por padrão).
+"""
+
+import os
+import time
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextvars import ContextVar, copy_context
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+PRAZO_REQUISICAO_S = float(os.getenv("PRAZO_REQUISICAO_S", "20"))
+DISJUNTOR_FALHAS = int(os.getenv("DISJUNTOR_FALHAS", "5"))
+DISJUNTOR_ABERTO_S = float(os.getenv("DISJUNTOR_ABERTO_S", "30"))
+HEDGE_THREADS = int(os.getenv("HEDGE_THREADS", "16"))
+
+
+class PrazoEsgotado(TimeoutError):
+    pass
+
+
+class CircuitoAberto(RuntimeError):
+    pass
+
+
+# Instante (time.monotonic) em que o prazo da requisição corrente acaba
+_prazo: ContextVar[Optional[float]] = ContextVar("prazo_requisicao", default=None)
+
+
+def iniciar_prazo(segundos: float = PRAZO_REQUISICAO_S) -> float:
+    """Abre o prazo da requisição (ou do item de um lote) a partir de agora."""
+    limite = time.monotonic() + segundos
+    _prazo.set(limite)
+    return limite
+
+
+def tempo_restante() -> Optional[float]:
+    """Segundos até o fim do prazo (None fora de uma requisição)."""
+    limite = _prazo.get()
+    if limite is None:
+        return None
+    return max(0.0, limite - time.monotonic())
+
+
+def limitar_timeout(padrao: float) -> float:
+    """Timeout de uma chamada externa: o padrão dela, sem passar do prazo da requisição."""
+    restante = tempo_restante()
+    if restante is None:
+        return padrao
+    if restante <= 0:
+        raise PrazoEsgotado("prazo da requisição esgotado")
+    return min(padrao, restante)
+
+
+def erro_timeout(timeout: float, padrao: Optional[float], mensagem: str) -> TimeoutError:
+    """
+    Erro de uma chamada que não respondeu em `timeout`. Se o prazo da requisição
+    encurtou o timeout padrão, é PrazoEsgotado (não conta como falha do serviço);
+    senão, o serviço estourou o próprio timeout (TimeoutError).
+    """
+    if padrao is None or timeout < padrao:
+        return PrazoEsgotado(mensagem)
+    return TimeoutError(mensagem)
+
+
+class Disjuntor:
+    def __init__(self, nome: str, limite_falhas: int = DISJUNTOR_FALHAS, tempo_aberto_s: float = DISJUNTOR_ABERTO_S):
+        self.nome = nome
+        self.limite_falhas = limite_falhas
+        self.tempo_aberto_s = tempo_aberto_s
+        self._falhas_seguidas = 0
+        self._aberto_ate: Optional[float] = None
+        self._testando = False
+        self._lock = threading.Lock()
+        self.aberturas = 0
+        self.rejeitadas = 0
+
+    @property
+    def estado(self) -> str:
+        with self._lock:
+            if self._aberto_ate is None:
+                return "fechado"
+            return "aberto" if time.monotonic() < self._aberto_ate else "meio_aberto"
+
+    def permitir(self) -> bool:
+        """True se a chamada pode seguir; no meio-aberto, só uma chamada de teste por vez."""
+        with self._lock:
+            if self._aberto_ate is None:
+                return True
+            if time.monotonic() >= self._aberto_ate and not self._testando:
+                self._testando = True
+                return True
+            self.rejeitadas += 1
+            return False
+
+    def verificar(self):
+        if not self.permitir():
+            raise CircuitoAberto(f"circuito de {self.nome} aberto")
+
+    def registrar_sucesso(self):
+        with self._lock:
+            self._falhas_seguidas = 0
+            self._aberto_ate = None
+            self._testando = False
+
+    def registrar_falha(self):
+        with self._lock:
+            self._falhas_seguidas += 1
+            if self._testando or self._falhas_seguidas >= self.limite_falhas:
+                if self._aberto_ate is None or self._testando:
+                    self.aberturas += 1
+                    print(f"Erro: circuito de {self.nome} aberto por {self.tempo_aberto_s:.0f} s")
+                self._aberto_ate = time.monotonic() + self.tempo_aberto_s
+                self._testando = False
+
+    def liberar(self):
+        """Chamada abandonada (cancelada ou sem prazo): não conta como falha nem como sucesso."""
+        with self._lock:
+            self._testando = False
+
+    def chamar(self, funcao: Callable[..., Any], *args, **kwargs) -> Any:
+        self.verificar()
+        try:
+            resultado = funcao(*args, **kwargs)
+        except PrazoEsgotado:
+            # O prazo da requisição acabou: o serviço não falhou
+            self.liberar()
+            raise
+        except Exception:
+            self.registrar_falha()
+            raise
+        except BaseException:
+            self.liberar()
+            raise
+        self.registrar_sucesso()
+        return resultado
+
+    async def chamar_async(self, funcao: Callable[..., Any], *args, **kwargs) -> Any:
+        self.verificar()
+        try:
+            resultado = await funcao(*args, **kwargs)
+        except PrazoEsgotado:
+            # O prazo da requisição acabou: o serviço não falhou
+            self.liberar()
+            raise
+        except Exception:
+            self.registrar_falha()
+            raise
+        except BaseException:
+            self.liberar()
+            raise
+        self.registrar_sucesso()
+        return resultado
+
+    def estatisticas(self) -> Dict[str, Any]:
+        return {
+            "estado": self.estado,
+            "falhas_seguidas": self._falhas_seguidas,
+            "aberturas": self.aberturas,
+            "rejeitadas": self.rejeitadas,
+        }
+
+
+_disjuntores: Dict[str, Disjuntor] = {}
+_lock_disjuntores = threading.Lock()
+
+
+def disjuntor(nome: str) -> Disjuntor:
+    """Disjuntor compartilhado de um serviço externo (p.ex. "openai_chat", "supabase")."""
+    with _lock_disjuntores:
+        if nome not in _disjuntores:
+            _disjuntores[nome] = Disjuntor(nome)
+        return _disjuntores[nome]
+
+
+def estatisticas_disjuntores() -> Dict[str, Dict[str, Any]]:
+    with _lock_disjuntores:
+        return {nome: d.estatisticas() for nome, d in _disjuntores.items()}
+
+
+def series_disjuntores() -> List[Tuple[Dict[str, str], float]]:
+    """Coletor do /metrics: 1 para circuito aberto (ou em teste), 0 para fechado."""
+    return [({"servico": nome}, 0.0 if e["estado"] == "fechado" else 1.0)
+            for nome, e in estatisticas_disjuntores().items()]
+
+
+_executor_hedge: Optional[ThreadPoolExecutor] = None
+_lock_hedge = threading.Lock()
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _executor_hedge
+    with _lock_hedge:
+        if _executor_hedge is None:
+            _executor_hedge = ThreadPoolExecutor(max_workers=HEDGE_THREADS, thread_name_prefix="hedge")
+        return _executor_hedge
+
+
+def executar_com_hedge(funcao: Callable[..., Any], *args, atraso_s: float = 0.0,
+                       timeout_s: Optional[float] = None, **kwargs) -> Any:
+    """
+    Executa `funcao` com timeout (limitado ao prazo da requisição). Com atraso_s > 0,
+    dispara uma segunda tentativa se a primeira ainda não respondeu nesse tempo e
+    devolve o primeiro resultado bem-sucedido. A tentativa perdedora termina em
+    segundo plano e é descartada.
+    """
+    timeout = limitar_timeout(timeout_s) if timeout_s is not None else tempo_restante()
+    if not atraso_s and timeout is None:
+        return funcao(*args, **kwargs)
+
+    executor = _executor()
+    # Cada tentativa leva o contexto (prazo, etapas) de quem chamou
+    tentativas: List[Future] = [executor.submit(copy_context().run, funcao, *args, **kwargs)]
+    limite = time.monotonic() + timeout if timeout is not None else None
+
+    def restante() -> Optional[float]:
+        return None if limite is None else max(0.0, limite - time.monotonic())
+
+    if atraso_s and (limite is None or atraso_s < restante()):
+        feitos, _ = wait(tentativas, timeout=atraso_s)
+        if not feitos:
+            tentativas.append(executor.submit(copy_context().run, funcao, *args, **kwargs))
+
+    ultimo_erro: Optional[BaseException] = None
+    pendentes = set(tentativas)
+    while pendentes:
+        feitos, pendentes = wait(pendentes, timeout=restante(), return_when=FIRST_COMPLETED)
+        if not feitos:
+            break
+        for futuro in feitos:
+            if futuro.exception() is None:
+                return futuro.result()
+            ultimo_erro = futuro.exception()
+    if ultimo_erro is not None and not pendentes:
+        raise ultimo_erro
+    raise erro_timeout(timeout, timeout_s, f"{getattr(funcao, '__name__', 'chamada')} não respondeu em {timeout:.2f} s")
@@ -0,0 +1,47 @@
+"""Regressões da resolução offline de cidades (geografia.buscar_cidade)."""
+
+import pytest
+
+from geografia import buscar_cidade
+
+
+@pytest.mark.parametrize("consulta, nome, uf, pais", [
+    ("São Paulo", "São Paulo", "SP", "BR"),
+    ("sao paulo, SP, Brasil", "São Paulo", "SP", "BR"),
+    ("Belo Horizonte, Brasil", "Belo Horizonte", "MG", "BR"),
+    ("Floripa", "Florianópolis", "SC", "BR"),
+    ("Cascavel, PR", "Cascavel", "PR", "BR"),
+    ("Lisboa, Portugal", "Lisboa", "", "PT"),
+    ("Paris, France", "Paris", "", "FR"),
+])
+def test_nome_exato_ou_apelido(consulta, nome, uf, pais):
+    cidade = buscar_cidade(consulta)
+    assert cidade is not None
+    assert (cidade.nome, cidade.uf, cidade.pais) == (nome, uf, pais)
+
+
+@pytest.mark.parametrize("consulta", [
+    # Dicas de UF/país que nenhum candidato atende
+    "Paris, Texas, USA",
+    "Caxias, MA",
+    "Palmas, PR",
+    "Lima, Ohio, USA",
+    "Cascavel, CE",
+    # Prefixos de outras cidades: ficam para o geocoder online
+    "Aparecida",
+    "São José, Brasil",
+    "Juazeiro",
+    "Campos",
+    "Vila",
+    "Santa",
+    "Belo",
+    "Rio",
+    "Sao",
+    "Ri",
+    # Grafias aproximadas também não viram palpite
+    "Sao Paolo",
+    "Curitba",
+    "",
+])
+def test_sem_correspondencia_segura_devolve_none(consulta):
+    assert buscar_cidade(consulta) is None
@@ -14,6 +14,32 @@ import './App.css'
 // Configuração da API
 const API_BASE_URL = import.meta.env.VITE_API_BASE_URL || 'http://localhost:8000'
 
+// Lê uma resposta text/event-stream e chama onEvento(evento, dados) para cada evento recebido
+async function lerEventosConsulta(response, onEvento) {
+  const reader = response.body.getReader()
+  const decoder = new TextDecoder()
+  let buffer = ''
+
+  while (true) {
+    const { value, done } = await reader.read()
+    if (done) break
+
+    buffer += decoder.decode(value, { stream: true })
+    const blocos = buffer.split('\n\n')
+    buffer = blocos.pop()
+
+    for (const bloco of blocos) {
+      let evento = 'message'
+      let dados = ''
+      for (const linha of bloco.split('\n')) {
+        if (linha.startsWith('event:')) evento = linha.slice(6).trim()
+        else if (linha.startsWith('data:')) dados += linha.slice(5).trim()
+      }
+      if (dados) onEvento(evento, JSON.parse(dados))
+    }
+  }
+}
+
 function App() {
   const [pergunta, setPergunta] = useState('')
   const [dadosNascimento, setDadosNascimento] = useState({
@@ -51,10 +77,11 @@ function App() {
         payload.dados_nascimento = dadosNascimento
       }
 
-      const response = await fetch(`${API_BASE_URL}/consulta-tarot`, {
+      const response = await fetch(`${API_BASE_URL}/consulta-tarot/stream`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
+          'Accept': 'text/event-stream',
         },
         body: JSON.stringify(payload)
       })
@@ -63,8 +90,25 @@ function App() {
         throw new Error(`Erro ${response.status}: ${response.statusText}`)
       }
 
-      const data = await response.json()
-      setResposta(data)
+      // Ler os eventos (SSE) à medida que chegam
+      await lerEventosConsulta(response, (evento, dados) => {
+        if (evento === 'cartas') {
+          setResposta({
+            cartas: dados.cartas,
+            interpretacao: '',
+            elementos_astrologicos: null,
+            timestamp: null
+          })
+        } else if (evento === 'astrologia') {
+          setResposta(prev => ({...prev, elementos_astrologicos: dados.elementos_astrologicos}))
+        } else if (evento === 'token') {
+          setResposta(prev => ({...prev, interpretacao: prev.interpretacao + dados.texto}))
+        } else if (evento === 'fim') {
+          setResposta(prev => ({...prev, timestamp: dados.timestamp}))
+        } else if (evento === 'erro') {
+          throw new Error(dados.detail)
+        }
+      })
     } catch (error) {
       console.error('Erro na consulta:', error)
       setErro('Não foi possível realizar a consulta. Tente novamente.')